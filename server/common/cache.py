@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire ttl seconds after they were stored
+    - Holds at most maxsize entries; the least recently used one is evicted first
+    - Every invalidation bumps generation: a value computed before an invalidation, stored with
+      put(key, value, generation) using the generation read before computing it, is dropped instead
+      of overwriting fresher data
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at), most recently used on the right
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] > monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+
+            if entry is not _MISSING:
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+    def put(self, key, value, generation: int | None = None, ttl: float | None = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._entries[key] = (value, monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, *keys) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop(key, _MISSING) is not _MISSING:
+                    self._invalidations += 1
+
+    def invalidate_where(self, predicate) -> None:
+        """
+        Drops the entries for which predicate(key) is true
+        """
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                self._invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations
+            }
+
+    def __len__(self):
+        return len(self._entries)
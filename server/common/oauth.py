@@ -1,7 +1,10 @@
+import hashlib
+from time import time
 from fastapi import HTTPException, Depends
+from common.cache import TTLCache
 from typing import Annotated, Union
 from data.models.user import User, AnonymousUser, Token, TokenData
-from services.users_services import find_by_username
+from services.users_services import find_by_username_cached
 from datetime import timedelta, datetime
 from jose import jwt, JWTError, ExpiredSignatureError
 from secret_key import SECRET_KEY
@@ -12,12 +15,17 @@ oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/users/login", auto_erro
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
+VERIFIED_TOKEN_CACHE_SIZE = 4096
+VERIFIED_TOKEN_TTL = 300  # seconds a verified token is trusted without decoding it again
+
+# sha256 of a token -> (TokenData, exp as a unix timestamp)
+_verified_tokens = TTLCache(maxsize=VERIFIED_TOKEN_CACHE_SIZE, ttl=VERIFIED_TOKEN_TTL)
 
 
 def create_access_token(data: TokenData) -> Token:
     to_encode = dict(data)
     expire = datetime.now() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"expire": expire.strftime("%Y-%m-%d %H:%M:%S")})
+    to_encode.update({"exp": int(expire.timestamp())})
 
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, ALGORITHM)
     return Token(access_token=encoded_jwt, token_type='bearer')
@@ -31,52 +39,72 @@ def is_token_exp_valid(exp: str) -> bool:
 
 # Union specifies that the returned type would be either one of these
 def verify_token_access(token: str) -> Union[TokenData, str]:
+    """
+    - Tokens verified in the last VERIFIED_TOKEN_TTL seconds are answered from memory, until they expire
+    - Accepts both the numeric exp claim and the "expire" string of older tokens
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    cached = _verified_tokens.get(digest)
+    if cached is not None:
+        token_data, exp = cached
+        if exp > time():
+            return token_data
+
     try:
+        # jose checks a numeric exp itself and raises ExpiredSignatureError
         payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
-        username: str = payload.get("username")
-        is_admin: bool = payload.get("is_admin")
-        exp_at: str = payload.get("expire")
-
-        if not is_token_exp_valid(exp_at):
-            raise ExpiredSignatureError()
+        exp = payload.get("exp")
+        if exp is None:
+            exp_at: str = payload.get("expire")
+            if not is_token_exp_valid(exp_at):
+                raise ExpiredSignatureError()
+            exp = datetime.strptime(exp_at, '%Y-%m-%d %H:%M:%S').timestamp()
 
-        token_data = TokenData(username=username, is_admin=is_admin)
-        return token_data
+        token_data = TokenData(username=payload.get("username"),
+                               is_admin=payload.get("is_admin"),
+                               user_id=payload.get("user_id"))
 
     # in case of token exp
     except ExpiredSignatureError:
         return "Token has expired. Please log in again"
 
     # in case of invalid token
-    except JWTError:
+    except (JWTError, TypeError, ValueError):
         return "Invalid token"
 
+    _verified_tokens.put(digest, (token_data, exp), ttl=min(VERIFIED_TOKEN_TTL, exp - time()))
+    return token_data
+
+
+def verified_token_cache_stats() -> dict:
+    return _verified_tokens.stats()
+
 
-def get_admin_required(token: Annotated[str, Depends(oauth2_scheme)]):
-    admin = get_current_user(token)
+async def get_admin_required(token: Annotated[str, Depends(oauth2_scheme)]):
+    admin = await get_current_user(token)
     if not admin.is_admin:
         raise HTTPException(status_code=403, detail="Admin required")
     return admin
 
 
-def get_user_required(token: Annotated[str, Depends(oauth2_scheme)]) -> User:
-    return get_current_user(token)
+async def get_user_required(token: Annotated[str, Depends(oauth2_scheme)]) -> User:
+    return await get_current_user(token)
 
 
-def get_user_optional(token: Annotated[str, Depends(oauth2_scheme_optional)]) -> User | AnonymousUser:
+async def get_user_optional(token: Annotated[str, Depends(oauth2_scheme_optional)]) -> User | AnonymousUser:
     if not token:
         return AnonymousUser()
-    return get_current_user(token)
+    return await get_current_user(token)
 
 
-def get_current_user(token):
+async def get_current_user(token):
     token_data = verify_token_access(token)
 
     # will return the correct msg - either invalid token or expired token
     if not isinstance(token_data, TokenData):
         raise HTTPException(status_code=400, detail=token_data)
 
-    user = find_by_username(token_data.username)
+    user = await find_by_username_cached(token_data.username)
     # if the token is verified but there is no such user (has been deleted)
     if not user:
         raise HTTPException(status_code=404, detail="No such user")
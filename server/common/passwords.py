@@ -0,0 +1,81 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from common import utils
+
+# bcrypt burns ~250 ms of CPU per call and holds the GIL while doing it; running it in worker processes
+# keeps a burst of logins from starving the request threads
+PASSWORD_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_queued = 0
+_running = 0
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawned, not forked: the parent runs database threads, which a fork would copy mid-flight
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PASSWORD_WORKERS)
+    return _slots
+
+
+async def _run(func, *args):
+    """
+    Runs a bcrypt call in the password process pool
+    - At most PASSWORD_WORKERS calls run at once; the rest wait on the event loop and are counted as queued
+    """
+    global _queued, _running
+    _queued += 1
+    try:
+        await _get_slots().acquire()
+    finally:
+        _queued -= 1
+
+    _running += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        _running -= 1
+        _get_slots().release()
+
+
+async def hash_password(password: str) -> str:
+    return await _run(utils.hash_pass, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(utils.verify_password, password, hashed_password)
+
+
+async def verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifies a password and, if it matches but was hashed with another cost than utils.BCRYPT_ROUNDS,
+    hashes it again in the same call
+    - Returns (matches, the new hash or None)
+    """
+    return await _run(utils.verify_and_update, password, hashed_password)
+
+
+def stats() -> dict:
+    return {
+        'workers': PASSWORD_WORKERS,
+        'running': _running,
+        'queued': _queued
+    }
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
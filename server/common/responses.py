@@ -1,4 +1,7 @@
+from collections.abc import AsyncIterable
 from fastapi import Response, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
 
 class SC:
@@ -11,6 +14,9 @@ class SC:
     PaymentRequired = 402
     Forbidden = 403
     NotFound = 404
+    TooManyRequests = 429
+
+    ServiceUnavailable = 503
 
 
 class HTTPBadRequest(HTTPException):
@@ -67,3 +73,20 @@ class Created(Response):
 class InternalServerError(Response):
     def __init__(self):
         super().__init__(status_code=500)
+
+
+class JSONArrayStream(StreamingResponse):
+    """
+    Streams the models of an async iterable as a JSON array, one element at a time
+    """
+
+    def __init__(self, items: AsyncIterable[BaseModel]):
+        super().__init__(self._encode(items), media_type='application/json')
+
+    @staticmethod
+    async def _encode(items: AsyncIterable[BaseModel]):
+        separator = '['
+        async for item in items:
+            yield separator + item.model_dump_json()
+            separator = ','
+        yield '[]' if separator == '[' else ']'
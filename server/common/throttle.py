@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict, deque
+from time import monotonic
+
+
+class SlidingWindowLimiter:
+    """
+    Thread-safe limiter allowing at most limit hits per key in any window of window seconds
+    - Keeps the times of the last limit hits of each key; at most maxsize keys, the least recently hit
+      one is forgotten first
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100_000):
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._hits = OrderedDict()  # key -> deque of hit times, oldest first
+        self._lock = threading.Lock()
+
+        self._allowed = 0
+        self._rejected = 0
+
+    def hit(self, key) -> float:
+        """
+        Records a hit of key, if it is within the limit
+        - Returns 0 when the hit is allowed, otherwise the seconds until the next one would be
+        """
+        now = monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque(maxlen=self.limit)
+            self._hits.move_to_end(key)
+
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+
+            if len(hits) == self.limit:
+                self._rejected += 1
+                return hits[0] + self.window - now
+
+            hits.append(now)
+            self._allowed += 1
+            while len(self._hits) > self.maxsize:
+                self._hits.popitem(last=False)
+            return 0
+
+    def reset(self, key) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hits.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'keys': len(self._hits),
+                'allowed': self._allowed,
+                'rejected': self._rejected
+            }
@@ -0,0 +1,20 @@
+from data.async_database import finish_unit_of_work
+from data.database import begin_unit_of_work, end_unit_of_work
+
+
+async def get_unit_of_work():
+    """
+    Request-scoped unit of work
+    - Every service call made while handling the request runs on the same connection and transaction
+    - Commits once after the endpoint returns, rolls back if it raises (HTTPException included)
+    """
+    uow = begin_unit_of_work()
+    try:
+        yield uow
+    except BaseException:
+        await finish_unit_of_work(uow, commit=False)
+        raise
+    else:
+        await finish_unit_of_work(uow, commit=True)
+    finally:
+        end_unit_of_work(uow)
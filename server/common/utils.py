@@ -1,14 +1,22 @@
 from __future__ import annotations
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from math import ceil
 from urllib.parse import parse_qs
 from passlib.context import CryptContext
 from starlette.requests import Request
 from pydantic import BaseModel
 
+# bcrypt cost of new hashes; passwords stored with another cost are rehashed when their user logs in
+BCRYPT_ROUNDS = 12
+
 # an instance of the CryptContext class that specifies the hashing algorithm - bcrypt in this case
-pass_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# hashes outside [min_rounds, max_rounds] are reported as needing an update
+pass_context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__default_rounds=BCRYPT_ROUNDS,
+                            bcrypt__min_rounds=BCRYPT_ROUNDS, bcrypt__max_rounds=BCRYPT_ROUNDS)
 
 
+# these run in the password process pool, see common.passwords
 def hash_pass(password: str) -> str:
     return pass_context.hash(password)
 
@@ -17,13 +25,17 @@ def verify_password(plain_password, hashed_password) -> bool:
     return pass_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update(plain_password, hashed_password) -> tuple[bool, str | None]:
+    return pass_context.verify_and_update(plain_password, hashed_password)
+
+
 class Page:
     SIZE = 5
 
 
 class PaginationInfo(BaseModel):
     total_elements: int
-    page: int
+    page: int | None  # None when paginating by cursor
     size: int
     pages: int
 
@@ -34,6 +46,28 @@ class Links(BaseModel):
     last: str
     next: str | None
     prev: str | None
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Packs a keyset position into an opaque, URL-safe cursor
+    """
+    data = json.dumps(position, separators=(',', ':')).encode()
+    return urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict | None:
+    """
+    Unpacks a cursor made by encode_cursor; returns None, if the cursor is malformed
+    """
+    try:
+        position = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        return None
+
+    return position if isinstance(position, dict) else None
 
 
 def get_pagination_info(total_elements, page, size) -> PaginationInfo:
@@ -46,13 +80,20 @@ def get_pagination_info(total_elements, page, size) -> PaginationInfo:
     return info
 
 
-def create_links(request: Request, pagination_info: PaginationInfo) -> Links:
+def create_links(
+        request: Request,
+        pagination_info: PaginationInfo,
+        next_cursor: str | None = None,
+        prev_cursor: str | None = None,
+        last_cursor: str | None = None
+) -> Links:
     """
     Creates pagination links based on the provided request and pagination information.
 
     Parameters:
         request (Request): HTTP request object containing URL information.
         pagination_info (PaginationInfo): Information about pagination, such as total elements, current page, and page size.
+        next_cursor, prev_cursor, last_cursor (str | None): Keyset cursors, used when pagination_info has no page.
 
     Returns:
         Links: An object containing pagination links, including current, first, last, next, and previous links.
@@ -60,6 +101,17 @@ def create_links(request: Request, pagination_info: PaginationInfo) -> Links:
    
     pi = pagination_info
 
+    if pi.page is None:
+        return Links(
+            current_url=f"{request.url}",
+            first=cursor_url(request, None, pi.size),
+            last=cursor_url(request, last_cursor, pi.size),
+            next=cursor_url(request, next_cursor, pi.size) if next_cursor else None,
+            prev=cursor_url(request, prev_cursor, pi.size) if prev_cursor else None,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
+        )
+
     links = Links(
         current_url=f"{request.url}",
         first=f"{result_url(request, 1, pi.size)}",
@@ -93,3 +145,20 @@ def result_url(request: Request, page: int, size: int) -> str:
     new_url += f'?{new_query}'
 
     return new_url
+
+
+def cursor_url(request: Request, cursor: str | None, size: int) -> str:
+    """
+    Constructs a new URL based on the provided request URL for keyset pagination.
+    Drops the page parameter; without a cursor, the URL points to the first page.
+    """
+    parsed_query = parse_qs(request.url.query)
+    parsed_query.pop('page', None)
+    parsed_query.pop('cursor', None)
+
+    parsed_query['size'] = [str(size)]
+    if cursor:
+        parsed_query['cursor'] = [cursor]
+    new_query = '&'.join(f'{key}={val[0]}' for key, val in parsed_query.items())
+
+    return f'{request.url.scheme}://{request.url.netloc}{request.url.path}?{new_query}'
@@ -0,0 +1,151 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import copy_context
+from functools import partial
+from data import database
+from data.pool import PoolTimeout
+
+# one permit per pooled connection; a call takes its permit on the event loop, before it takes a db thread,
+# so db threads never block in the pool waiting for a connection, which would leave the units of work
+# holding the connections without a thread for their next query
+CONNECTION_PERMITS = database.POOL_MAX_SIZE
+# every running call holds a permit, so this many threads are never all busy; the spare ones
+# commit and roll back units of work and run calls that share a unit of work
+DB_THREADS = database.POOL_MAX_SIZE * 2
+
+_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='db')
+_permits: asyncio.Semaphore | None = None
+
+
+def _get_permits() -> asyncio.Semaphore:
+    global _permits
+    if _permits is None:
+        _permits = asyncio.Semaphore(CONNECTION_PERMITS)
+    return _permits
+
+
+async def _take_permit() -> None:
+    try:
+        await asyncio.wait_for(_get_permits().acquire(), database.POOL_CHECKOUT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f'No free connection within {database.POOL_CHECKOUT_TIMEOUT}s') from None
+
+
+async def _execute(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(copy_context().run, func, *args))
+
+
+async def run_blocking(func, *args):
+    """
+    Runs a blocking database call on the db executor
+    - The call sees the caller's context, so it joins the request's unit of work
+    - It waits for a connection permit first, in FIFO order on the event loop, and raises PoolTimeout after
+      POOL_CHECKOUT_TIMEOUT seconds; a unit of work takes one with its first query and keeps it until
+      finish_unit_of_work(), other calls hold one while they run
+    """
+    uow = database.current_unit_of_work()
+    if uow is None:
+        await _take_permit()
+        try:
+            return await _execute(func, *args)
+        finally:
+            _get_permits().release()
+
+    if not uow.has_permit:
+        await _take_permit()
+        # another call of the same unit of work may have got one meanwhile
+        if uow.has_permit:
+            _get_permits().release()
+        uow.has_permit = True
+    return await _execute(func, *args)
+
+
+async def finish_unit_of_work(uow: database.UnitOfWork, commit: bool) -> None:
+    """
+    Commits or rolls back the unit of work on the db executor and returns its connection permit
+    """
+    try:
+        await _execute(uow.commit if commit else uow.rollback)
+    finally:
+        if uow.has_permit:
+            uow.has_permit = False
+            _get_permits().release()
+
+
+@asynccontextmanager
+async def transaction():
+    """
+    Runs the enclosed queries in a unit of work of their own, committed on exit or rolled back on error,
+    even inside another unit of work
+    """
+    with database.outside_unit_of_work():
+        uow = database.begin_unit_of_work()
+        try:
+            yield uow
+        except BaseException:
+            await finish_unit_of_work(uow, commit=False)
+            raise
+        else:
+            await finish_unit_of_work(uow, commit=True)
+        finally:
+            database.end_unit_of_work(uow)
+
+
+async def read_query(sql: str, sql_params=()):
+    return await run_blocking(database.read_query, sql, sql_params)
+
+
+async def read_query_iter(sql: str, sql_params=(), batch_size: int = database.STREAM_BATCH_SIZE):
+    """
+    Async generator over the rows of a query, fetched in batches on the db executor
+    - Reads on a connection of its own, so it holds a permit of its own until it is closed
+    """
+    await _take_permit()
+    try:
+        batches = database.read_query_batches(sql, sql_params, batch_size)
+        try:
+            while (batch := await _execute(next, batches, None)) is not None:
+                for row in batch:
+                    yield row
+        finally:
+            await _execute(batches.close)
+    finally:
+        _get_permits().release()
+
+
+async def insert_query(sql: str, sql_params=()) -> int:
+    return await run_blocking(database.insert_query, sql, sql_params)
+
+
+async def update_query(sql: str, sql_params=()) -> bool:
+    return await run_blocking(database.update_query, sql, sql_params)
+
+
+async def upsert_query(sql: str, sql_params=()) -> int:
+    return await run_blocking(database.upsert_query, sql, sql_params)
+
+
+async def query_count(sql: str, sql_params=()):
+    return await run_blocking(database.query_count, sql, sql_params)
+
+
+async def insert_many(sql: str, sql_params_seq, chunk_size: int = database.BULK_CHUNK_SIZE) -> list[tuple]:
+    return await run_blocking(database.insert_many, sql, sql_params_seq, chunk_size)
+
+
+async def update_many(sql: str, sql_params_seq, chunk_size: int = database.BULK_CHUNK_SIZE) -> int:
+    return await run_blocking(database.update_many, sql, sql_params_seq, chunk_size)
+
+
+def after_commit(callback) -> None:
+    database.after_commit(callback)
+
+
+def outside_unit_of_work():
+    return database.outside_unit_of_work()
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=True)
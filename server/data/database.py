@@ -1,52 +1,300 @@
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from mariadb import connect
 from mariadb.connections import Connection
 from hidden import database_password
+from data.pool import ConnectionPool
+
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 10
+POOL_IDLE_TIMEOUT = 300  # seconds before an idle connection above POOL_MIN_SIZE is closed
+POOL_PING_AFTER = 30  # seconds of idleness after which a connection is pinged on checkout
+POOL_CHECKOUT_TIMEOUT = 10  # seconds to wait for a free connection before PoolTimeout
+BULK_CHUNK_SIZE = 1000  # rows sent per executemany round trip
+STREAM_BATCH_SIZE = 500  # rows fetched per round trip by read_query_iter
+
+_log = logging.getLogger(__name__)
 
 
 def _get_connection() -> Connection:
+    # autocommit, so a pooled connection never carries an open read snapshot to its next user
     return connect(
         user='root',
         password=database_password,
         host='localhost',
         port=3306,
-        database='forum'
+        database='forum',
+        autocommit=True
     )
 
 
+_pool = ConnectionPool(
+    _get_connection,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    idle_timeout=POOL_IDLE_TIMEOUT,
+    ping_after=POOL_PING_AFTER,
+    checkout_timeout=POOL_CHECKOUT_TIMEOUT
+)
+
+
+def open_pool() -> None:
+    _pool.warm_up()
+
+
+def close_pool() -> None:
+    _pool.close()
+
+
+def pool_stats() -> dict:
+    return _pool.stats()
+
+
+class UnitOfWork:
+    """
+    One connection and one transaction shared by every query run inside it
+    - The connection is checked out and the transaction begun lazily, by the first query
+    - Queries inside a unit of work don't commit on their own; commit() commits them all at once
+    - Callbacks registered with after_commit() run once the commit succeeds and are dropped on rollback;
+      the commit already happened, so a failing callback is logged and doesn't stop the others
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._lock = threading.Lock()
+        self._after_commit = []
+        # whether data.async_database gave it a connection permit, kept until the unit of work finishes
+        self.has_permit = False
+
+    def after_commit(self, callback) -> None:
+        with self._lock:
+            self._after_commit.append(callback)
+
+    def connection(self) -> Connection:
+        with self._lock:
+            if self._conn is None:
+                conn = _pool.acquire()
+                try:
+                    conn.begin()
+                except BaseException:
+                    _pool.release(conn, discard=True)
+                    raise
+                self._conn = conn
+            return self._conn
+
+    def commit(self) -> None:
+        self._finish(commit=True)
+
+    def rollback(self) -> None:
+        self._finish(commit=False)
+
+    def _finish(self, commit: bool) -> None:
+        with self._lock:
+            conn, self._conn = self._conn, None
+            callbacks, self._after_commit = self._after_commit, []
+
+        if conn is not None:
+            try:
+                conn.commit() if commit else conn.rollback()
+            except BaseException:
+                _pool.release(conn, discard=True)
+                raise
+            _pool.release(conn)
+
+        if commit:
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception:
+                    _log.exception('after_commit callback %r failed', callback)
+
+
+_current_unit_of_work: ContextVar[UnitOfWork | None] = ContextVar('unit_of_work', default=None)
+
+
+def current_unit_of_work() -> UnitOfWork | None:
+    return _current_unit_of_work.get()
+
+
+def begin_unit_of_work() -> UnitOfWork:
+    """
+    Makes the queries of the current context (and of threads started from a copy of it) share a new UnitOfWork.
+    Joins the unit of work already in progress, if any.
+    """
+    uow = _current_unit_of_work.get()
+    if uow is None:
+        uow = UnitOfWork()
+        _current_unit_of_work.set(uow)
+    return uow
+
+
+def end_unit_of_work(uow: UnitOfWork) -> None:
+    if _current_unit_of_work.get() is uow:
+        _current_unit_of_work.set(None)
+
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed queries on one connection and commits them once, or rolls them back on error.
+    Nested transaction() blocks join the outer one.
+    """
+    if _current_unit_of_work.get() is not None:
+        yield _current_unit_of_work.get()
+        return
+
+    uow = begin_unit_of_work()
+    try:
+        yield uow
+    except BaseException:
+        uow.rollback()
+        raise
+    else:
+        uow.commit()
+    finally:
+        end_unit_of_work(uow)
+
+
+@contextmanager
+def outside_unit_of_work():
+    """
+    Runs the enclosed queries on connections of their own, each committed on its own, even inside a unit of work
+    """
+    token = _current_unit_of_work.set(None)
+    try:
+        yield
+    finally:
+        _current_unit_of_work.reset(token)
+
+
+def after_commit(callback) -> None:
+    """
+    Runs callback once the current unit of work commits, or right away, if there is none
+    - Keeps in-process state (caches, the search index) from seeing writes that end up rolled back
+    """
+    uow = _current_unit_of_work.get()
+    if uow is None:
+        callback()
+    else:
+        uow.after_commit(callback)
+
+
+@contextmanager
+def _connection():
+    uow = _current_unit_of_work.get()
+    if uow is not None:
+        yield uow.connection()
+        return
+
+    with _pool.connection() as conn:
+        yield conn
+
+
 def read_query(sql: str, sql_params=()):
-    with _get_connection() as conn:
-        cursor = conn.cursor()
+    with _connection() as conn, conn.cursor() as cursor:
         cursor.execute(sql, sql_params)
 
         return list(cursor)
 
 
+def read_query_iter(sql: str, sql_params=(), batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Yields the rows of a query one by one without loading the whole result set into memory
+    """
+    for batch in read_query_batches(sql, sql_params, batch_size):
+        yield from batch
+
+
+def read_query_batches(sql: str, sql_params=(), batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Yields the rows of a query in lists of up to batch_size, read from an unbuffered cursor with fetchmany
+    - Always uses a connection of its own, even inside a unit of work: the result set stays open
+      on the connection until the generator is exhausted or closed
+    """
+    with _pool.connection() as conn, conn.cursor(buffered=False) as cursor:
+        cursor.execute(sql, sql_params)
+
+        while batch := cursor.fetchmany(batch_size):
+            yield batch
+
+
 def insert_query(sql: str, sql_params=()) -> int:
-    with _get_connection() as conn:
-        cursor = conn.cursor()
+    with _connection() as conn, conn.cursor() as cursor:
         cursor.execute(sql, sql_params)
-        conn.commit()
 
         return cursor.lastrowid
 
 
 def update_query(sql: str, sql_params=()) -> bool:
-    with _get_connection() as conn:
-        cursor = conn.cursor()
+    with _connection() as conn, conn.cursor() as cursor:
         cursor.execute(sql, sql_params)
-        conn.commit()
 
         return True
 
 
+def upsert_query(sql: str, sql_params=()) -> int:
+    """
+    Runs an INSERT ... ON DUPLICATE KEY UPDATE and returns its affected rows:
+    1 - a row was inserted, 2 - the existing row was changed, 0 - it already held these values
+    - The connections don't set CLIENT_FOUND_ROWS, which would report an unchanged row as 1
+    """
+    with _connection() as conn, conn.cursor() as cursor:
+        cursor.execute(sql, sql_params)
+
+        return cursor.rowcount
+
+
 def query_count(sql: str, sql_params=()):
-    with _get_connection() as conn:
-        cursor = conn.cursor()
+    with _connection() as conn, conn.cursor() as cursor:
         cursor.execute(sql, sql_params)
 
         return cursor.fetchone()[0]
 
 
+def insert_many(sql: str, sql_params_seq, chunk_size: int = BULK_CHUNK_SIZE) -> list[tuple]:
+    """
+    Inserts many rows with executemany - one round trip and one commit per chunk
+    - Returns the rows of the statement's RETURNING clause in row order, e.g. the generated ids of
+      INSERT ... RETURNING message_id, or an empty list if it has none
+    - lastrowid after executemany isn't used: the ids of one bulk insert aren't guaranteed to be consecutive
+    """
+    rows = []
+    for _, cursor in _execute_many(sql, sql_params_seq, chunk_size):
+        if cursor.description:
+            rows.extend(cursor.fetchall())
+
+    return rows
+
+
+def update_many(sql: str, sql_params_seq, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Runs an UPDATE or DELETE for many parameter sets - one round trip and one commit per chunk
+    - Returns the number of affected rows
+    """
+    return sum(cursor.rowcount for _, cursor in _execute_many(sql, sql_params_seq, chunk_size))
+
+
+def _execute_many(sql: str, sql_params_seq, chunk_size: int):
+    in_unit_of_work = _current_unit_of_work.get() is not None
+    sql_params_seq = list(sql_params_seq)
+    if not sql_params_seq:
+        return
+
+    with _connection() as conn, conn.cursor() as cursor:
+        for start in range(0, len(sql_params_seq), chunk_size):
+            chunk = sql_params_seq[start:start + chunk_size]
+            # inside a unit of work the whole unit commits at once instead
+            if not in_unit_of_work:
+                conn.begin()
+            cursor.executemany(sql, chunk)
+            if not in_unit_of_work:
+                conn.commit()
+
+            yield chunk, cursor
+
+
 # def additional_data_seed():
 #     print('Inserting categories')
 #     insert_query("""INSERT INTO categories(name) VALUES ('NEW')""")
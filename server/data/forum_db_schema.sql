@@ -49,9 +49,12 @@ CREATE TABLE IF NOT EXISTS `forum`.`messages` (
   `text` MEDIUMTEXT NOT NULL,
   `sender_id` INT(11) NOT NULL,
   `receiver_id` INT(11) NOT NULL,
+  `user_low` INT(11) GENERATED ALWAYS AS (LEAST(`sender_id`, `receiver_id`)) STORED,
+  `user_high` INT(11) GENERATED ALWAYS AS (GREATEST(`sender_id`, `receiver_id`)) STORED,
   PRIMARY KEY (`message_id`),
   INDEX `fk_messages_users1_idx` (`sender_id` ASC) VISIBLE,
   INDEX `fk_messages_users2_idx` (`receiver_id` ASC) VISIBLE,
+  INDEX `idx_messages_conversation` (`user_low` ASC, `user_high` ASC, `message_id` ASC) VISIBLE,
   CONSTRAINT `fk_messages_users1`
     FOREIGN KEY (`sender_id`)
     REFERENCES `forum`.`users` (`user_id`)
@@ -76,10 +79,15 @@ CREATE TABLE IF NOT EXISTS `forum`.`topics` (
   `is_locked` TINYINT(2) NOT NULL DEFAULT 0,
   `best_reply_id` INT(11) NULL DEFAULT NULL,
   `category_id` INT(11) NOT NULL,
+  `reply_count` INT(11) NOT NULL DEFAULT 0,
   PRIMARY KEY (`topic_id`),
   INDEX `fk_topics_users1_idx` (`user_id` ASC) VISIBLE,
   INDEX `fk_topics_replies1_idx` (`best_reply_id` ASC) VISIBLE,
   INDEX `fk_topics_categories1_idx` (`category_id` ASC) VISIBLE,
+  INDEX `idx_topics_title` (`title` ASC) VISIBLE,
+  INDEX `idx_topics_is_locked` (`is_locked` ASC) VISIBLE,
+  INDEX `idx_topics_category_title` (`category_id` ASC, `title` ASC) VISIBLE,
+  FULLTEXT INDEX `ft_topics_title` (`title`) VISIBLE,
   CONSTRAINT `fk_topics_categories1`
     FOREIGN KEY (`category_id`)
     REFERENCES `forum`.`categories` (`category_id`)
@@ -108,9 +116,16 @@ CREATE TABLE IF NOT EXISTS `forum`.`replies` (
   `user_id` INT(11) NOT NULL,
   `topic_id` INT(11) NOT NULL,
   `edited` TINYINT(2) NOT NULL DEFAULT 0,
+  `upvotes` INT(11) NOT NULL DEFAULT 0,
+  `downvotes` INT(11) NOT NULL DEFAULT 0,
+  `score` DOUBLE NOT NULL DEFAULT 0,
+  `score_stale` TINYINT(1) NOT NULL DEFAULT 0,
   PRIMARY KEY (`reply_id`),
   INDEX `fk_replies_users1_idx` (`user_id` ASC) VISIBLE,
-  INDEX `fk_replies_topics1_idx` (`topic_id` ASC) VISIBLE,
+  INDEX `idx_replies_topic_reply` (`topic_id` ASC, `reply_id` ASC) VISIBLE,
+  INDEX `idx_replies_topic_score` (`topic_id` ASC, `score` ASC) VISIBLE,
+  INDEX `idx_replies_score_stale` (`score_stale` ASC) VISIBLE,
+  FULLTEXT INDEX `ft_replies_text` (`text`) VISIBLE,
   CONSTRAINT `fk_replies_topics1`
     FOREIGN KEY (`topic_id`)
     REFERENCES `forum`.`topics` (`topic_id`)
@@ -166,6 +181,22 @@ CREATE TABLE IF NOT EXISTS `forum`.`votes` (
 ENGINE = InnoDB
 DEFAULT CHARACTER SET = latin1;
 
+-- -----------------------------------------------------
+-- Table `forum`.`user_reputation`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `forum`.`user_reputation` (
+  `user_id` INT(11) NOT NULL,
+  `reputation` INT(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`),
+  INDEX `idx_user_reputation_reputation` (`reputation` ASC) VISIBLE,
+  CONSTRAINT `fk_user_reputation_users1`
+    FOREIGN KEY (`user_id`)
+    REFERENCES `forum`.`users` (`user_id`)
+    ON DELETE NO ACTION
+    ON UPDATE NO ACTION)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = latin1;
+
 USE `forum`;
 DELIMITER $$
 USE `forum`$$
@@ -182,6 +213,100 @@ BEGIN
     WHERE user_id = OLD.user_id;
   END IF;
 END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_reply_inserted_increment_reply_count`
+AFTER INSERT ON `forum`.`replies`
+FOR EACH ROW
+BEGIN
+  UPDATE topics SET reply_count = reply_count + 1
+  WHERE topic_id = NEW.topic_id;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_reply_deleted_decrement_reply_count`
+AFTER DELETE ON `forum`.`replies`
+FOR EACH ROW
+BEGIN
+  UPDATE topics SET reply_count = reply_count - 1
+  WHERE topic_id = OLD.topic_id;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_inserted_increment_tally`
+AFTER INSERT ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes + (NEW.type = 1),
+      downvotes = downvotes + (NEW.type = 0),
+      score_stale = 1
+  WHERE reply_id = NEW.reply_id;
+  INSERT INTO user_reputation(user_id, reputation)
+  SELECT user_id, IF(NEW.type = 1, 1, -1) FROM replies WHERE reply_id = NEW.reply_id
+  ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_updated_move_tally`
+AFTER UPDATE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  IF NEW.type <> OLD.type THEN
+    UPDATE replies
+    SET upvotes = upvotes + (NEW.type = 1) - (OLD.type = 1),
+        downvotes = downvotes + (NEW.type = 0) - (OLD.type = 0),
+        score_stale = 1
+    WHERE reply_id = NEW.reply_id;
+    INSERT INTO user_reputation(user_id, reputation)
+    SELECT user_id, IF(NEW.type = 1, 2, -2) FROM replies WHERE reply_id = NEW.reply_id
+    ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+  END IF;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_deleted_decrement_tally`
+AFTER DELETE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes - (OLD.type = 1),
+      downvotes = downvotes - (OLD.type = 0),
+      score_stale = 1
+  WHERE reply_id = OLD.reply_id;
+  INSERT INTO user_reputation(user_id, reputation)
+  SELECT user_id, IF(OLD.type = 1, -1, 1) FROM replies WHERE reply_id = OLD.reply_id
+  ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_topic_best_reply_changed_move_bonus`
+AFTER UPDATE ON `forum`.`topics`
+FOR EACH ROW
+BEGIN
+  -- 15 is reputation_services.BEST_REPLY_BONUS
+  IF NOT (NEW.best_reply_id <=> OLD.best_reply_id) THEN
+    UPDATE user_reputation ur
+    JOIN replies r ON r.user_id = ur.user_id
+    SET ur.reputation = ur.reputation - 15
+    WHERE r.reply_id = OLD.best_reply_id;
+    INSERT INTO user_reputation(user_id, reputation)
+    SELECT user_id, 15 FROM replies WHERE reply_id = NEW.best_reply_id
+    ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+  END IF;
+END$$
 DELIMITER ;
 
 
@@ -0,0 +1,74 @@
+import threading
+from sortedcontainers import SortedList
+
+
+class Leaderboard:
+    """
+    Thread-safe ranking of users by reputation, highest first, for reputation_services
+    - Keeps (-reputation, user_id) pairs in a SortedList, so a change, a user's rank and the start of the top
+      are all O(log n); users with the same reputation share a rank and are listed by user_id
+    - Users that aren't on it have no reputation, which ranks them like 0
+    - Excluded users (the deleted ones) are left out and their changes are ignored
+    - Changes arrive from after_commit callbacks, on the db threads
+    """
+
+    def __init__(self):
+        self._reputations: dict[int, int] = {}
+        self._ranked = SortedList()
+        self._excluded: set[int] = set()
+        self._lock = threading.Lock()
+
+    def load(self, reputations, excluded=()) -> None:
+        """
+        Replaces the board with the (user_id, reputation) pairs given, leaving out the excluded user_ids
+        """
+        excluded = set(excluded)
+        reputations = {user_id: reputation for user_id, reputation in reputations if user_id not in excluded}
+        ranked = SortedList((-reputation, user_id) for user_id, reputation in reputations.items())
+        with self._lock:
+            self._excluded, self._reputations, self._ranked = excluded, reputations, ranked
+
+    def add(self, user_id: int, delta: int) -> None:
+        with self._lock:
+            if not delta or user_id in self._excluded:
+                return
+
+            reputation = self._reputations.get(user_id)
+            if reputation is not None:
+                self._ranked.remove((-reputation, user_id))
+            reputation = (reputation or 0) + delta
+            self._reputations[user_id] = reputation
+            self._ranked.add((-reputation, user_id))
+
+    def exclude(self, user_id: int) -> None:
+        with self._lock:
+            self._excluded.add(user_id)
+            reputation = self._reputations.pop(user_id, None)
+            if reputation is not None:
+                self._ranked.remove((-reputation, user_id))
+
+    def rank(self, user_id: int) -> tuple[int, int]:
+        """
+        Returns the user's rank, 1 + the number of users with a higher reputation, and reputation
+        """
+        with self._lock:
+            reputation = self._reputations.get(user_id, 0)
+            return self._ranked.bisect_left((-reputation,)) + 1, reputation
+
+    def top(self, n: int) -> list[tuple[int, int, int]]:
+        """
+        Returns the (rank, user_id, reputation) of the first n users
+        """
+        with self._lock:
+            first = list(self._ranked.islice(0, n))
+
+        top, rank = [], 0
+        for position, (negated, user_id) in enumerate(first):
+            if not top or -negated != top[-1][2]:
+                rank = position + 1
+            top.append((rank, user_id, -negated))
+
+        return top
+
+    def __len__(self):
+        return len(self._ranked)
@@ -0,0 +1,11 @@
+-- -----------------------------------------------------
+-- Indexes for keyset pagination of topic listings
+-- InnoDB appends the primary key to every secondary index, so each of these is
+-- ordered by (sort column, topic_id) - exactly the order keyset pages are read in
+-- -----------------------------------------------------
+USE `forum` ;
+
+ALTER TABLE `forum`.`topics`
+  ADD INDEX IF NOT EXISTS `idx_topics_title` (`title` ASC),
+  ADD INDEX IF NOT EXISTS `idx_topics_is_locked` (`is_locked` ASC),
+  ADD INDEX IF NOT EXISTS `idx_topics_category_title` (`category_id` ASC, `title` ASC);
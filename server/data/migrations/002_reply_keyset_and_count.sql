@@ -0,0 +1,45 @@
+-- -----------------------------------------------------
+-- Keyset pagination of replies and the per-topic reply count
+-- - replies are read in (topic_id, reply_id) order; the composite index replaces
+--   the single-column foreign key index, which it covers
+-- - topics.reply_count is kept up to date by triggers and backfilled once here
+-- -----------------------------------------------------
+USE `forum` ;
+
+ALTER TABLE `forum`.`replies`
+  ADD INDEX IF NOT EXISTS `idx_replies_topic_reply` (`topic_id` ASC, `reply_id` ASC);
+
+ALTER TABLE `forum`.`replies`
+  DROP INDEX IF EXISTS `fk_replies_topics1_idx`;
+
+ALTER TABLE `forum`.`topics`
+  ADD COLUMN IF NOT EXISTS `reply_count` INT(11) NOT NULL DEFAULT 0;
+
+DELIMITER $$
+USE `forum`$$
+DROP TRIGGER IF EXISTS `forum`.`after_reply_inserted_increment_reply_count`$$
+DROP TRIGGER IF EXISTS `forum`.`after_reply_deleted_decrement_reply_count`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_reply_inserted_increment_reply_count`
+AFTER INSERT ON `forum`.`replies`
+FOR EACH ROW
+BEGIN
+  UPDATE topics SET reply_count = reply_count + 1
+  WHERE topic_id = NEW.topic_id;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_reply_deleted_decrement_reply_count`
+AFTER DELETE ON `forum`.`replies`
+FOR EACH ROW
+BEGIN
+  UPDATE topics SET reply_count = reply_count - 1
+  WHERE topic_id = OLD.topic_id;
+END$$
+DELIMITER ;
+
+UPDATE `forum`.`topics` t
+  SET t.reply_count = (SELECT COUNT(*) FROM `forum`.`replies` r WHERE r.topic_id = t.topic_id);
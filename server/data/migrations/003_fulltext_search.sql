@@ -0,0 +1,11 @@
+-- -----------------------------------------------------
+-- FULLTEXT indexes behind GET /search/topics and GET /search/replies
+-- Words shorter than innodb_ft_min_token_size (3 by default) are not indexed
+-- -----------------------------------------------------
+USE `forum` ;
+
+ALTER TABLE `forum`.`topics`
+  ADD FULLTEXT INDEX IF NOT EXISTS `ft_topics_title` (`title`);
+
+ALTER TABLE `forum`.`replies`
+  ADD FULLTEXT INDEX IF NOT EXISTS `ft_replies_text` (`text`);
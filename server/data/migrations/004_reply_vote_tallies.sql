@@ -0,0 +1,61 @@
+-- -----------------------------------------------------
+-- Materialized vote tallies per reply
+-- - replies.upvotes / replies.downvotes are kept up to date by triggers on votes
+--   and backfilled once here; votes_services.reconcile_tallies() repairs any drift
+-- -----------------------------------------------------
+USE `forum` ;
+
+ALTER TABLE `forum`.`replies`
+  ADD COLUMN IF NOT EXISTS `upvotes` INT(11) NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS `downvotes` INT(11) NOT NULL DEFAULT 0;
+
+DELIMITER $$
+USE `forum`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_inserted_increment_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_updated_move_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_deleted_decrement_tally`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_inserted_increment_tally`
+AFTER INSERT ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes + (NEW.type = 1),
+      downvotes = downvotes + (NEW.type = 0)
+  WHERE reply_id = NEW.reply_id;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_updated_move_tally`
+AFTER UPDATE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  IF NEW.type <> OLD.type THEN
+    UPDATE replies
+    SET upvotes = upvotes + (NEW.type = 1) - (OLD.type = 1),
+        downvotes = downvotes + (NEW.type = 0) - (OLD.type = 0)
+    WHERE reply_id = NEW.reply_id;
+  END IF;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_deleted_decrement_tally`
+AFTER DELETE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes - (OLD.type = 1),
+      downvotes = downvotes - (OLD.type = 0)
+  WHERE reply_id = OLD.reply_id;
+END$$
+DELIMITER ;
+
+UPDATE `forum`.`replies` r
+  LEFT JOIN (SELECT reply_id, SUM(type = 1) AS up, SUM(type = 0) AS down
+             FROM `forum`.`votes` GROUP BY reply_id) v ON v.reply_id = r.reply_id
+  SET r.upvotes = COALESCE(v.up, 0), r.downvotes = COALESCE(v.down, 0);
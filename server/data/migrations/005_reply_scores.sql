@@ -0,0 +1,68 @@
+-- -----------------------------------------------------
+-- "Best" ordering of replies
+-- - replies.score is the Wilson lower bound of the share of upvotes, computed in batches
+--   by scores_services.recompute_scores() for the replies marked score_stale
+-- - the vote tally triggers are replaced by ones that also mark the reply score_stale
+-- - InnoDB appends reply_id to idx_replies_topic_score, so a topic's replies are read
+--   in (score, reply_id) order straight from the index
+-- -----------------------------------------------------
+USE `forum` ;
+
+ALTER TABLE `forum`.`replies`
+  ADD COLUMN IF NOT EXISTS `score` DOUBLE NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS `score_stale` TINYINT(1) NOT NULL DEFAULT 0,
+  ADD INDEX IF NOT EXISTS `idx_replies_topic_score` (`topic_id` ASC, `score` ASC),
+  ADD INDEX IF NOT EXISTS `idx_replies_score_stale` (`score_stale` ASC);
+
+DELIMITER $$
+USE `forum`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_inserted_increment_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_updated_move_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_deleted_decrement_tally`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_inserted_increment_tally`
+AFTER INSERT ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes + (NEW.type = 1),
+      downvotes = downvotes + (NEW.type = 0),
+      score_stale = 1
+  WHERE reply_id = NEW.reply_id;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_updated_move_tally`
+AFTER UPDATE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  IF NEW.type <> OLD.type THEN
+    UPDATE replies
+    SET upvotes = upvotes + (NEW.type = 1) - (OLD.type = 1),
+        downvotes = downvotes + (NEW.type = 0) - (OLD.type = 0),
+        score_stale = 1
+    WHERE reply_id = NEW.reply_id;
+  END IF;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_deleted_decrement_tally`
+AFTER DELETE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes - (OLD.type = 1),
+      downvotes = downvotes - (OLD.type = 0),
+      score_stale = 1
+  WHERE reply_id = OLD.reply_id;
+END$$
+DELIMITER ;
+
+UPDATE `forum`.`replies`
+  SET score_stale = 1
+  WHERE upvotes > 0 OR downvotes > 0;
@@ -0,0 +1,114 @@
+-- -----------------------------------------------------
+-- User reputation
+-- - user_reputation holds +1 per upvote and -1 per downvote on a user's replies, plus 15
+--   (reputation_services.BEST_REPLY_BONUS) per reply chosen as the best of its topic
+-- - the vote tally triggers are replaced by ones that also credit the reply's author,
+--   and a trigger on topics moves the bonus when the best reply changes
+-- - reputation_services keeps the table ranked in memory; backfilled once here
+-- -----------------------------------------------------
+USE `forum` ;
+
+-- -----------------------------------------------------
+-- Table `forum`.`user_reputation`
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `forum`.`user_reputation` (
+  `user_id` INT(11) NOT NULL,
+  `reputation` INT(11) NOT NULL DEFAULT 0,
+  PRIMARY KEY (`user_id`),
+  INDEX `idx_user_reputation_reputation` (`reputation` ASC) VISIBLE,
+  CONSTRAINT `fk_user_reputation_users1`
+    FOREIGN KEY (`user_id`)
+    REFERENCES `forum`.`users` (`user_id`)
+    ON DELETE NO ACTION
+    ON UPDATE NO ACTION)
+ENGINE = InnoDB
+DEFAULT CHARACTER SET = latin1;
+
+DELIMITER $$
+USE `forum`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_inserted_increment_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_updated_move_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_vote_deleted_decrement_tally`$$
+DROP TRIGGER IF EXISTS `forum`.`after_topic_best_reply_changed_move_bonus`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_inserted_increment_tally`
+AFTER INSERT ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes + (NEW.type = 1),
+      downvotes = downvotes + (NEW.type = 0),
+      score_stale = 1
+  WHERE reply_id = NEW.reply_id;
+  INSERT INTO user_reputation(user_id, reputation)
+  SELECT user_id, IF(NEW.type = 1, 1, -1) FROM replies WHERE reply_id = NEW.reply_id
+  ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_updated_move_tally`
+AFTER UPDATE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  IF NEW.type <> OLD.type THEN
+    UPDATE replies
+    SET upvotes = upvotes + (NEW.type = 1) - (OLD.type = 1),
+        downvotes = downvotes + (NEW.type = 0) - (OLD.type = 0),
+        score_stale = 1
+    WHERE reply_id = NEW.reply_id;
+    INSERT INTO user_reputation(user_id, reputation)
+    SELECT user_id, IF(NEW.type = 1, 2, -2) FROM replies WHERE reply_id = NEW.reply_id
+    ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+  END IF;
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_vote_deleted_decrement_tally`
+AFTER DELETE ON `forum`.`votes`
+FOR EACH ROW
+BEGIN
+  UPDATE replies
+  SET upvotes = upvotes - (OLD.type = 1),
+      downvotes = downvotes - (OLD.type = 0),
+      score_stale = 1
+  WHERE reply_id = OLD.reply_id;
+  INSERT INTO user_reputation(user_id, reputation)
+  SELECT user_id, IF(OLD.type = 1, -1, 1) FROM replies WHERE reply_id = OLD.reply_id
+  ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+END$$
+
+USE `forum`$$
+CREATE
+DEFINER=`root`@`localhost`
+TRIGGER `forum`.`after_topic_best_reply_changed_move_bonus`
+AFTER UPDATE ON `forum`.`topics`
+FOR EACH ROW
+BEGIN
+  -- 15 is reputation_services.BEST_REPLY_BONUS
+  IF NOT (NEW.best_reply_id <=> OLD.best_reply_id) THEN
+    UPDATE user_reputation ur
+    JOIN replies r ON r.user_id = ur.user_id
+    SET ur.reputation = ur.reputation - 15
+    WHERE r.reply_id = OLD.best_reply_id;
+    INSERT INTO user_reputation(user_id, reputation)
+    SELECT user_id, 15 FROM replies WHERE reply_id = NEW.best_reply_id
+    ON DUPLICATE KEY UPDATE reputation = reputation + VALUES(reputation);
+  END IF;
+END$$
+DELIMITER ;
+
+DELETE FROM `forum`.`user_reputation`;
+INSERT INTO `forum`.`user_reputation`(user_id, reputation)
+  SELECT user_id, SUM(points) FROM (
+    SELECT r.user_id, IF(v.type = 1, 1, -1) AS points
+    FROM `forum`.`votes` v JOIN `forum`.`replies` r ON r.reply_id = v.reply_id
+    UNION ALL
+    SELECT r.user_id, 15 AS points
+    FROM `forum`.`topics` t JOIN `forum`.`replies` r ON r.reply_id = t.best_reply_id
+  ) p
+  GROUP BY user_id;
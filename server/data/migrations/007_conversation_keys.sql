@@ -0,0 +1,15 @@
+-- -----------------------------------------------------
+-- Keyset pagination of conversations
+-- - a conversation is keyed by (user_low, user_high), the smaller and the larger of its two
+--   user ids, whichever of them sent the message; both are stored generated columns
+-- - idx_messages_conversation reads a conversation in message_id order, so a page of it is
+--   one seek, instead of an OR over the sender and receiver indexes
+-- -----------------------------------------------------
+USE `forum` ;
+
+ALTER TABLE `forum`.`messages`
+  ADD COLUMN IF NOT EXISTS `user_low` INT(11) GENERATED ALWAYS AS (LEAST(`sender_id`, `receiver_id`)) STORED,
+  ADD COLUMN IF NOT EXISTS `user_high` INT(11) GENERATED ALWAYS AS (GREATEST(`sender_id`, `receiver_id`)) STORED;
+
+ALTER TABLE `forum`.`messages`
+  ADD INDEX IF NOT EXISTS `idx_messages_conversation` (`user_low` ASC, `user_high` ASC, `message_id` ASC);
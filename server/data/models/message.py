@@ -19,3 +19,9 @@ class Message(BaseModel):
 
 class MessageText(BaseModel):
     text: str  # = Field(..., min_length=1)
+
+
+class ConversationPage(BaseModel):
+    messages: list[Message]
+    before: int | None = None  # pass as before to get the older messages, None if there are none
+    after: int | None = None  # pass as after to get the newer messages, None if there were none yet
@@ -10,12 +10,16 @@ class ReplyResponse(BaseModel):
     text: str
     username: str
     topic_id: int
+    upvotes: int = 0
+    downvotes: int = 0
 
     @classmethod
-    def from_query(cls, reply_id, text, username, topic_id):
+    def from_query(cls, reply_id, text, username, topic_id, upvotes=0, downvotes=0):
         return cls(
             reply_id=reply_id,
             text=text,
             username=username,
-            topic_id=topic_id
+            topic_id=topic_id,
+            upvotes=upvotes,
+            downvotes=downvotes
         )
@@ -0,0 +1,53 @@
+from pydantic import BaseModel
+from common.utils import Links, PaginationInfo
+from data.models.reply import ReplyResponse
+from data.models.topic import TopicResponse
+
+
+class TopicSearchResult(TopicResponse):
+    score: float
+
+    @classmethod
+    def from_query(cls, topic_id, title, user_id, author, status, best_reply_id, category_id, category_name, score):
+        topic = TopicResponse.from_query(
+            topic_id, title, user_id, author, status, best_reply_id, category_id, category_name)
+        return cls(**topic.model_dump(), score=score)
+
+
+class ReplySearchResult(ReplyResponse):
+    score: float
+
+    @classmethod
+    def from_query(cls, reply_id, text, username, topic_id, score):
+        return cls(
+            reply_id=reply_id,
+            text=text,
+            username=username,
+            topic_id=topic_id,
+            score=score
+        )
+
+
+class SearchHit(BaseModel):
+    type: str
+    id: int
+    topic_id: int | None
+    score: int
+
+
+class TopicSearchPaginate(BaseModel):
+    topics: list[TopicSearchResult]
+    pagination_info: PaginationInfo
+    links: Links
+
+
+class ReplySearchPaginate(BaseModel):
+    replies: list[ReplySearchResult]
+    pagination_info: PaginationInfo
+    links: Links
+
+
+class SearchHitsPaginate(BaseModel):
+    hits: list[SearchHit]
+    pagination_info: PaginationInfo
+    links: Links
@@ -63,6 +63,13 @@ class UserInfo(BaseModel):
         )
 
 
+class UserRank(BaseModel):
+    rank: int
+    user_id: int
+    username: str | None
+    reputation: int
+
+
 class AnonymousUser:
     pass
 
@@ -75,3 +82,4 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: str
     is_admin: bool
+    user_id: int | None = None  # tokens issued before the claim was added don't carry it
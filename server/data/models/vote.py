@@ -1,3 +1,22 @@
+from pydantic import BaseModel
+
+
 class VoteStatus:
     str_to_int = {'up': 1, 'down': 0}
     int_to_str = {0: 'down', 1: 'up'}
+
+
+class ReplyVotes(BaseModel):
+    reply_id: int
+    vote: str | None  # the caller's vote: up, down or None
+    upvotes: int
+    downvotes: int
+
+    @classmethod
+    def from_query(cls, reply_id, vote, upvotes, downvotes):
+        return cls(
+            reply_id=reply_id,
+            vote=VoteStatus.int_to_str.get(vote),
+            upvotes=upvotes,
+            downvotes=downvotes
+        )
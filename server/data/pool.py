@@ -0,0 +1,198 @@
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections
+    - Keeps up to max_size connections open, never reaps below min_size
+    - Pings a connection on checkout, if it was idle longer than ping_after seconds, and replaces it if dead
+    - Closes connections idle longer than idle_timeout seconds
+    - Waits up to checkout_timeout seconds for a free connection, then raises PoolTimeout
+    """
+
+    def __init__(self, connect, min_size: int = 2, max_size: int = 10, idle_timeout: float = 300,
+                 ping_after: float = 30, checkout_timeout: float = 10):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1')
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()  # (connection, released_at), most recently released on the right
+        self._size = 0  # idle + checked out
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._created = 0
+        self._discarded = 0
+
+    def warm_up(self) -> None:
+        """
+        Opens connections until min_size are available
+        """
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            self.release(self._open())
+
+    def acquire(self):
+        deadline = monotonic() + self.checkout_timeout
+        wait_started = None
+        expired = []
+
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout('Connection pool is closed')
+
+                    expired += self._pop_expired()
+                    if self._idle:
+                        conn, released_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        conn, released_at = None, None
+                        self._size += 1
+                        break
+
+                    if wait_started is None:
+                        wait_started = monotonic()
+                        self._waits += 1
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self._wait_time += monotonic() - wait_started
+                        raise PoolTimeout(f'No free connection within {self.checkout_timeout}s')
+                    self._cond.wait(remaining)
+
+                self._checkouts += 1
+                if wait_started is not None:
+                    self._wait_time += monotonic() - wait_started
+        finally:
+            self._close_all(expired)
+
+        if conn is None:
+            return self._open()
+
+        if monotonic() - released_at >= self.ping_after and not self._is_alive(conn):
+            self._close_all([conn])
+            with self._cond:
+                self._discarded += 1
+            return self._open()
+
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, monotonic()))
+            expired = self._pop_expired()
+            self._cond.notify()
+
+        if discard or self._closed:
+            expired.append(conn)
+        self._close_all(expired)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            # a failed statement may leave an open transaction or a broken socket behind
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+            else:
+                self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        self._close_all(idle)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'created': self._created,
+                'discarded': self._discarded
+            }
+
+    def _open(self):
+        """
+        Opens a connection for a slot already counted in _size
+        """
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _pop_expired(self) -> list:
+        """
+        Must be called with the lock held; the oldest idle connections are on the left
+        """
+        expired = []
+        now = monotonic()
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0][1] >= self.idle_timeout):
+            expired.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._discarded += 1
+
+        return expired
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_all(connections) -> None:
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,206 @@
+import json
+import os
+
+# vote values: 1 - up, 0 - down, None - no vote
+
+
+def _tally(vote: int | None) -> tuple[int, int]:
+    return (1, 0) if vote == 1 else (0, 1) if vote == 0 else (0, 0)
+
+
+class VoteBuffer:
+    """
+    Votes accepted but not yet written to the votes table, for the write-behind mode of votes_services
+    - Each (reply_id, user_id) holds [persisted, current]: the vote the table has and the one to write
+    - take() moves the pending votes to a flushing set that stays visible to reads until done()
+      reports how writing them went; votes cast meanwhile are pending again, on top of the flushing ones
+    - journal: optional path of an append-only file every change is written to before it is acknowledged,
+      so that changes not yet flushed survive a crash; see replay()
+    - fsync: the journal is also fsynced, in batches off the event loop; see take_unsynced()
+    - Used from the event loop only, so it needs no lock
+    """
+
+    def __init__(self, journal: str | None = None, fsync: bool = False):
+        self.journal = journal
+        self.fsync = fsync
+        self._pending: dict[tuple[int, int], list] = {}
+        self._flushing: dict[tuple[int, int], list] = {}
+        self._by_reply: dict[int, set[int]] = {}  # reply_id -> user_ids with pending or flushing votes
+        self._journal_file = None
+        self._unsynced = False  # the journal file has changes not fsynced yet
+        self._retired: list[int] = []  # descriptors of rotated journal files with changes not fsynced yet
+
+    def knows(self, reply_id: int, user_id: int) -> bool:
+        key = (reply_id, user_id)
+        return key in self._pending or key in self._flushing
+
+    def get(self, reply_id: int, user_id: int) -> int | None:
+        key = (reply_id, user_id)
+        entry = self._pending.get(key) or self._flushing[key]
+        return entry[1]
+
+    def set(self, reply_id: int, user_id: int, vote: int | None, persisted: int | None = None) -> int | None:
+        """
+        Records the user's vote on the reply; persisted is what the table holds, needed only for votes
+        the buffer doesn't know yet
+        - Returns the vote it replaces
+        """
+        key = (reply_id, user_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            flushing = self._flushing.get(key)
+            # once the flushing votes are written, the table holds their current value
+            base = flushing[1] if flushing else persisted
+            entry = self._pending[key] = [base, base]
+            self._by_reply.setdefault(reply_id, set()).add(user_id)
+
+        previous, entry[1] = entry[1], vote
+        if self.journal:
+            self._write_journal(reply_id, user_id, vote)
+        return previous
+
+    def tally_delta(self, reply_id: int) -> tuple[int, int]:
+        """
+        Returns how much the buffered votes change the reply's (upvotes, downvotes) in the table
+        """
+        up = down = 0
+        for user_id in self._by_reply.get(reply_id, ()):
+            key = (reply_id, user_id)
+            base = (self._flushing.get(key) or self._pending[key])[0]
+            current = (self._pending.get(key) or self._flushing[key])[1]
+            (up_now, down_now), (up_base, down_base) = _tally(current), _tally(base)
+            up += up_now - up_base
+            down += down_now - down_base
+
+        return up, down
+
+    def take(self) -> list[tuple[int, int, int | None]]:
+        """
+        Moves the pending votes to the flushing set
+        - Returns the (reply_id, user_id, vote) that differ from the table
+        """
+        if self._flushing:
+            raise RuntimeError('The previous flush is not done')
+
+        self._flushing, self._pending = self._pending, {}
+        if self.journal:
+            self._rotate_journal()
+
+        return [(reply_id, user_id, current)
+                for (reply_id, user_id), (persisted, current) in self._flushing.items()
+                if current != persisted]
+
+    def done(self, written: bool) -> None:
+        """
+        Ends a flush: drops the flushing votes once they are written, otherwise makes them pending again
+        """
+        flushing, self._flushing = self._flushing, {}
+        if written:
+            if self.journal:
+                _remove(self.journal + '.flushing')
+        else:
+            for key, (persisted, current) in flushing.items():
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [persisted, current]
+                    if self.journal:
+                        self._write_journal(*key, current)
+                else:
+                    entry[0] = persisted
+            if self.journal:
+                # the votes made pending again are in the live journal now
+                _remove(self.journal + '.flushing')
+
+        for reply_id, user_id in flushing:
+            if (reply_id, user_id) not in self._pending:
+                users = self._by_reply[reply_id]
+                users.discard(user_id)
+                if not users:
+                    del self._by_reply[reply_id]
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _write_journal(self, reply_id: int, user_id: int, vote: int | None) -> None:
+        if self._journal_file is None:
+            self._journal_file = open(self.journal, 'a')
+        self._journal_file.write(json.dumps([reply_id, user_id, vote]) + '\n')
+        self._journal_file.flush()
+        self._unsynced = self.fsync
+
+    def take_unsynced(self) -> list[int]:
+        """
+        Returns duplicated descriptors of the journal files with changes not fsynced yet, for the caller
+        to pass to fsync_all() off the event loop
+        """
+        fds, self._retired = self._retired, []
+        if self._unsynced:
+            fds.append(os.dup(self._journal_file.fileno()))
+            self._unsynced = False
+
+        return fds
+
+    @staticmethod
+    def fsync_all(fds: list[int]) -> None:
+        """
+        fsyncs and closes the descriptors given by take_unsynced(); blocks, so runs on a thread
+        """
+        try:
+            for fd in fds:
+                os.fsync(fd)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def _rotate_journal(self) -> None:
+        # the flushing votes keep their journal until done() learns whether they were written
+        if self._unsynced:
+            self._retired.append(os.dup(self._journal_file.fileno()))
+            self._unsynced = False
+        self._close_journal_file()
+        if os.path.exists(self.journal):
+            os.replace(self.journal, self.journal + '.flushing')
+
+    def close(self) -> None:
+        self._close_journal_file()
+        self._unsynced = False
+        for fd in self._retired:
+            os.close(fd)
+        self._retired = []
+
+    def _close_journal_file(self) -> None:
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+
+    @staticmethod
+    def replay(journal: str) -> list[tuple[int, int, int | None]]:
+        """
+        Reads the changes of a journal left by a previous run, the older .flushing file first
+        - Returns the last (reply_id, user_id, vote) of each vote; the caller writes them and then
+          removes the files with discard_journal()
+        """
+        votes = {}
+        for path in (journal + '.flushing', journal):
+            if not os.path.exists(path):
+                continue
+            with open(path) as file:
+                for line in file:
+                    try:
+                        reply_id, user_id, vote = json.loads(line)
+                    except ValueError:
+                        # the last line of a crashed run may be cut short
+                        continue
+                    votes[(reply_id, user_id)] = vote
+
+        return [(reply_id, user_id, vote) for (reply_id, user_id), vote in votes.items()]
+
+    @staticmethod
+    def discard_journal(journal: str) -> None:
+        for path in (journal + '.flushing', journal):
+            _remove(path)
+
+
+def _remove(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
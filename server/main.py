@@ -1,21 +1,60 @@
 import uvicorn
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse
+from common import passwords
+from common.responses import SC
+from common.transactions import get_unit_of_work
+from data.database import open_pool, close_pool, POOL_CHECKOUT_TIMEOUT
+from data.pool import PoolTimeout
+from data import async_database
+from services import categories_services, reputation_services, scores_services, search_services, votes_services
 from routers.users import users_router
 from routers.categories import categories_router
 from routers.topics import topics_router
 from routers.admin import admin_router
 from routers.replies import replies_router
-from routers.votes import votes_router
+from routers.votes import votes_router, topic_votes_router
 from routers.messages import messages_router
+from routers.search import search_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_pool()
+    await categories_services.load_catalog()
+    await reputation_services.load_leaderboard()
+    index_task = await search_services.open_index()
+    vote_task = await votes_services.start_vote_buffer()
+    score_task = await scores_services.start_score_updater()
+    yield
+    await scores_services.stop_score_updater(score_task)
+    await votes_services.stop_vote_buffer(vote_task)
+    await search_services.close_index(index_task)
+    passwords.shutdown()
+    async_database.shutdown()
+    close_pool()
+
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(get_unit_of_work)])
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    # every connection stayed busy for POOL_CHECKOUT_TIMEOUT seconds: the server is overloaded, not broken
+    return JSONResponse(status_code=SC.ServiceUnavailable, content={'detail': 'Server busy, try again later'},
+                        headers={'Retry-After': str(POOL_CHECKOUT_TIMEOUT)})
+
 
-app = FastAPI()
 app.include_router(users_router)
 app.include_router(categories_router)
 app.include_router(topics_router)
 app.include_router(admin_router)
 app.include_router(replies_router)
 app.include_router(votes_router)
+app.include_router(topic_votes_router)
 app.include_router(messages_router)
+app.include_router(search_router)
 
 if __name__ == '__main__':
     uvicorn.run('main:app', host='127.0.0.1', port=8000)
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, HTTPException
 from common.responses import SC, HTTPBadRequest, HTTPForbidden, HTTPNotFound, HTTPUnauthorized
+from data.database import pool_stats
 from data.models.category import Category
 from routers.topics import switch_topic_locking_helper
-from services import categories_services, users_services
-from common.oauth import AdminAuthDep
+from services import categories_services, reputation_services, topics_services, users_services, votes_services
+from common.oauth import AdminAuthDep, verified_token_cache_stats
 
 admin_router = APIRouter(prefix='/admin', tags=['admin'])
 
@@ -11,12 +12,12 @@ admin_router = APIRouter(prefix='/admin', tags=['admin'])
 # ============================== Categories ==============================
 
 @admin_router.post('/categories', status_code=201)
-def create_category(category: Category, current_admin: AdminAuthDep):
+async def create_category(category: Category, current_admin: AdminAuthDep):
     """
     - Admin can create a Category
     - Category names must be unique
     """
-    result = categories_services.create(category)
+    result = await categories_services.create(category)
     if isinstance(result, categories_services.IntegrityError):
         raise HTTPBadRequest(result.msg)
 
@@ -24,90 +25,111 @@ def create_category(category: Category, current_admin: AdminAuthDep):
 
 
 @admin_router.patch('/categories/{category_id}/privacy', status_code=202)
-def switch_category_privacy(category_id: int, current_admin: AdminAuthDep):
+async def switch_category_privacy(category_id: int, current_admin: AdminAuthDep):
     """
     - Admin can make a Category private or public, if it exists
     """
-    category = categories_services.get_by_id(category_id)
+    category = await categories_services.get_by_id(category_id)
     if not category:
         raise HTTPNotFound()
 
-    categories_services.update_privacy(not category.is_private, category_id)
+    await categories_services.update_privacy(not category.is_private, category_id)
     return f'Category {category.name} is {'public' if category.is_private else 'private'} now'
 
 
 @admin_router.patch('/categories/{category_id}/locking', status_code=202)
-def switch_category_locking(category_id: int, current_admin: AdminAuthDep):
+async def switch_category_locking(category_id: int, current_admin: AdminAuthDep):
     """
     - Admin can lock or unlock a Category, if it exists
     - Locked Categories don't accept new Topics
     """
-    category = categories_services.get_by_id(category_id)
+    category = await categories_services.get_by_id(category_id)
     if not category:
         raise HTTPNotFound("No such category")
 
-    categories_services.update_locking(not category.is_locked, category_id)
+    await categories_services.update_locking(not category.is_locked, category_id)
     return f'Category {category.name} is {'unlocked' if category.is_locked else 'locked'} now'
 
 
 # ============================== Users ==============================
 
 @admin_router.post('/users/{user_id}/categories/{category_id}')
-def give_user_category_read_access(user_id: int, category_id: int, current_admin: AdminAuthDep):
+async def give_user_category_read_access(user_id: int, category_id: int, current_admin: AdminAuthDep):
     """
     - Admin can give a regular user read access to a private Category
     """
-    if not users_services.get_by_id(user_id) or not categories_services.get_by_id(category_id):
+    if not await users_services.get_by_id(user_id) or not await categories_services.get_by_id(category_id):
         raise HTTPNotFound('No such user or category')
 
-    if categories_services.is_user_in(user_id, category_id):
+    if await categories_services.is_user_in(user_id, category_id):
         raise HTTPBadRequest('User is already in the category')
 
-    categories_services.add_user(user_id, category_id)
+    await categories_services.add_user(user_id, category_id)
     return 'User successfully added to that category and he can read'
 
 
+@admin_router.post('/users/categories/{category_id}')
+async def give_users_category_read_access(category_id: int, current_admin: AdminAuthDep,
+                                          user_ids: list[int] = Body(...)):
+    """
+    - Admin can give many regular users read access to a private Category at once
+    - Users who are already in the Category are skipped
+    """
+    if not user_ids:
+        raise HTTPBadRequest('No users provided')
+
+    if not await categories_services.get_by_id(category_id):
+        raise HTTPNotFound('No such category')
+
+    missing = set(user_ids) - await users_services.get_existing_ids(user_ids)
+    if missing:
+        raise HTTPNotFound(f'No such users: {", ".join(map(str, sorted(missing)))}')
+
+    added = await categories_services.add_users(user_ids, category_id)
+    return f'{len(added)} users successfully added to that category and they can read'
+
+
 @admin_router.delete('/users/{user_id}/categories/{category_id}')
-def revoke_user_category_read_access(user_id: int, category_id: int, current_admin: AdminAuthDep):
+async def revoke_user_category_read_access(user_id: int, category_id: int, current_admin: AdminAuthDep):
     """
     - Admin can revoke a regular user's read access to a private Category
     """
-    if not users_services.get_by_id(user_id) or not categories_services.get_by_id(category_id):
+    if not await users_services.get_by_id(user_id) or not await categories_services.get_by_id(category_id):
         raise HTTPNotFound('No such user or category')
 
-    categories_services.remove_user(user_id, category_id)
+    await categories_services.remove_user(user_id, category_id)
     return 'User is not in that category anymore'
 
 
 @admin_router.patch('/users/{user_id}/categories/{category_id}/access')
-def switch_user_category_write_access(user_id: int, category_id: int, current_admin: AdminAuthDep):
+async def switch_user_category_write_access(user_id: int, category_id: int, current_admin: AdminAuthDep):
     """
     - Admin can give / revoke a regular user's write access to a private Category
     """
-    if not users_services.get_by_id(user_id) or not categories_services.get_by_id(category_id):
+    if not await users_services.get_by_id(user_id) or not await categories_services.get_by_id(category_id):
         raise HTTPNotFound('No such user or category')
 
-    access = categories_services.get_user_access_level(user_id, category_id)
+    access = await categories_services.get_user_access_level(user_id, category_id)
     if access is None:
         return "User is not in that category"
 
-    categories_services.update_user_access_level(
+    await categories_services.update_user_access_level(
         user_id, category_id, not access)
     return f"User {'cannot' if access else 'can'} write"
 
 
 @admin_router.get('/users/categories/{category_id}')
-def view_privileged_users(category_id: int, current_admin: AdminAuthDep):
+async def view_privileged_users(category_id: int, current_admin: AdminAuthDep):
     """
     - Admin can view all regular users who have access to a private Category
     """
-    category = categories_services.get_by_id(category_id)
+    category = await categories_services.get_by_id(category_id)
     if not category:
         raise HTTPNotFound('No such category')
     elif not category.is_private:
         return f'This category is public'
 
-    users = categories_services.get_privileged_users(category_id)
+    users = await categories_services.get_privileged_users(category_id)
     if not users:
         return "No users in that category"
 
@@ -118,9 +140,46 @@ def view_privileged_users(category_id: int, current_admin: AdminAuthDep):
 # ============================== Topics ==============================
 
 @admin_router.patch('/topics/{topic_id}/locking')
-def switch_topic_locking(topic_id: int, current_admin: AdminAuthDep):
+async def switch_topic_locking(topic_id: int, current_admin: AdminAuthDep):
     """
     - Admin can lock/unlock a Topic
     - A locked Topic no longer accepts Replies
     """
-    return switch_topic_locking_helper(topic_id, current_admin)
+    return await switch_topic_locking_helper(topic_id, current_admin)
+
+
+# ============================== Votes ==============================
+
+@admin_router.post('/votes/reconcile')
+async def reconcile_vote_tallies(current_admin: AdminAuthDep):
+    """
+    - Admin can recount the votes of every Reply and repair the tallies that drifted from them
+    """
+    await votes_services.reconcile_tallies()
+    return 'Vote tallies reconciled'
+
+
+@admin_router.post('/reputation/reconcile')
+async def reconcile_reputation(current_admin: AdminAuthDep):
+    """
+    - Admin can recount the reputation of every User from the votes and best Replies and reload the leaderboard
+    """
+    await reputation_services.reconcile_reputation()
+    return 'Reputation reconciled'
+
+
+# ============================== Stats ==============================
+
+@admin_router.get('/stats')
+async def get_stats(current_admin: AdminAuthDep):
+    """
+    - Admin can see the counters of the connection pool and the in-process caches
+    """
+    return {
+        'pool': pool_stats(),
+        'total_counts': topics_services.total_count_cache_stats(),
+        'permissions': categories_services.permissions_cache_stats(),
+        'users': users_services.user_cache_stats(),
+        'verified_tokens': verified_token_cache_stats(),
+        'login_throttle': users_services.login_throttle_stats()
+    }
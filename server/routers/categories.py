@@ -11,19 +11,20 @@ categories_router = APIRouter(prefix='/categories', tags=['categories'])
 
 
 @categories_router.get('/')
-def get_all_categories(
+async def get_all_categories(
         search: str | None = None) -> list[Category]:
-    categories = categories_services.get_all(search=search)
+    categories = await categories_services.get_all(search=search)
     return categories
 
 
 @categories_router.get('/{category_id}')
-def get_category_by_id(
+async def get_category_by_id(
         category_id: int,
         current_user: OptionalUser,
         request: Request,
-        page: int = Query(1, ge=1, description="Page number"),
+        page: int | None = Query(None, ge=1, description="Page number, paginates by offset instead of cursor"),
         size: int = Query(Page.SIZE, ge=1, le=15, description="Page size"),
+        cursor: str | None = None,
         search: str | None = None,
         sort: str | None = None,
         sort_by: str | None = 'topic_id',
@@ -39,10 +40,12 @@ def get_category_by_id(
         - best_reply_id
     - Topics can be searched by:
         - title
-    - User can choose number of pages displayed (1 by default) and number of items per page (1 by default, maximum 15)
+    - User can choose number of items per page (1 by default, maximum 15)
+    - Topics are paginated by cursor: follow links.next / links.prev, or pass their next_cursor / prev_cursor as cursor
+    - Passing a page number paginates by offset instead
     """
 
-    category = categories_services.get_by_id(category_id)
+    category = await categories_services.get_by_id(category_id)
 
     if not category:
         raise HTTPException(SC.NotFound, 'Category not found')
@@ -51,7 +54,7 @@ def get_category_by_id(
         if isinstance(current_user, AnonymousUser):
             raise HTTPException(SC.Unauthorized, 'Login to view private categories')
 
-        if not current_user.is_admin and not categories_services.has_access_to_private_category(
+        if not current_user.is_admin and not await categories_services.has_access_to_private_category(
                 current_user.user_id, category.category_id):
             raise HTTPException(
                 status_code=SC.Forbidden,
@@ -70,8 +73,18 @@ def get_category_by_id(
             detail=f"Invalid sort_by parameter"
         )
 
-    topics, pagination_info, links = topics_services.get_topics_paginate_links(
-        request=request, page=page, size=size, sort=sort, sort_by=sort_by, search=search, category=category.name)
+    position = None
+    if page is None:
+        position = topics_services.parse_cursor(cursor, sort, sort_by)
+        if position is None:
+            raise HTTPException(
+                status_code=SC.BadRequest,
+                detail=f"Invalid cursor"
+            )
+
+    topics, pagination_info, links = await topics_services.get_topics_paginate_links(
+        request=request, page=page, size=size, sort=sort, sort_by=sort_by, search=search, category_id=category.category_id,
+        position=position)
 
     return CategoryTopicsPaginate(
         category=category,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from common.responses import SC
 from data.models.message import MessageText
 from services import messages_services, users_services
@@ -9,7 +9,7 @@ messages_router = APIRouter(prefix='/messages', tags=['messages'])
 
 
 @messages_router.post('/{receiver_id}', status_code=201)
-def send_message(receiver_id: int, message: MessageText, current_user: UserAuthDep):
+async def send_message(receiver_id: int, message: MessageText, current_user: UserAuthDep):
     """
     - Sends message, if:
         - text is not empty string
@@ -18,41 +18,50 @@ def send_message(receiver_id: int, message: MessageText, current_user: UserAuthD
     if not message.text:
         raise HTTPException(status_code=SC.BadRequest, detail="Message text is required")
 
-    receiver = users_services.get_by_id(receiver_id)
+    receiver = await users_services.get_by_id(receiver_id)
     if not receiver:
         raise HTTPException(status_code=SC.NotFound, detail="Receiver not found")
 
-    messages_services.create(message.text, current_user.user_id, receiver_id)
+    await messages_services.create(message.text, current_user.user_id, receiver_id)
     return f'Message sent'
 
 
 @messages_router.get('/users')
-def get_all_conversations(current_user: UserAuthDep):
+async def get_all_conversations(current_user: UserAuthDep):
     """
     - Returns all users the current user has messaged or received messages from
     - Returns 'No conversations', if no conversations
     """
-    result = messages_services.get_all_conversations(current_user.user_id)
+    result = await messages_services.get_all_conversations(current_user.user_id)
 
     return result or 'No conversations'
 
 
 @messages_router.get('/{receiver_id}')
-def get_conversation(receiver_id: int, current_user: UserAuthDep):
+async def get_conversation(
+        receiver_id: int,
+        current_user: UserAuthDep,
+        before: int | None = Query(None, description="Message ID, returns older messages"),
+        after: int | None = Query(None, description="Message ID, returns newer messages"),
+        limit: int = Query(messages_services.CONVERSATION_PAGE_SIZE, ge=1, le=100, description="Page size")
+):
     """
-    - Returns all messages the current user has exchanged with another user
+    - Returns the latest messages the current user has exchanged with another user, oldest first
+    - Older and newer messages are paginated by message ID: pass the page's before or after to get them
     - Returns 'No such conversation', if no messages
     """
-    result = messages_services.get_conversation(current_user.user_id, receiver_id)
+    page = await messages_services.get_conversation(current_user.user_id, receiver_id, before, after, limit)
+    if not page.messages and before is None and after is None:
+        return 'No such conversation'
 
-    return result or 'No such conversation'
+    return page
 
 
 @messages_router.patch('/{message_id}')
-def update_message(message_id: int, message: MessageText, current_user: UserAuthDep):
+async def update_message(message_id: int, message: MessageText, current_user: UserAuthDep):
     """
     - Edits message, if it exists
     """
-    if not messages_services.exists(message_id):
+    if not await messages_services.exists(message_id):
         raise HTTPException(status_code=404, detail='No such message')
-    messages_services.update_text(message_id, message.text)
+    await messages_services.update_text(message_id, message.text)
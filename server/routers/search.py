@@ -0,0 +1,97 @@
+from fastapi import APIRouter, HTTPException, Query
+from common.oauth import OptionalUser
+from common.responses import SC
+from common.utils import Page
+from data.models.search import TopicSearchPaginate, ReplySearchPaginate, SearchHitsPaginate
+from search.index import KINDS
+from search.query import QuerySyntaxError
+from services import search_services
+from starlette.requests import Request
+
+search_router = APIRouter(prefix='/search', tags=['search'])
+
+
+@search_router.get('/')
+async def search(
+        request: Request,
+        current_user: OptionalUser,
+        q: str,
+        types: str | None = None,
+        page: int = Query(1, ge=1, description="Page number"),
+        size: int = Query(Page.SIZE, ge=1, le=15, description="Page size")
+) -> SearchHitsPaginate:
+    """
+    - Searches Topic titles, Reply texts and the User's own Messages in the in-process index
+    - Query syntax:
+        - words must all match: fishing river
+        - OR matches either side: fishing OR hunting
+        - NOT or a leading - excludes: river -fishing
+        - "quoted words" match as a phrase; parentheses group
+    - types narrows the search, comma separated: topics, replies, messages (all by default)
+    - Only Topics and Replies in Categories the User can read are returned; guests see public Categories only
+    """
+
+    types = [name.strip().lower() for name in types.split(',')] if types else list(KINDS)
+    if any(name not in KINDS for name in types):
+        raise HTTPException(
+            status_code=SC.BadRequest,
+            detail=f"Invalid types parameter"
+        )
+
+    try:
+        hits, pagination_info, links = await search_services.search_in_index(
+            request, q, current_user, types, page, size)
+    except QuerySyntaxError as e:
+        raise HTTPException(status_code=SC.BadRequest, detail=str(e))
+
+    return SearchHitsPaginate(hits=hits, pagination_info=pagination_info, links=links)
+
+
+@search_router.get('/topics')
+async def search_topics(
+        request: Request,
+        current_user: OptionalUser,
+        q: str,
+        page: int = Query(1, ge=1, description="Page number"),
+        size: int = Query(Page.SIZE, ge=1, le=15, description="Page size")
+) -> TopicSearchPaginate:
+    """
+    - Full-text search over Topic titles, most relevant first
+    - Only Topics in Categories the User can read are returned; guests see public Categories only
+    - Words shorter than 3 characters are ignored
+    """
+
+    if not search_services.has_searchable_terms(q):
+        raise HTTPException(
+            status_code=SC.BadRequest,
+            detail=f"Search terms must be at least {search_services.MIN_TERM_LENGTH} characters long"
+        )
+
+    topics, pagination_info, links = await search_services.search_topics(request, q, current_user, page, size)
+
+    return TopicSearchPaginate(topics=topics, pagination_info=pagination_info, links=links)
+
+
+@search_router.get('/replies')
+async def search_replies(
+        request: Request,
+        current_user: OptionalUser,
+        q: str,
+        page: int = Query(1, ge=1, description="Page number"),
+        size: int = Query(Page.SIZE, ge=1, le=15, description="Page size")
+) -> ReplySearchPaginate:
+    """
+    - Full-text search over Reply texts, most relevant first
+    - Only Replies in Categories the User can read are returned; guests see public Categories only
+    - Words shorter than 3 characters are ignored
+    """
+
+    if not search_services.has_searchable_terms(q):
+        raise HTTPException(
+            status_code=SC.BadRequest,
+            detail=f"Search terms must be at least {search_services.MIN_TERM_LENGTH} characters long"
+        )
+
+    replies, pagination_info, links = await search_services.search_replies(request, q, current_user, page, size)
+
+    return ReplySearchPaginate(replies=replies, pagination_info=pagination_info, links=links)
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Body, HTTPException, Query
-from services import topics_services, categories_services, users_services, replies_services
+from services import topics_services, categories_services, replies_services
 from common.oauth import OptionalUser, UserAuthDep
 from common.responses import SC
 from data.models.topic import Status, TopicUpdate, TopicCreate, TopicsPaginate, TopicRepliesPaginate
@@ -11,10 +11,11 @@ topics_router = APIRouter(prefix='/topics', tags=['topics'])
 
 
 @topics_router.get('/')
-def get_all_topics(
+async def get_all_topics(
         request: Request,
-        page: int = Query(1, ge=1, description="Page number"),
+        page: int | None = Query(None, ge=1, description="Page number, paginates by offset instead of cursor"),
         size: int = Query(Page.SIZE, ge=1, le=15, description="Page size"),
+        cursor: str | None = None,
         sort: str | None = None,
         sort_by: str | None = 'topic_id',
         search: str | None = None,
@@ -36,16 +37,20 @@ def get_all_topics(
         - username (of the author)
         - category name
         - status (open or locked)
-    - User can choose number of pages displayed (1 by default) and number of items per page (1 by default, maximum 15)
+    - User can choose number of items per page (1 by default, maximum 15)
+    - Topics are paginated by cursor: follow links.next / links.prev, or pass their next_cursor / prev_cursor as cursor
+    - Passing a page number paginates by offset instead
     """
 
-    if username and not users_services.exists_by_username(username):
+    user_id, category_id = await topics_services.resolve_filters(username, category)
+
+    if username and user_id is None:
         raise HTTPException(
             status_code=SC.NotFound,
             detail=f"User not found"
         )
 
-    if category and not categories_services.exists_by_name(category):
+    if category and category_id is None:
         raise HTTPException(
             status_code=SC.NotFound,
             detail=f"Category not found"
@@ -69,9 +74,18 @@ def get_all_topics(
             detail=f"Invalid sort_by parameter"
         )
 
-    topics, pagination_info, links = topics_services.get_topics_paginate_links(
+    position = None
+    if page is None:
+        position = topics_services.parse_cursor(cursor, sort, sort_by)
+        if position is None:
+            raise HTTPException(
+                status_code=SC.BadRequest,
+                detail=f"Invalid cursor"
+            )
+
+    topics, pagination_info, links = await topics_services.get_topics_paginate_links(
         request=request, page=page, size=size, sort=sort, sort_by=sort_by,
-        search=search, username=username, category=category, status=status
+        search=search, user_id=user_id, category_id=category_id, status=status, position=position
     )
 
     if not topics:
@@ -85,19 +99,26 @@ def get_all_topics(
 
 
 @topics_router.get('/{topic_id}')
-def get_topic_by_id(
+async def get_topic_by_id(
         topic_id: int,
         current_user: OptionalUser,
         request: Request,
-        page: int = Query(1, ge=1, description="Page number"),
-        size: int = Query(Page.SIZE, ge=1, le=15, description="Page size")
+        page: int | None = Query(None, ge=1, description="Page number, paginates by offset instead of cursor"),
+        size: int = Query(Page.SIZE, ge=1, le=15, description="Page size"),
+        cursor: str | None = None,
+        sort_by: str = 'reply_id'
 ) -> TopicRepliesPaginate:
     """
     - A guest can view a Topic with all of its Replies, if the Topic belongs to a public Category
     - If the Category is private, authentication is required
+    - Replies can be sorted by:
+        - reply_id (oldest first)
+        - best (by the lower bound of the Wilson score of their up/down votes, best first)
+    - Replies are paginated by cursor: follow links.next / links.prev, or pass their next_cursor / prev_cursor as cursor
+    - Passing a page number paginates by offset instead
     """
 
-    topic = topics_services.get_by_id(topic_id)
+    topic = await topics_services.get_by_id(topic_id)
 
     if not topic:
         raise HTTPException(
@@ -105,7 +126,7 @@ def get_topic_by_id(
             detail=f"Topic #ID:{topic_id} does not exist"
         )
 
-    category = categories_services.get_by_id(topic.category_id)
+    category = await categories_services.get_by_id(topic.category_id)
 
     if category.is_private:
 
@@ -115,15 +136,32 @@ def get_topic_by_id(
                 detail='Login to view topics in private categories'
             )
 
-        if not current_user.is_admin and not categories_services.has_access_to_private_category(current_user.user_id,
-                                                                                                category.category_id):
+        if not current_user.is_admin and not await categories_services.has_access_to_private_category(
+                current_user.user_id, category.category_id):
             raise HTTPException(
                 status_code=SC.Forbidden,
                 detail=f'You do not have permission to access this private category'
             )
 
-    replies, pagination_info, links = replies_services.get_all(topic_id=topic.topic_id, request=request, page=page,
-                                                               size=size)
+    sort_by = sort_by.lower()
+    if sort_by not in replies_services.REPLY_SORTS:
+        raise HTTPException(
+            status_code=SC.BadRequest,
+            detail=f"Invalid sort_by parameter"
+        )
+
+    position = None
+    if page is None:
+        position = replies_services.parse_cursor(cursor, topic.topic_id, sort_by)
+        if position is None:
+            raise HTTPException(
+                status_code=SC.BadRequest,
+                detail=f"Invalid cursor"
+            )
+
+    replies, pagination_info, links = await replies_services.get_all(topic_id=topic.topic_id, request=request,
+                                                                     page=page, size=size, position=position,
+                                                                     sort_by=sort_by)
 
     result = TopicRepliesPaginate(
         topic=topic, replies=replies, pagination_info=pagination_info, links=links)
@@ -132,26 +170,26 @@ def get_topic_by_id(
 
 
 @topics_router.post('/')
-def create_topic(new_topic: TopicCreate, current_user: UserAuthDep):
+async def create_topic(new_topic: TopicCreate, current_user: UserAuthDep):
     """
     - User can create a Topic, if the User has write access to the designated Category
     """
 
-    category = categories_services.get_by_id(new_topic.category_id)
+    category = await categories_services.get_by_id(new_topic.category_id)
 
     if not category:
         raise HTTPException(SC.NotFound, f'Category #ID:{new_topic.category_id} does not exist')
 
     if category.is_private:
-        if current_user.is_admin or categories_services.has_write_access(current_user.user_id, category.category_id):
-            result = topics_services.create(new_topic, current_user.user_id)
+        if current_user.is_admin or await categories_services.has_write_access(current_user.user_id, category.category_id):
+            result = await topics_services.create(new_topic, current_user.user_id)
         else:
             raise HTTPException(SC.Forbidden, f"You do not have permission to post in this private category")
 
     if category.is_locked:
         raise HTTPException(SC.Forbidden, f'Category #ID:{category.category_id}, Name: {category.name} is locked')
 
-    result = topics_services.create(new_topic, current_user.user_id)
+    result = await topics_services.create(new_topic, current_user.user_id)
 
     if isinstance(result, int):
         return f'Topic {result} was successfully created!'
@@ -159,7 +197,7 @@ def create_topic(new_topic: TopicCreate, current_user: UserAuthDep):
 
 
 @topics_router.patch('/{topic_id}/bestReply')
-def update_topic_best_reply(topic_id: int, current_user: UserAuthDep, topic_update: TopicUpdate = Body(...)):
+async def update_topic_best_reply(topic_id: int, current_user: UserAuthDep, topic_update: TopicUpdate = Body(...)):
     """
     - User can choose a best Reply to a Topic, if the User owns the Topic
     """
@@ -167,40 +205,40 @@ def update_topic_best_reply(topic_id: int, current_user: UserAuthDep, topic_upda
     if not topic_update.best_reply_id:
         raise HTTPException(SC.BadRequest, f"Data not provided to make changes")
 
-    user_has_access, msg = topics_services.validate_topic_access(topic_id, current_user)
+    user_has_access, msg = await topics_services.validate_topic_access(topic_id, current_user)
     if not user_has_access:
         raise HTTPException(
             status_code=SC.Forbidden,
             detail=msg
         )
 
-    topic_replies_ids = topics_services.get_topic_replies(topic_id)
+    topic_replies_ids = await topics_services.get_topic_replies(topic_id)
 
     if not topic_replies_ids:
         raise HTTPException(SC.NotFound, f"Topic with id:{topic_id} does not have replies")
 
     if topic_update.best_reply_id in topic_replies_ids:
-        return topics_services.update_best_reply(topic_id, topic_update.best_reply_id)
+        return await topics_services.update_best_reply(topic_id, topic_update.best_reply_id)
 
     else:
         raise HTTPException(SC.BadRequest, "Invalid REPLY ID")
 
 
 @topics_router.patch('/{topic_id}/locking')
-def switch_topic_locking(topic_id: int, existing_user: UserAuthDep):
+async def switch_topic_locking(topic_id: int, existing_user: UserAuthDep):
     """
     - User can lock or unlock a Topic, if the User owns the Topic
     """
-    return switch_topic_locking_helper(topic_id, existing_user)
+    return await switch_topic_locking_helper(topic_id, existing_user)
 
 
-def switch_topic_locking_helper(topic_id, user):
-    topic = topics_services.get_by_id(topic_id)
+async def switch_topic_locking_helper(topic_id, user):
+    topic = await topics_services.get_by_id(topic_id)
     if not topic:
         raise HTTPException(SC.BadRequest, "No such topic")
 
     if not user.is_admin and topic.user_id != user.user_id:  # if user doesn't own topic
         raise HTTPException(SC.BadRequest, 'You must be admin or owner to switch locking')
 
-    topics_services.update_locking(not Status.str_int[topic.status], topic_id)
+    await topics_services.update_locking(not Status.str_int[topic.status], topic_id)
     return f'Topic <{topic.title}> is {Status.opposite[topic.status]} now'
@@ -1,18 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from math import ceil
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from common.responses import SC
+from common.responses import SC, JSONArrayStream
 from data.models.user import UserRegister, UserUpdate, UserChangePassword, UserDelete, TokenData
-from services import users_services
+from services import reputation_services, users_services
 from common.oauth import create_access_token, UserAuthDep
-from common.utils import verify_password
 from typing import Annotated
-from common import utils
+from common import passwords
 
 users_router = APIRouter(prefix='/users', tags=['users'])
 
 
 @users_router.post('/register', status_code=SC.Created)
-def register_user(user: UserRegister):
+async def register_user(user: UserRegister):
     """
     - Registers the user, if:
         - username is at least 4 chars and is not already taken
@@ -20,7 +20,7 @@ def register_user(user: UserRegister):
         - email follows the example
     - First name and last name are not required upon registration
     """
-    result = users_services.register(user)
+    result = await users_services.register(user)
 
     if not isinstance(result, int):
         raise HTTPException(status_code=SC.BadRequest, detail=result.msg)
@@ -29,12 +29,21 @@ def register_user(user: UserRegister):
 
 
 @users_router.post('/login')
-def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
+async def login(request: Request, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     """
     - Logs the user, if username and password are correct
     - Returns access Token
+    - Too many attempts for a username or from a client get 429, before the password is checked
     """
-    user = users_services.try_login(form_data.username, form_data.password)
+    retry_after = users_services.throttle_login(form_data.username, request.client.host if request.client else None)
+    if retry_after:
+        raise HTTPException(
+            status_code=SC.TooManyRequests,
+            detail="Too many login attempts. Please try again later",
+            headers={"Retry-After": str(ceil(retry_after))},
+        )
+
+    user = await users_services.try_login(form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -43,23 +52,48 @@ def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    users_services.login_succeeded(form_data.username)
     token = create_access_token(
-        TokenData(username=user.username, is_admin=user.is_admin))
+        TokenData(username=user.username, is_admin=user.is_admin, user_id=user.user_id))
     return token
 
 
 @users_router.get('/')
-def get_all_users():
-    users = users_services.get_all()
-    return users
+async def get_all_users():
+    """
+    - Streams all users as a JSON array, without loading them into memory at once
+    """
+    return JSONArrayStream(users_services.get_all())
+
+
+@users_router.get('/leaderboard')
+async def get_leaderboard(top: int = Query(10, ge=1, le=100, description="Number of users")):
+    """
+    - Returns the users with the highest reputation, with their rank
+    - Reputation is +1 per upvote and -1 per downvote on the user's replies, plus 15 per reply chosen as best
+    - Users with the same reputation share a rank
+    """
+    return await reputation_services.get_top(top)
+
+
+@users_router.get('/{user_id}/rank')
+async def get_user_rank(user_id: int):
+    """
+    - Returns the user's reputation and rank on the leaderboard, if the user exists
+    """
+    user = await users_services.get_by_id(user_id)
+
+    if not user:
+        raise HTTPException(status_code=SC.NotFound, detail=f"User with ID: {user_id} does\'t exist!")
+    return await reputation_services.get_rank(user_id, user.username)
 
 
 @users_router.get('/{user_id}')
-def get_user_by_id(user_id: int):
+async def get_user_by_id(user_id: int):
     """
     - Returns a user by ID, if the user exists
     """
-    user = users_services.get_by_id(user_id)
+    user = await users_services.get_by_id(user_id)
 
     if not user:
         raise HTTPException(status_code=SC.NotFound, detail=f"User with ID: {user_id} does\'t exist!")
@@ -67,42 +101,42 @@ def get_user_by_id(user_id: int):
 
 
 @users_router.put('/')
-def update_user(user: UserUpdate, existing_user: UserAuthDep):
+async def update_user(user: UserUpdate, existing_user: UserAuthDep):
     """
     - Updates first name and/or last name of the authenticated user
     """
-    result = users_services.update(existing_user, user)
+    result = await users_services.update(existing_user, user)
     return result
 
 
 @users_router.patch('/password')
-def change_user_password(data: UserChangePassword, existing_user: UserAuthDep):
+async def change_user_password(data: UserChangePassword, existing_user: UserAuthDep):
     """
     1. Verifies the current password
     2. Verifies the new password match
     3. Updates in db with new_hashed_password
     """
-    if not utils.verify_password(data.current_password, existing_user.password):
+    if not await passwords.verify_password(data.current_password, existing_user.password):
         raise HTTPException(SC.Unauthorized, "Current password does not match")
     if not data.current_password != data.new_password:
         raise HTTPException(SC.BadRequest, "New password must be different from current password")
     if not data.new_password == data.confirm_password:
         raise HTTPException(SC.Unauthorized, "New password does not match")
 
-    new_hashed_password = utils.hash_pass(data.new_password)
-    users_services.change_password(existing_user.user_id, new_hashed_password)
+    new_hashed_password = await passwords.hash_password(data.new_password)
+    await users_services.change_password(existing_user.user_id, new_hashed_password)
     return 'Password changed successfully'
 
 
 @users_router.delete('/', status_code=SC.NoContent)
-def delete_user_by_id(existing_user: UserAuthDep, body: UserDelete):
+async def delete_user_by_id(existing_user: UserAuthDep, body: UserDelete):
     """
     - Verifies the current password
     - Flags the user as deleted in db
         - Triggers an object in db that deletes his messages
     """
-    if not utils.verify_password(body.current_password, existing_user.password):
+    if not await passwords.verify_password(body.current_password, existing_user.password):
         raise HTTPException(status_code=SC.BadRequest,
                             detail=f"Current password does not match")
 
-    users_services.delete(existing_user.user_id)
+    await users_services.delete(existing_user.user_id)
@@ -3,36 +3,39 @@ from fastapi import APIRouter, HTTPException
 from pydantic import StringConstraints
 from common.oauth import UserAuthDep
 from common.responses import SC
-from services import votes_services
+from services import categories_services, votes_services
 from services.replies_services import exists as reply_exists, can_user_access_topic_content
-from services.topics_services import exists as topic_exists
+from services.topics_services import exists as topic_exists, get_by_id as get_topic_by_id
 
 
 votes_router = APIRouter(
     prefix='/topics/{topic_id}/replies/{reply_id}/votes', tags=['votes'])
+topic_votes_router = APIRouter(prefix='/topics/{topic_id}/votes', tags=['votes'])
+
+MAX_REPLY_IDS = 100
 
 allowed_vote_type = Annotated[str, StringConstraints(pattern=r'^(up|down)$')]
 
 
 @votes_router.get('/')
-def get_all_votes_for_reply_by_type(reply_id: int, topic_id: int, type: allowed_vote_type, current_user: UserAuthDep):
+async def get_all_votes_for_reply_by_type(reply_id: int, topic_id: int, type: allowed_vote_type, current_user: UserAuthDep):
     """
     Returns all votes for a reply by type (up|down)
     """
 
-    if not topic_exists(id=topic_id):
+    if not await topic_exists(id=topic_id):
         raise HTTPException(
             status_code=SC.NotFound,
             detail='No such topic'
         )
 
-    if not reply_exists(reply_id=reply_id, topic_id=topic_id):
+    if not await reply_exists(reply_id=reply_id, topic_id=topic_id):
         raise HTTPException(
             status_code=SC.NotFound,
             detail='No such reply in this topic'
         )
 
-    user_modify_vote, msg = can_user_access_topic_content(
+    user_modify_vote, msg = await can_user_access_topic_content(
         topic_id=topic_id, user_id=current_user.user_id)
 
     if not user_modify_vote:
@@ -41,12 +44,12 @@ def get_all_votes_for_reply_by_type(reply_id: int, topic_id: int, type: allowed_
             detail=msg
         )
 
-    result = votes_services.get_all(reply_id=reply_id, type=type)
+    result = await votes_services.get_all(reply_id=reply_id, type=type)
     return {f'Total {type}votes': result}
 
 
 @votes_router.put('/', status_code=SC.Created)
-def add_or_switch(type: allowed_vote_type,
+async def add_or_switch(type: allowed_vote_type,
                   reply_id: int, topic_id: int, current_user: UserAuthDep):
     """
     1. Creates a vote of the specified type (up|down), if:
@@ -57,19 +60,19 @@ def add_or_switch(type: allowed_vote_type,
     3. If the vote type given is the same as before, displays a message
     """
 
-    if not topic_exists(id=topic_id):
+    if not await topic_exists(id=topic_id):
         raise HTTPException(
             status_code=SC.NotFound,
             detail='No such topic'
         )
 
-    if not reply_exists(reply_id=reply_id, topic_id=topic_id):
+    if not await reply_exists(reply_id=reply_id, topic_id=topic_id):
         raise HTTPException(
             status_code=SC.NotFound,
             detail='No such reply in this topic'
         )
 
-    user_modify_vote, msg = can_user_access_topic_content(
+    user_modify_vote, msg = await can_user_access_topic_content(
         topic_id=topic_id, user_id=current_user.user_id)
 
     if not user_modify_vote:
@@ -78,24 +81,20 @@ def add_or_switch(type: allowed_vote_type,
             detail=msg
         )
 
-    vote = votes_services.get_vote_with_type(
-        reply_id=reply_id, user_id=current_user.user_id)
+    outcome = await votes_services.cast_vote(
+        user_id=current_user.user_id, reply_id=reply_id, type=type)
 
-    if not vote:
-        votes_services.add_vote(
-            user_id=current_user.user_id, reply_id=reply_id, type=type)
+    if outcome == 'created':
         return f'You {type}voted REPLY with ID: {reply_id}'
 
-    if vote != type:
-        votes_services.switch_vote(user_id=current_user.user_id,
-                                   reply_id=reply_id, type=vote)
+    if outcome == 'switched':
         return f'Vote switched to {type}vote'
 
     return f'Reply already {type}voted. Choose different type to switch it'
 
 
 @votes_router.delete('/', status_code=SC.NoContent)
-def remove_vote(topic_id: int, reply_id: int, current_user: UserAuthDep):
+async def remove_vote(topic_id: int, reply_id: int, current_user: UserAuthDep):
     """
     1. Removes user's vote, if:
         - topic exists
@@ -103,19 +102,19 @@ def remove_vote(topic_id: int, reply_id: int, current_user: UserAuthDep):
         - user can modify content in this topic
     2. Does nothing, if no such vote
     """
-    if not topic_exists(id=topic_id):
+    if not await topic_exists(id=topic_id):
         raise HTTPException(
             status_code=SC.NotFound,
             detail='No such topic'
         )
 
-    if not reply_exists(reply_id=reply_id, topic_id=topic_id):
+    if not await reply_exists(reply_id=reply_id, topic_id=topic_id):
         raise HTTPException(
             status_code=SC.NotFound,
             detail='No such reply in this topic'
         )
 
-    user_modify_vote, msg = can_user_access_topic_content(
+    user_modify_vote, msg = await can_user_access_topic_content(
         topic_id=topic_id, user_id=current_user.user_id)
 
     if not user_modify_vote:
@@ -124,4 +123,36 @@ def remove_vote(topic_id: int, reply_id: int, current_user: UserAuthDep):
             detail=msg
         )
 
-    votes_services.delete_vote(reply_id=reply_id, user_id=current_user.user_id)
+    await votes_services.delete_vote(reply_id=reply_id, user_id=current_user.user_id)
+
+
+@topic_votes_router.get('/mine')
+async def get_my_votes(topic_id: int, current_user: UserAuthDep, reply_ids: str):
+    """
+    - Returns the user's vote (up|down|null) and the up/down tallies of the given Replies in the Topic
+    - reply_ids: comma-separated ids of the Replies, at most 100 - e.g. those of the page being shown
+    - The user must be able to read the Topic
+    """
+    try:
+        ids = list(dict.fromkeys(int(reply_id) for reply_id in reply_ids.split(',')))
+    except ValueError:
+        raise HTTPException(status_code=SC.BadRequest, detail='reply_ids must be comma-separated numbers')
+    if len(ids) > MAX_REPLY_IDS:
+        raise HTTPException(status_code=SC.BadRequest, detail=f'At most {MAX_REPLY_IDS} reply_ids are allowed')
+
+    topic = await get_topic_by_id(topic_id)
+    if not topic:
+        raise HTTPException(
+            status_code=SC.NotFound,
+            detail='No such topic'
+        )
+
+    category = await categories_services.get_by_id(topic.category_id)
+    if category.is_private and not current_user.is_admin and \
+            not await categories_services.has_access_to_private_category(current_user.user_id, category.category_id):
+        raise HTTPException(
+            status_code=SC.Forbidden,
+            detail='You do not have permission to access this private category'
+        )
+
+    return await votes_services.get_user_votes(current_user.user_id, topic_id, ids)
@@ -0,0 +1,365 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from search.query import parse, tokenize
+from search.segment import DiskSegment, MemorySegment, write_segment
+
+# doc kinds; what the a and b fields of a doc record hold
+TOPIC = 0  # a: category_id
+REPLY = 1  # a: topic_id
+MESSAGE = 2  # a: sender_id, b: receiver_id
+KINDS = {'topics': TOPIC, 'replies': REPLY, 'messages': MESSAGE}
+KIND_NAMES = {kind: name for name, kind in KINDS.items()}
+
+FLUSH_AFTER_DOCS = 1000  # the memory segment is written to disk once it holds this many documents
+FLUSH_AFTER_SECONDS = 60  # ... or once its oldest change, an added or a deleted document, is this old
+MAX_SEGMENTS = 8  # more segment files than this are merged into one
+MAX_DELETED_RATIO = 0.25  # segments are also merged once this share of their documents is deleted
+
+_MANIFEST = 'manifest.json'
+
+
+class InvertedIndex:
+    """
+    In-process inverted index over topic titles, reply texts and messages
+    - New documents go to a memory segment, which is flushed to an immutable, memory-mapped segment file
+    - Updating a document deletes it and adds it again under a new docno; deleted docnos are skipped
+      by queries until a merge rewrites the segments without them
+    - manifest.json lists the live segment files, the deleted docnos and the next docno; it is marked clean
+      only by the last flush before shutting down, so an index left by a crash is rebuilt instead of trusted
+    - Thread-safe; flushes and merges write their segment file and the manifest outside the lock
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._manifest_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._segments: list[DiskSegment] = []
+        self._memory = MemorySegment()
+        self._flushing: list[MemorySegment] = []  # memory segments being written, still searched meanwhile
+        self._deleted: set[int] = set()
+        self._next_docno = 1
+        self._next_segment = 1
+        self._docnos: dict[tuple[int, int], int] = {}  # (kind, id) -> docno of its live version
+        self._docs: dict[int, tuple] = {}  # docno -> doc record, live documents only
+        self._topic_categories: dict[int, int] = {}
+        self._changed_at: float | None = None  # monotonic time of the oldest change not yet in the manifest
+
+    def open(self) -> bool:
+        """
+        Loads the index from its directory; returns False, if there is no index there yet
+        or it wasn't shut down cleanly and has to be rebuilt
+        - Clears the clean mark, until the next flush(clean=True)
+        """
+        with self._lock:
+            self.close()
+            path = os.path.join(self.directory, _MANIFEST)
+            if not os.path.exists(path):
+                return False
+
+            with open(path) as file:
+                manifest = json.load(file)
+            if not manifest.get('clean'):
+                # changes made after the last flush were lost with the process
+                self._remove_files()
+                return False
+
+            self._next_docno = manifest['next_docno']
+            self._next_segment = manifest['next_segment']
+            self._deleted = set(manifest['deleted'])
+            for name in manifest['segments']:
+                segment = DiskSegment(os.path.join(self.directory, name))
+                self._segments.append(segment)
+                for docno, record in segment.docs.items():
+                    if docno not in self._deleted:
+                        self._register(record)
+
+        self._write_manifest()
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._reset()
+
+    def add_topic(self, topic_id: int, title: str, category_id: int) -> None:
+        self._add(TOPIC, topic_id, title, category_id, 0)
+
+    def add_reply(self, reply_id: int, text: str, topic_id: int) -> None:
+        self._add(REPLY, reply_id, text, topic_id, 0)
+
+    def add_message(self, message_id: int, text: str, sender_id: int, receiver_id: int) -> None:
+        self._add(MESSAGE, message_id, text, sender_id, receiver_id)
+
+    def update_text(self, kind: int, doc_id: int, text: str) -> None:
+        """
+        Re-indexes a document with new text, keeping what it belongs to
+        """
+        with self._lock:
+            docno = self._docnos.get((kind, doc_id))
+            if docno is not None:
+                _, _, _, a, b = self._docs[docno]
+                self._add(kind, doc_id, text, a, b)
+
+    def remove(self, kind: int, doc_id: int) -> None:
+        with self._lock:
+            docno = self._docnos.pop((kind, doc_id), None)
+            if docno is not None:
+                self._deleted.add(docno)
+                self._docs.pop(docno)
+                self._changed()
+                if kind == TOPIC:
+                    self._topic_categories.pop(doc_id, None)
+
+    def remove_messages_of(self, user_id: int) -> None:
+        with self._lock:
+            for _, kind, doc_id, a, b in list(self._docs.values()):
+                if kind == MESSAGE and user_id in (a, b):
+                    self.remove(MESSAGE, doc_id)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add(self, kind: int, doc_id: int, text: str, a: int, b: int) -> None:
+        positions = {}
+        for position, word in enumerate(tokenize(text)):
+            positions.setdefault(word, []).append(position)
+
+        with self._lock:
+            self.remove(kind, doc_id)
+            record = (self._next_docno, kind, doc_id, a, b)
+            self._next_docno += 1
+            self._memory.add(record, positions)
+            self._register(record)
+            self._changed()
+
+    def _register(self, record: tuple) -> None:
+        docno, kind, doc_id, a, _ = record
+        self._docnos[(kind, doc_id)] = docno
+        self._docs[docno] = record
+        if kind == TOPIC:
+            self._topic_categories[doc_id] = a
+
+    def search(
+            self,
+            query: str,
+            readable_categories: set[int] | None,
+            user_id: int | None,
+            kinds: set[int] = frozenset(KINDS.values()),
+            limit: int = 10,
+            offset: int = 0
+    ) -> tuple[list[tuple[int, int, int, int]], int]:
+        """
+        Answers a boolean / phrase query (see search.query.parse)
+        - readable_categories: the categories whose topics and replies the caller can read, None for all of them
+        - user_id: messages are only found by their sender and receiver; None finds no messages
+        - Returns a page of (kind, id, topic_id or None, score), most relevant first, and the total number of hits
+        - Raises QuerySyntaxError for malformed queries
+        """
+
+        node = parse(query)
+        with self._lock:
+            scores = self._evaluate(node)
+            hits = []
+            for docno, score in scores.items():
+                _, kind, doc_id, a, b = self._docs[docno]
+                if kind not in kinds:
+                    continue
+                if kind == MESSAGE:
+                    if user_id not in (a, b):
+                        continue
+                    topic_id = None
+                else:
+                    topic_id = doc_id if kind == TOPIC else a
+                    category_id = self._topic_categories.get(topic_id)
+                    if category_id is None or (readable_categories is not None
+                                               and category_id not in readable_categories):
+                        continue
+                hits.append((score, docno, kind, doc_id, topic_id))
+
+        hits.sort(reverse=True)
+        return [(kind, doc_id, topic_id, score)
+                for score, _, kind, doc_id, topic_id in hits[offset:offset + limit]], len(hits)
+
+    def _evaluate(self, node) -> dict[int, int]:
+        """
+        Returns {docno: score} of the live documents matching node; the score is the number of matched words
+        """
+        kind = node[0]
+
+        if kind == 'term':
+            return {docno: len(positions) for docno, positions in self._postings(node[1])}
+
+        if kind == 'phrase':
+            return self._phrase(node[1])
+
+        if kind == 'or':
+            scores = Counter()
+            for child in node[1]:
+                scores.update(self._evaluate(child))
+            return dict(scores)
+
+        # 'and'; parse() guarantees at least one child that is not a 'not'
+        included = [child for child in node[1] if child[0] != 'not']
+        excluded = [child[1] for child in node[1] if child[0] == 'not']
+
+        results = [self._evaluate(child) for child in included]
+        results.sort(key=len)
+        scores = results[0]
+        for result in results[1:]:
+            scores = {docno: score + result[docno] for docno, score in scores.items() if docno in result}
+            if not scores:
+                return {}
+        for child in excluded:
+            excluded_docs = self._evaluate(child)
+            scores = {docno: score for docno, score in scores.items() if docno not in excluded_docs}
+
+        return scores
+
+    def _phrase(self, words: list[str]) -> dict[int, int]:
+        postings = [dict(self._postings(word)) for word in words]
+        candidates = set.intersection(*(set(term_postings) for term_postings in postings))
+
+        scores = {}
+        for docno in candidates:
+            starts = set(postings[0][docno])
+            for i, term_postings in enumerate(postings[1:], 1):
+                starts &= {position - i for position in term_postings[docno]}
+                if not starts:
+                    break
+            if starts:
+                scores[docno] = len(starts) * len(words)
+
+        return scores
+
+    def _postings(self, word: str):
+        """
+        Yields (docno, positions) of the live documents containing word, across all segments
+        """
+        for segment in (*self._segments, *self._flushing, self._memory):
+            postings = segment.postings(word)
+            if postings is None:
+                continue
+
+            docnos, bounds, positions = postings
+            for i, docno in enumerate(docnos):
+                if docno in self._docs:
+                    yield docno, positions[bounds[i]:bounds[i + 1]]
+
+    def flush(self, clean: bool = False) -> None:
+        """
+        Writes the memory segment to a segment file and the deleted docnos to the manifest
+        - clean: this is the last flush before shutting down; open() trusts only a manifest written by it
+        - New documents go to a fresh memory segment meanwhile; a segment whose write failed is retried
+          by the next flush
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._memory.docs:
+                    self._flushing.append(self._memory)
+                    self._memory = MemorySegment()
+                elif not self._flushing and self._changed_at is None and not clean:
+                    return
+                segments, deleted = list(self._flushing), set(self._deleted)
+                name = self._segment_name() if segments else None
+
+            if segments:
+                path = os.path.join(self.directory, name)
+                written = write_segment(path, segments, deleted)
+                with self._lock:
+                    self._flushing = self._flushing[len(segments):]
+                    if written:
+                        self._segments.append(DiskSegment(path))
+                    # documents deleted while still in memory never reach the disk
+                    self._deleted -= deleted & {docno for segment in segments for docno in segment.docs}
+
+            self._write_manifest(clean)
+
+    def maintain(self) -> None:
+        """
+        Periodic upkeep: flushes the changes once the memory segment is large enough or the oldest of them
+        is FLUSH_AFTER_SECONDS old, and merges the segment files when there are too many of them or too many
+        of their documents are deleted
+        """
+        changed_at = self._changed_at
+        if (len(self._memory) >= FLUSH_AFTER_DOCS
+                or changed_at is not None and time.monotonic() - changed_at >= FLUSH_AFTER_SECONDS):
+            self.flush()
+
+        with self._lock:
+            disk_docs = sum(len(segment) for segment in self._segments)
+            if not (len(self._segments) > MAX_SEGMENTS
+                    or (disk_docs and len(self._deleted) / disk_docs > MAX_DELETED_RATIO)):
+                return
+
+        self.merge()
+
+    def merge(self) -> None:
+        """
+        Rewrites all segment files into one, without the deleted documents
+        - The segments are immutable, so the new one is written outside the lock;
+          documents deleted meanwhile stay in the deleted set
+        """
+        with self._merge_lock:
+            with self._lock:
+                segments, deleted = list(self._segments), set(self._deleted)
+                if not segments:
+                    return
+                name = self._segment_name()
+
+            path = os.path.join(self.directory, name)
+            written = write_segment(path, segments, deleted)
+
+            with self._lock:
+                merged = {docno for segment in segments for docno in segment.docs}
+                self._segments = ([DiskSegment(path)] if written else []) + self._segments[len(segments):]
+                self._deleted -= deleted & merged
+            self._write_manifest()
+
+            for segment in segments:
+                segment.close()
+                os.remove(segment.path)
+
+    def _segment_name(self) -> str:
+        name = f'segment_{self._next_segment:06d}.seg'
+        self._next_segment += 1
+        return name
+
+    def _changed(self) -> None:
+        if self._changed_at is None:
+            self._changed_at = time.monotonic()
+
+    def _write_manifest(self, clean: bool = False) -> None:
+        # the manifest lock keeps an older snapshot from replacing a newer one
+        with self._manifest_lock:
+            with self._lock:
+                manifest = {
+                    'next_docno': self._next_docno,
+                    'next_segment': self._next_segment,
+                    'segments': [segment.name for segment in self._segments],
+                    'deleted': sorted(self._deleted),
+                    'clean': clean
+                }
+                if not self._memory.docs and not self._flushing:
+                    self._changed_at = None
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, _MANIFEST)
+            with open(path + '.tmp', 'w') as file:
+                json.dump(manifest, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path + '.tmp', path)
+
+    def _remove_files(self) -> None:
+        for name in os.listdir(self.directory):
+            if name == _MANIFEST or name.endswith(('.seg', '.tmp')):
+                os.remove(os.path.join(self.directory, name))
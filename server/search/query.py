@@ -0,0 +1,129 @@
+import re
+
+_WORD = re.compile(r'\w+')
+_QUERY_TOKEN = re.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+MAX_QUERY_TERMS = 32
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> list[str]:
+    return [word.lower() for word in _WORD.findall(text)]
+
+
+def parse(query: str):
+    """
+    Parses a boolean query into a tree of tuples
+    - Words are ANDed by default; OR between words or groups; NOT or a leading '-' excludes
+    - "quoted words" match as a phrase; parentheses group
+    - Nodes: ('term', word), ('phrase', [words]), ('and', [nodes]), ('or', [nodes]), ('not', node)
+    """
+
+    tokens = _QUERY_TOKEN.findall(query)
+    if len(tokens) > MAX_QUERY_TERMS:
+        raise QuerySyntaxError(f'Queries are limited to {MAX_QUERY_TERMS} terms')
+
+    parser = _Parser(tokens)
+    node = parser.parse_or()
+    if parser.peek() is not None:
+        raise QuerySyntaxError(f'Unexpected {parser.peek()!r}')
+    if node is None:
+        raise QuerySyntaxError('Query has no searchable words')
+    _check_exclusions(node)
+
+    return node
+
+
+def _check_exclusions(node) -> None:
+    """
+    An exclusion only narrows the words it is ANDed with, so every 'not' must be the child of an 'and'
+    that has a child which is not a 'not'
+    """
+    kind = node[0]
+    if kind == 'not':
+        raise QuerySyntaxError('Query must include at least one word, not only exclusions')
+
+    if kind == 'or':
+        for child in node[1]:
+            if child[0] == 'not':
+                raise QuerySyntaxError('NOT can only exclude from words it is ANDed with, not from an OR')
+            _check_exclusions(child)
+
+    if kind == 'and':
+        if all(child[0] == 'not' for child in node[1]):
+            raise QuerySyntaxError('Query must include at least one word, not only exclusions')
+        for child in node[1]:
+            _check_exclusions(child[1] if child[0] == 'not' else child)
+
+
+class _Parser:
+    def __init__(self, tokens: list[str]):
+        self._tokens = tokens
+        self._pos = 0
+
+    def peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self):
+        token = self.peek()
+        self._pos += 1
+        return token
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == 'OR':
+            self._next()
+            nodes.append(self.parse_and())
+
+        nodes = [node for node in nodes if node is not None]
+        if not nodes:
+            return None
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):
+        nodes = []
+        while (token := self.peek()) is not None and token not in ('OR', ')'):
+            if token == 'AND':
+                self._next()
+                continue
+            node = self.parse_unary()
+            if node is not None:
+                nodes.append(node)
+
+        if not nodes:
+            return None
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def parse_unary(self):
+        token = self._next()
+
+        if token in ('NOT', '-'):
+            if self.peek() is None:
+                raise QuerySyntaxError('NOT must be followed by a word')
+            node = self.parse_unary()
+            return ('not', node) if node is not None else None
+
+        if token.startswith('-'):
+            node = _words(token[1:])
+            return ('not', node) if node is not None else None
+
+        if token == '(':
+            node = self.parse_or()
+            if self._next() != ')':
+                raise QuerySyntaxError('Unbalanced parentheses')
+            return node
+
+        if token == ')':
+            raise QuerySyntaxError('Unbalanced parentheses')
+
+        return _words(token)
+
+
+def _words(token: str):
+    # a quoted phrase, or a word the tokenizer splits (like don't), matches as a phrase
+    words = tokenize(token)
+    if not words:
+        return None
+    return ('term', words[0]) if len(words) == 1 else ('phrase', words)
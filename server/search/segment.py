@@ -0,0 +1,167 @@
+import mmap
+import os
+import struct
+from array import array
+
+# doc record: docno, kind, id, a, b (what a and b hold depends on the kind, see search.index)
+DOC_FIELDS = 5
+_MAGIC = b'FSEG'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIIIQQ')  # magic, version, doc count, term count, terms offset, data offset
+_TERM = struct.Struct('<QII')  # data offset (in uint32 items), doc count, position count
+_TERM_LENGTH = struct.Struct('<H')
+
+assert array('I').itemsize == 4
+
+
+class MemorySegment:
+    """
+    The mutable segment new documents are added to, until it is flushed to disk
+    - Each term has three arrays: the docnos it occurs in, in increasing order, and the positions
+      of the term in those documents, with bounds[i]:bounds[i + 1] delimiting the positions of docnos[i]
+    """
+
+    def __init__(self):
+        self.docs = {}  # docno -> doc record
+        self._postings = {}  # term -> (docnos, bounds, positions)
+
+    def add(self, record: tuple, positions: dict[str, list[int]]) -> None:
+        docno = record[0]
+        self.docs[docno] = record
+        for term, term_positions in positions.items():
+            docnos, bounds, all_positions = self._postings.setdefault(term, (array('I'), array('I', [0]), array('I')))
+            docnos.append(docno)
+            all_positions.extend(term_positions)
+            bounds.append(len(all_positions))
+
+    def postings(self, term: str):
+        return self._postings.get(term)
+
+    def terms(self):
+        return self._postings.keys()
+
+    def __len__(self):
+        return len(self.docs)
+
+
+class DiskSegment:
+    """
+    A read-only segment file, memory-mapped; posting lists are read straight from the mapping
+    - Only the term dictionary and the doc records are loaded into memory
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, doc_count, term_count, terms_offset, data_offset = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a search segment')
+
+        records = self._view[_HEADER.size:_HEADER.size + doc_count * DOC_FIELDS * 4].cast('I')
+        self.docs = {
+            records[i]: tuple(records[i:i + DOC_FIELDS])
+            for i in range(0, len(records), DOC_FIELDS)
+        }
+        records.release()
+
+        self._terms = {}
+        offset = terms_offset
+        for _ in range(term_count):
+            (length,) = _TERM_LENGTH.unpack_from(self._mmap, offset)
+            offset += _TERM_LENGTH.size
+            term = bytes(self._mmap[offset:offset + length]).decode()
+            offset += length
+            self._terms[term] = _TERM.unpack_from(self._mmap, offset)
+            offset += _TERM.size
+
+        self._data = self._view[data_offset:].cast('I')
+
+    def postings(self, term: str):
+        entry = self._terms.get(term)
+        if entry is None:
+            return None
+
+        start, doc_count, position_count = entry
+        bounds_start = start + doc_count
+        positions_start = bounds_start + doc_count + 1
+        return (self._data[start:bounds_start],
+                self._data[bounds_start:positions_start],
+                self._data[positions_start:positions_start + position_count])
+
+    def terms(self):
+        return self._terms.keys()
+
+    def close(self) -> None:
+        try:
+            for view in (getattr(self, '_data', None), self._view):
+                if view is not None:
+                    view.release()
+            self._mmap.close()
+        except BufferError:
+            # a query still holds a posting list; the mapping is closed when that is garbage collected
+            pass
+
+    def __len__(self):
+        return len(self.docs)
+
+
+def write_segment(path: str, segments: list, deleted: set[int]) -> int:
+    """
+    Writes the live documents of segments (in docno order, oldest first) into one segment file
+    - Returns the number of documents written; nothing is written, if there are none
+    """
+
+    records = [record for segment in segments for docno, record in sorted(segment.docs.items())
+               if docno not in deleted]
+    if not records:
+        return 0
+
+    data, term_entries = array('I'), []
+    for term in sorted({term for segment in segments for term in segment.terms()}):
+        docnos, bounds, positions = array('I'), array('I', [0]), array('I')
+        for segment in segments:
+            postings = segment.postings(term)
+            if postings is None:
+                continue
+            seg_docnos, seg_bounds, seg_positions = postings
+            for i, docno in enumerate(seg_docnos):
+                if docno in deleted:
+                    continue
+                docnos.append(docno)
+                positions.extend(seg_positions[seg_bounds[i]:seg_bounds[i + 1]])
+                bounds.append(len(positions))
+
+        if docnos:
+            term_entries.append((term.encode(), len(data), len(docnos), len(positions)))
+            data.extend(docnos)
+            data.extend(bounds)
+            data.extend(positions)
+
+    doc_data = array('I', (field for record in records for field in record))
+    terms_data = b''.join(
+        _TERM_LENGTH.pack(len(term)) + term + _TERM.pack(offset, doc_count, position_count)
+        for term, offset, doc_count, position_count in term_entries
+    )
+    terms_offset = _HEADER.size + len(doc_data) * 4
+    data_offset = terms_offset + len(terms_data)
+    padding = -data_offset % 4
+    data_offset += padding
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, len(records), len(term_entries), terms_offset, data_offset))
+        file.write(doc_data.tobytes())
+        file.write(terms_data)
+        file.write(b'\0' * padding)
+        file.write(data.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+    return len(records)
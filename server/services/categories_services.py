@@ -1,116 +1,240 @@
+import asyncio
+from time import monotonic
+from typing import NamedTuple
+from common.cache import TTLCache
 from data.models.category import Category
-from data.database import read_query, update_query, insert_query
+from data.async_database import read_query, update_query, insert_query, insert_many, after_commit, outside_unit_of_work
 from mariadb import IntegrityError
 from data.models.topic import TopicResponse
 
+CATALOG_TTL = 60  # seconds; reloading also picks up categories changed by other server processes
+PERMISSIONS_CACHE_SIZE = 4096  # users whose permission snapshots are kept
+PERMISSIONS_TTL = 60  # seconds; bounds how long grants made by other server processes go unseen
 
-def exists_by_name(name) -> bool:
-    return any(read_query(
-        '''SELECT 1 FROM categories WHERE name = ?''', (name,)))
 
+class _Catalog:
+    """
+    Every category, kept in memory: the table is small and read by almost every request
+    - Writes made through this module invalidate it once committed; the next read reloads it
+    - generation is bumped by every invalidation, so a load that read the table before a write
+      is not stored
+    """
 
-def get_all(search: str | None = None) -> list[Category]:
-    sql = '''SELECT category_id, name, is_locked, is_private
-        FROM categories'''
+    def __init__(self):
+        self.by_id: dict[int, Category] = {}
+        self.ids_by_name: dict[str, int] = {}
+        self.expires_at = 0.0
+        self.generation = 0
 
-    query_params = ()
+    def is_fresh(self) -> bool:
+        return monotonic() < self.expires_at
 
-    if search:
-        sql += ' WHERE name LIKE ?'
-        query_params += (f'%{search}%',)
+    def replace(self, categories: list[Category], generation: int) -> None:
+        if generation != self.generation:
+            return
 
-    result = read_query(sql, query_params)
-    categories = [Category.from_query(*row) for row in result]
+        self.by_id = {category.category_id: category for category in categories}
+        self.ids_by_name = {category.name.lower(): category.category_id for category in categories}
+        self.expires_at = monotonic() + CATALOG_TTL
 
-    return categories
+    def invalidate(self) -> None:
+        self.generation += 1
+        self.expires_at = 0.0
 
 
-def get_by_id(category_id) -> Category | None:
-    data = read_query(
-        '''SELECT category_id, name, is_locked, is_private
-        FROM categories WHERE category_id = ?''', (category_id,))
-    if data:
-        return Category.from_query(*data[0])
+_catalog = _Catalog()
+_catalog_lock = asyncio.Lock()
+
+
+async def load_catalog() -> None:
+    """
+    Reads all categories into the in-memory catalog, in one query
+    - Read outside the request's unit of work, whose snapshot may be older than the last committed
+      change or hold its own uncommitted ones
+    """
+    generation = _catalog.generation
+    with outside_unit_of_work():
+        data = await read_query(
+            '''SELECT category_id, name, is_locked, is_private
+            FROM categories ORDER BY category_id''')
+    _catalog.replace([Category.from_query(*row) for row in data], generation)
+
+
+def invalidate_catalog() -> None:
+    _catalog.invalidate()
+
+
+async def _categories() -> _Catalog:
+    if not _catalog.is_fresh():
+        async with _catalog_lock:
+            # requests that waited for the lock find the catalog the first one loaded;
+            # a load that raced an invalidation isn't stored, so it is read again
+            while not _catalog.is_fresh():
+                await load_catalog()
+
+    return _catalog
 
 
-def create(category: Category) -> Category | IntegrityError:
+async def exists_by_name(name) -> bool:
+    # names compare case-insensitively, like the column's collation
+    return name.lower() in (await _categories()).ids_by_name
+
+
+async def get_all(search: str | None = None) -> list[Category]:
+    """
+    - Served from the in-memory catalog; search matches a part of the name, ignoring case
+    """
+    categories = (await _categories()).by_id.values()
+    if search:
+        search = search.lower()
+        categories = [category for category in categories if search in category.name.lower()]
+
+    return [category.model_copy() for category in categories]
+
+
+async def get_by_id(category_id) -> Category | None:
+    category = (await _categories()).by_id.get(category_id)
+    if category:
+        return category.model_copy()
+
+
+async def create(category: Category) -> Category | IntegrityError:
     """
     Handles unique columns violations with try/except
     """
     try:
-        generated_id = insert_query(
+        generated_id = await insert_query(
             'INSERT INTO categories(name, is_locked, is_private) VALUES(?,?,?)',
             (category.name, category.is_locked, category.is_private)
         )
         category.category_id = generated_id
+        after_commit(invalidate_catalog)
         return category
     except IntegrityError as e:
         return e
 
 
-def has_access_to_private_category(user_id: int, category_id: int) -> bool:
-    return any(read_query(
-        '''SELECT 1
-           FROM users_categories_permissions
-           WHERE user_id = ? AND category_id = ?''',
-        (user_id, category_id,)))
+class Permissions(NamedTuple):
+    """
+    A user's rows of users_categories_permissions, as sets of category ids
+    """
+    read: frozenset[int]  # every category the user was added to
+    write: frozenset[int]
 
 
-def update_privacy(privacy: bool, category_id: int) -> None:
-    update_query('UPDATE categories SET is_private = ? WHERE category_id = ?',
-                 (privacy, category_id,))
+_permissions = TTLCache(maxsize=PERMISSIONS_CACHE_SIZE, ttl=PERMISSIONS_TTL)
 
 
-def update_locking(locking: bool, category_id: int) -> None:
-    update_query('UPDATE categories SET is_locked = ? WHERE category_id = ?',
-                 (locking, category_id,))
+async def get_permissions(user_id: int) -> Permissions:
+    """
+    Loads all of a user's category permissions in one query and keeps them for PERMISSIONS_TTL seconds
+    - The services granting, revoking and switching access invalidate the user's snapshot once committed
+    - Read outside the request's unit of work: its snapshot may predate a revoke committed since,
+      or hold its own uncommitted writes, and either would be cached as fresh
+    """
+    generation = _permissions.generation
+    permissions = _permissions.get(user_id)
+    if permissions is None:
+        with outside_unit_of_work():
+            data = await read_query(
+                '''SELECT category_id, write_access FROM users_categories_permissions
+                WHERE user_id = ?''', (user_id,))
+        permissions = Permissions(
+            read=frozenset(category_id for category_id, _ in data),
+            write=frozenset(category_id for category_id, write_access in data if write_access)
+        )
+        _permissions.put(user_id, permissions, generation)
 
+    return permissions
 
-def get_user_access_level(user_id: int, category_id: int) -> bool | None:
-    data = read_query(
-        '''SELECT write_access FROM users_categories_permissions 
-        WHERE user_id = ? AND category_id = ?''', (user_id, category_id,)
-    )
-    if data:
-        return data[0][0]
+
+def invalidate_permissions(*user_ids: int) -> None:
+    _permissions.invalidate(*user_ids)
+
+
+def permissions_cache_stats() -> dict:
+    return _permissions.stats()
+
+
+async def has_access_to_private_category(user_id: int, category_id: int) -> bool:
+    return category_id in (await get_permissions(user_id)).read
+
+
+async def update_privacy(privacy: bool, category_id: int) -> None:
+    await update_query('UPDATE categories SET is_private = ? WHERE category_id = ?',
+                       (privacy, category_id,))
+    after_commit(invalidate_catalog)
+
+
+async def update_locking(locking: bool, category_id: int) -> None:
+    await update_query('UPDATE categories SET is_locked = ? WHERE category_id = ?',
+                       (locking, category_id,))
+    after_commit(invalidate_catalog)
 
 
-def update_user_access_level(user_id: int, category_id: int, access: bool) -> None:
-    update_query(
+async def get_user_access_level(user_id: int, category_id: int) -> bool | None:
+    """
+    - Returns whether the user can write in the category, None if the user is not in it
+    """
+    permissions = await get_permissions(user_id)
+    if category_id in permissions.read:
+        return category_id in permissions.write
+
+
+async def update_user_access_level(user_id: int, category_id: int, access: bool) -> None:
+    await update_query(
         '''UPDATE users_categories_permissions SET write_access = ?
         WHERE user_id = ? AND category_id = ?''', (access, user_id, category_id)
     )
+    after_commit(lambda: invalidate_permissions(user_id))
 
 
-def is_user_in(user_id: int, category_id: int) -> bool:
-    data = read_query(
-        '''SELECT 1 FROM users_categories_permissions 
-        WHERE user_id = ? AND category_id = ?''', (user_id, category_id,)
-    )
-    return any(data)
+async def is_user_in(user_id: int, category_id: int) -> bool:
+    return category_id in (await get_permissions(user_id)).read
+
 
+async def add_user(user_id: int, category_id: int) -> None:
+    await insert_query('INSERT INTO users_categories_permissions(user_id,category_id) VALUES(?,?)',
+                       (user_id, category_id,))
+    after_commit(lambda: invalidate_permissions(user_id))
 
-def add_user(user_id: int, category_id: int) -> None:
-    insert_query('INSERT INTO users_categories_permissions(user_id,category_id) VALUES(?,?)',
-                 (user_id, category_id,))
 
+async def add_users(user_ids: list[int], category_id: int) -> list[int]:
+    """
+    Gives read access to many users with one bulk insert
+    - Skips users who are already in the category
+    - Returns the ids of the users added
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+
+    placeholders = ', '.join('?' * len(user_ids))
+    data = await read_query(
+        f'''SELECT user_id FROM users_categories_permissions
+        WHERE category_id = ? AND user_id IN ({placeholders})''', (category_id, *user_ids)
+    )
+    already_in = {row[0] for row in data}
+    new_user_ids = [user_id for user_id in user_ids if user_id not in already_in]
 
-def remove_user(user_id: int, category_id: int) -> None:
-    update_query('DELETE FROM users_categories_permissions WHERE user_id = ? AND category_id = ?',
-                 (user_id, category_id,))
+    await insert_many('INSERT INTO users_categories_permissions(user_id,category_id) VALUES(?,?)',
+                      [(user_id, category_id) for user_id in new_user_ids])
+    after_commit(lambda: invalidate_permissions(*new_user_ids))
+    return new_user_ids
 
 
-def has_write_access(user_id: int, category_id: int) -> bool:
-    return any(read_query(
-        '''SELECT 1
-           FROM users_categories_permissions
-           WHERE user_id = ? AND category_id = ? AND write_access = ?''',
-        (user_id, category_id, 1))
-    )
+async def remove_user(user_id: int, category_id: int) -> None:
+    await update_query('DELETE FROM users_categories_permissions WHERE user_id = ? AND category_id = ?',
+                       (user_id, category_id,))
+    after_commit(lambda: invalidate_permissions(user_id))
+
+
+async def has_write_access(user_id: int, category_id: int) -> bool:
+    return category_id in (await get_permissions(user_id)).write
 
 
-def get_privileged_users(category_id) -> list:
-    data = read_query(
+async def get_privileged_users(category_id) -> list:
+    data = await read_query(
         '''SELECT ucp.user_id, u.username, ucp.write_access
             FROM users_categories_permissions as ucp 
             JOIN users as u 
@@ -136,8 +260,8 @@ def response_obj_privileged_users(category: Category, users: list[tuple]) -> dic
     }
 
 
-def get_topics_by_cat_id(category_id: int) -> list[TopicResponse] | None:
-    data = read_query(
+async def get_topics_by_cat_id(category_id: int) -> list[TopicResponse] | None:
+    data = await read_query(
         '''SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name
                FROM topics t 
                JOIN users u ON t.user_id = u.user_id
@@ -1,21 +1,28 @@
-from data.models.message import Message
+from data.models.message import Message, ConversationPage
 from data.models.user import UserInfo
-from data.database import read_query, update_query, insert_query
+from data.async_database import read_query, update_query, insert_query, after_commit
+from services.search_services import search_index
+from search.index import MESSAGE
 
+CONVERSATION_PAGE_SIZE = 50
 
-def exists(message_id):
-    return any(read_query('SELECT 1 FROM messages WHERE message_id = ?',
-                          (message_id,)))
 
+async def exists(message_id):
+    return any(await read_query('SELECT 1 FROM messages WHERE message_id = ?',
+                                (message_id,)))
 
-def create(message_text, sender_id, receiver_id):
-    return insert_query(
+
+async def create(message_text, sender_id, receiver_id):
+    message_id = await insert_query(
         'INSERT INTO messages(text, sender_id, receiver_id) VALUES(?,?,?)',
         (message_text, sender_id, receiver_id))
+    after_commit(lambda: search_index.add_message(message_id, message_text, sender_id, receiver_id))
+
+    return message_id
 
 
-def get_all_conversations(user_id: int):
-    data = read_query('''SELECT u.username, u.email, u.first_name, u.last_name
+async def get_all_conversations(user_id: int):
+    data = await read_query('''SELECT u.username, u.email, u.first_name, u.last_name
                         FROM users u
                         JOIN messages m
                         ON u.user_id = m.receiver_id
@@ -30,18 +37,56 @@ def get_all_conversations(user_id: int):
     return [UserInfo.from_query(*row) for row in data]
 
 
-def get_conversation(sender_id: int, receiver_id: int):
-    data = read_query('''SELECT message_id, text, sender_id, receiver_id
-                      FROM messages
-                      WHERE (sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?)
-                      ORDER BY message_id ASC''',
-                      (sender_id, receiver_id, receiver_id, sender_id))
+async def get_conversation(
+        sender_id: int,
+        receiver_id: int,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = CONVERSATION_PAGE_SIZE
+) -> ConversationPage:
+    """
+    Returns up to limit messages the two users exchanged, oldest first
+    - Without before/after these are the latest ones; before and after are message ids to read older
+      or newer messages than, both together give the messages between them, read from after onwards
+    - A conversation is keyed by (user_low, user_high), the generated LEAST/GREATEST of its two user ids,
+      so a page is one seek on idx_messages_conversation, however long the conversation is
+    """
+    user_low, user_high = sorted((sender_id, receiver_id))
+    forward = after is not None
+    direction = 'ASC' if forward else 'DESC'
+
+    sql = '''SELECT message_id, text, sender_id, receiver_id
+             FROM messages
+             WHERE user_low = ? AND user_high = ?'''
+    params = (user_low, user_high)
+    if after is not None:
+        sql += ' AND message_id > ?'
+        params += (after,)
+    if before is not None:
+        sql += ' AND message_id < ?'
+        params += (before,)
+    sql += f' ORDER BY user_low {direction}, user_high {direction}, message_id {direction} LIMIT ?'
+
+    # one extra row tells whether there are more messages in the reading direction
+    data = await read_query(sql, params + (limit + 1,))
+    has_more, data = len(data) > limit, data[:limit]
+    if not forward:
+        data.reverse()
+
+    messages = [Message.from_query(*row) for row in data]
+    page = ConversationPage(messages=messages)
+    if messages:
+        if forward or has_more:
+            page.before = messages[0].message_id
+        if (has_more if forward else before is not None):
+            page.after = messages[-1].message_id
 
-    return [Message.from_query(*row) for row in data]
+    return page
 
 
-def update_text(message_id, message_text: str):
-    update_query(
+async def update_text(message_id, message_text: str):
+    await update_query(
         'UPDATE messages SET text = ? WHERE message_id = ?',
         (message_text, message_id,)
     )
+    after_commit(lambda: search_index.update_text(MESSAGE, message_id, message_text))
@@ -3,69 +3,200 @@ from typing import Union
 from data.models.category import Category
 from data.models.reply import ReplyCreateUpdate, ReplyResponse
 from data.models.topic import TopicResponse
-from data.database import read_query, update_query, insert_query
-from services.topics_services import get_by_id as get_topic_by_id
+from data.async_database import read_query, update_query, insert_query, query_count, after_commit
+from services.topics_services import get_by_id as get_topic_by_id, update_best_reply
+from services.votes_services import apply_buffered_tallies
+from services.reputation_services import vote_changed
 from services.categories_services import get_by_id as get_cat_by_id, has_write_access
-from common.utils import get_pagination_info, create_links
+from common.utils import PaginationInfo, Links, get_pagination_info, create_links, encode_cursor, decode_cursor
+from services.search_services import search_index
+from search.index import REPLY
 from starlette.requests import Request
 
-
-def get_all(topic_id: int, request: Request, page: int, size: int) -> list[ReplyResponse]:
-    params = (topic_id,)
-
-    sql = '''SELECT r.reply_id, r.text, u.username, r.topic_id
+# sort_by -> ORDER BY of a topic's replies; 'best' is served by idx_replies_topic_score, read backwards
+_REPLY_ORDERS = {
+    'reply_id': 'r.topic_id, r.reply_id',
+    'best': 'r.topic_id DESC, r.score DESC, r.reply_id DESC',
+}
+REPLY_SORTS = tuple(_REPLY_ORDERS)
+
+
+async def get_all(
+        topic_id: int,
+        request: Request,
+        page: int | None,
+        size: int,
+        position: dict = None,
+        sort_by: str = 'reply_id'
+) -> tuple[list[ReplyResponse], PaginationInfo, Links]:
+    """
+    - Replies are ordered by (topic_id, reply_id), which idx_replies_topic_reply serves directly,
+      or 'best' first: by the score kept in replies.score, which idx_replies_topic_score serves
+    - Paginates by page number (OFFSET) when a page is given, otherwise by the keyset position of a cursor
+    - The total comes from the reply count kept on the topic, instead of counting the replies
+    """
+
+    if page is None:
+        return await get_all_keyset(topic_id, request, size, position or parse_cursor(None, topic_id, sort_by))
+
+    sql = f'''SELECT r.reply_id, r.text, u.username, r.topic_id, r.upvotes, r.downvotes
             FROM replies r 
             JOIN users u ON r.user_id = u.user_id
-            WHERE topic_id = ?'''
+            WHERE r.topic_id = ?
+            ORDER BY {_REPLY_ORDERS[sort_by]}
+            LIMIT ? OFFSET ?'''
 
-    pagination_sql = sql + ' LIMIT ? OFFSET ?'
-    params += (size, size * (page - 1))
-
-    data = read_query(pagination_sql, params)
-    replies = [ReplyResponse.from_query(*row) for row in data]
-    pagination_info = get_pagination_info(len(replies), page, size)
+    data = await read_query(sql, (topic_id, size, size * (page - 1)))
+    replies = apply_buffered_tallies([ReplyResponse.from_query(*row) for row in data])
+    pagination_info = get_pagination_info(await get_reply_count(topic_id), page, size)
     links = create_links(request, pagination_info)
     
     return replies, pagination_info, links
 
 
-def get_by_id(id: int) -> Union[ReplyResponse, None]:
-    data = read_query(
-        '''SELECT r.reply_id, r.text, u.username, r.topic_id
+async def get_all_keyset(
+        topic_id: int,
+        request: Request,
+        size: int,
+        position: dict
+) -> tuple[list[ReplyResponse], PaginationInfo, Links]:
+    """
+    - Reads the replies after (or before) the cursor's key, so a page costs the same at any depth
+    - The key is the reply_id, or [score, reply_id] for the 'best' order
+    """
+
+    best, forward, key = position.get('s') == 'best', position['d'] == 'next', position.get('k')
+    # the best replies come first, so reading forwards walks the score index downwards
+    direction, op = ('ASC', '>') if forward != best else ('DESC', '<')
+
+    sql = '''SELECT r.reply_id, r.text, u.username, r.topic_id, r.upvotes, r.downvotes, r.score
+            FROM replies r 
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.topic_id = ?'''
+    params = (topic_id,)
+    if key is not None and best:
+        score, reply_id = key
+        sql += f' AND (r.score {op} ? OR (r.score = ? AND r.reply_id {op} ?))'
+        params += (score, score, reply_id)
+    elif key is not None:
+        sql += f' AND r.reply_id {op} ?'
+        params += (key,)
+    if best:
+        sql += f' ORDER BY r.topic_id {direction}, r.score {direction}, r.reply_id {direction} LIMIT ?'
+    else:
+        sql += f' ORDER BY r.topic_id {direction}, r.reply_id {direction} LIMIT ?'
+
+    # one extra row tells whether there is another page in the reading direction
+    data = await read_query(sql, params + (size + 1,))
+    has_more, data = len(data) > size, data[:size]
+    if not forward:
+        data.reverse()
+
+    replies = apply_buffered_tallies([ReplyResponse.from_query(*row[:6]) for row in data])
+
+    def cursor_to(row, d):
+        cursor = {'t': topic_id, 'd': d, 'k': [row[6], row[0]] if best else row[0]}
+        return encode_cursor({**cursor, 's': 'best'} if best else cursor)
+
+    next_cursor = prev_cursor = None
+    if data:
+        if (has_more if forward else key is not None):
+            next_cursor = cursor_to(data[-1], 'next')
+        if (key is not None if forward else has_more):
+            prev_cursor = cursor_to(data[0], 'prev')
+    last_cursor = encode_cursor({'t': topic_id, 'd': 'prev', 's': 'best'} if best else {'t': topic_id, 'd': 'prev'})
+
+    pagination_info = get_pagination_info(await get_reply_count(topic_id), None, size)
+    links = create_links(request, pagination_info, next_cursor, prev_cursor, last_cursor)
+
+    return replies, pagination_info, links
+
+
+def parse_cursor(cursor: str | None, topic_id: int, sort_by: str = 'reply_id') -> dict | None:
+    """
+    Returns the keyset position a cursor points to, or the first page, if there is no cursor
+    - The position is: t - the topic, d - 'next' or 'prev', k - the key to seek past,
+      s - 'best' for the best-first order, absent for the reply_id order
+    - Returns None, if the cursor is malformed or was made for another topic or order
+    """
+    best = sort_by == 'best'
+    if cursor is None:
+        return {'t': topic_id, 'd': 'next', 's': 'best'} if best else {'t': topic_id, 'd': 'next'}
+
+    position = decode_cursor(cursor)
+    if not position or position.get('t') != topic_id or position.get('d') not in ('next', 'prev'):
+        return None
+    if (position.get('s') == 'best') != best or position.get('s') not in (None, 'best'):
+        return None
+
+    key = position.get('k')
+    if key is not None and best and not (isinstance(key, list) and len(key) == 2
+                                         and isinstance(key[0], (int, float)) and isinstance(key[1], int)):
+        return None
+    if key is not None and not best and not isinstance(key, int):
+        return None
+
+    return position
+
+
+async def get_reply_count(topic_id: int) -> int:
+    return await query_count('SELECT reply_count FROM topics WHERE topic_id = ?', (topic_id,))
+
+
+async def get_by_id(id: int) -> Union[ReplyResponse, None]:
+    data = await read_query(
+        '''SELECT r.reply_id, r.text, u.username, r.topic_id, r.upvotes, r.downvotes
         FROM replies r 
         JOIN users u ON r.user_id = u.user_id
         WHERE reply_id = ?''', (id,)
     )
 
-    return ReplyResponse.from_query(*data[0]) if data else None
+    return apply_buffered_tallies([ReplyResponse.from_query(*data[0])])[0] if data else None
 
 
-def create_reply(topic_id: int, reply: ReplyCreateUpdate, user_id: int) -> int:
-    return insert_query(
+async def create_reply(topic_id: int, reply: ReplyCreateUpdate, user_id: int) -> int:
+    reply_id = await insert_query(
         'INSERT INTO replies(text, user_id, topic_id) VALUES(?,?,?)',
         (reply.text, user_id, topic_id,)
     )
+    after_commit(lambda: search_index.add_reply(reply_id, reply.text, topic_id))
+
+    return reply_id
 
 
-def update_reply(id: int, text: str):
+async def update_reply(id: int, text: str):
     edited = 1  # True
-    update_query(
+    await update_query(
         '''UPDATE replies SET text = ?, edited = ? WHERE reply_id = ?''', (
             text, edited, id)
     )
+    after_commit(lambda: search_index.update_text(REPLY, id, text))
+
+
+async def delete_reply(id: int):
+    """
+    - Deletes the reply's votes and unsets it as its topic's best reply first: votes have no foreign key
+      to replies, and the vote and best reply triggers take the points off its author's reputation
+    """
+    deleted = await read_query('DELETE FROM votes WHERE reply_id = ? RETURNING type', (id,))
+    for vote, in deleted:
+        await vote_changed(id, vote, None)
 
+    best_of = await read_query('SELECT topic_id FROM topics WHERE best_reply_id = ? FOR UPDATE', (id,))
+    for topic_id, in best_of:
+        await update_best_reply(topic_id, None)
 
-def delete_reply(id: int):
-    update_query(
+    await update_query(
         '''DELETE from replies WHERE reply_id = ?''', (id,)
     )
+    after_commit(lambda: search_index.remove(REPLY, id))
 
 
-def can_user_access_topic_content(topic_id: int, user_id: int) -> tuple[bool, str]:
-    topic: TopicResponse = get_topic_by_id(topic_id)
-    category: Category = get_cat_by_id(topic.category_id)
+async def can_user_access_topic_content(topic_id: int, user_id: int) -> tuple[bool, str]:
+    topic: TopicResponse = await get_topic_by_id(topic_id)
+    category: Category = await get_cat_by_id(topic.category_id)
 
-    if category.is_private and not has_write_access(user_id, category.category_id):
+    if category.is_private and not await has_write_access(user_id, category.category_id):
         return False, 'You don\'t have permissions to post, modify replies or vote in this topic'
 
     if topic.status == 'locked':
@@ -74,5 +205,5 @@ def can_user_access_topic_content(topic_id: int, user_id: int) -> tuple[bool, st
     return True, "OK"
 
 
-def exists(reply_id: int, topic_id):
-    return any(read_query('SELECT 1 FROM replies WHERE reply_id=? and topic_id=?', (reply_id, topic_id)))
+async def exists(reply_id: int, topic_id):
+    return any(await read_query('SELECT 1 FROM replies WHERE reply_id=? and topic_id=?', (reply_id, topic_id)))
@@ -0,0 +1,128 @@
+import asyncio
+from time import monotonic
+from common.cache import TTLCache
+from data.async_database import read_query, update_query, after_commit
+from data.leaderboard import Leaderboard
+from data.models.user import UserRank
+
+# a user's reputation: +1 per upvote and -1 per downvote on their replies, and BEST_REPLY_BONUS per reply
+# chosen as the best of its topic; user_reputation is kept by the after_vote_* and after_topic_best_reply_*
+# triggers, which use the same points, and _leaderboard mirrors it in memory
+VOTE_POINTS = {1: 1, 0: -1, None: 0}
+BEST_REPLY_BONUS = 15
+REPLY_AUTHOR_CACHE_SIZE = 8192  # replies never change author, so entries only need to be evicted
+LEADERBOARD_TTL = 300  # seconds; reloading repairs drift, e.g. from votes cast through other server processes
+
+_leaderboard = Leaderboard()
+_leaderboard_expires_at = 0.0
+_leaderboard_lock = asyncio.Lock()
+_reply_authors = TTLCache(maxsize=REPLY_AUTHOR_CACHE_SIZE, ttl=24 * 60 * 60)
+
+
+async def load_leaderboard() -> None:
+    """
+    Reads the leaderboard from user_reputation, leaving out deleted users
+    """
+    global _leaderboard_expires_at
+    _leaderboard.load(*await _read_leaderboard())
+    _leaderboard_expires_at = monotonic() + LEADERBOARD_TTL
+
+
+async def _fresh_leaderboard() -> Leaderboard:
+    if monotonic() >= _leaderboard_expires_at:
+        async with _leaderboard_lock:
+            # requests that waited for the lock find the leaderboard the first one loaded
+            if monotonic() >= _leaderboard_expires_at:
+                await load_leaderboard()
+
+    return _leaderboard
+
+
+async def _read_leaderboard() -> tuple[list, list[int]]:
+    reputations = await read_query('SELECT user_id, reputation FROM user_reputation')
+    deleted = await read_query('SELECT user_id FROM users WHERE is_deleted = ?', (1,))
+
+    return reputations, [user_id for user_id, in deleted]
+
+
+async def get_top(n: int) -> list[UserRank]:
+    top = (await _fresh_leaderboard()).top(n)
+    usernames = await _get_usernames([user_id for _, user_id, _ in top])
+
+    return [UserRank(rank=rank, user_id=user_id, username=usernames.get(user_id), reputation=reputation)
+            for rank, user_id, reputation in top]
+
+
+async def get_rank(user_id: int, username: str) -> UserRank:
+    rank, reputation = (await _fresh_leaderboard()).rank(user_id)
+    return UserRank(rank=rank, user_id=user_id, username=username, reputation=reputation)
+
+
+async def vote_changed(reply_id: int, previous: int | None, vote: int | None) -> None:
+    """
+    Moves the reputation of the reply's author by the change of a vote, once it is committed
+    """
+    delta = VOTE_POINTS[vote] - VOTE_POINTS[previous]
+    if delta:
+        author_id = await get_reply_author(reply_id)
+        if author_id is not None:
+            after_commit(lambda: _leaderboard.add(author_id, delta))
+
+
+async def best_reply_changed(previous_reply_id: int | None, best_reply_id: int | None) -> None:
+    """
+    Moves the best reply bonus from the author of the previous best reply to the new one's, once it is committed
+    """
+    if previous_reply_id == best_reply_id:
+        return
+
+    for reply_id, delta in ((previous_reply_id, -BEST_REPLY_BONUS), (best_reply_id, BEST_REPLY_BONUS)):
+        author_id = reply_id and await get_reply_author(reply_id)
+        if author_id:
+            after_commit(lambda author_id=author_id, delta=delta: _leaderboard.add(author_id, delta))
+
+
+def exclude_user(user_id: int) -> None:
+    _leaderboard.exclude(user_id)
+
+
+async def get_reply_author(reply_id: int) -> int | None:
+    author_id = _reply_authors.get(reply_id)
+    if author_id is None:
+        data = await read_query('SELECT user_id FROM replies WHERE reply_id = ?', (reply_id,))
+        if data:
+            author_id = data[0][0]
+            _reply_authors.put(reply_id, author_id)
+
+    return author_id
+
+
+async def reconcile_reputation() -> None:
+    """
+    Recounts user_reputation from the votes and the best replies and reloads the leaderboard from it
+    - The table is kept by triggers; this repairs it after manual edits
+    """
+    await update_query('DELETE FROM user_reputation')
+    await update_query(
+        '''INSERT INTO user_reputation(user_id, reputation)
+           SELECT user_id, SUM(points) FROM (
+               SELECT r.user_id, IF(v.type = 1, 1, -1) AS points
+               FROM votes v JOIN replies r ON r.reply_id = v.reply_id
+               UNION ALL
+               SELECT r.user_id, ? AS points
+               FROM topics t JOIN replies r ON r.reply_id = t.best_reply_id
+           ) p
+           GROUP BY user_id''', (BEST_REPLY_BONUS,))
+
+    board = await _read_leaderboard()
+    after_commit(lambda: _leaderboard.load(*board))
+
+
+async def _get_usernames(user_ids: list[int]) -> dict[int, str]:
+    if not user_ids:
+        return {}
+
+    data = await read_query(
+        f'SELECT user_id, username FROM users WHERE user_id IN ({", ".join("?" * len(user_ids))})',
+        tuple(user_ids))
+    return dict(data)
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from contextlib import suppress
+import numpy as np
+from data.async_database import read_query, update_many
+
+# replies.score is the lower bound of the Wilson score interval of the share of upvotes; the after_vote_*
+# triggers mark a reply score_stale when its tallies change and the scores are recomputed in batches
+SCORE_CONFIDENCE_Z = 1.96  # 95% confidence
+SCORE_BATCH_SIZE = 1000  # stale replies read, scored and written at once
+SCORE_INTERVAL = 5  # seconds between recomputations; 0 - only on demand, see recompute_scores()
+
+_READ_STALE = '''SELECT reply_id, upvotes, downvotes FROM replies
+                 WHERE score_stale = 1 AND reply_id > ?
+                 ORDER BY reply_id LIMIT ?'''
+# a reply whose tallies changed after they were read keeps score_stale and is scored again on the next run
+_WRITE_SCORE = '''UPDATE replies SET score = ?, score_stale = 0
+                  WHERE reply_id = ? AND upvotes = ? AND downvotes = ?'''
+
+_log = logging.getLogger(__name__)
+
+
+def wilson_lower_bound(upvotes: np.ndarray, downvotes: np.ndarray, z: float = SCORE_CONFIDENCE_Z) -> np.ndarray:
+    """
+    Returns the lower bound of the Wilson score interval of upvotes / (upvotes + downvotes), element-wise
+    - Replies without votes score 0
+    """
+    up = np.asarray(upvotes, dtype=np.float64)
+    n = up + np.asarray(downvotes, dtype=np.float64)
+    voted = n > 0
+    n = np.where(voted, n, 1.0)
+
+    p = up / n
+    z2 = z * z
+    bound = (p + z2 / (2 * n) - z * np.sqrt((p * (1 - p) + z2 / (4 * n)) / n)) / (1 + z2 / n)
+    return np.where(voted, np.clip(bound, 0.0, 1.0), 0.0)
+
+
+async def recompute_scores() -> int:
+    """
+    Scores every stale reply, SCORE_BATCH_SIZE at a time, walking them by reply_id
+    - Returns the number of replies scored
+    """
+    scored, after = 0, 0
+    while True:
+        data = await read_query(_READ_STALE, (after, SCORE_BATCH_SIZE))
+        if not data:
+            return scored
+
+        rows = np.array(data, dtype=np.int64).reshape(-1, 3)
+        scores = wilson_lower_bound(rows[:, 1], rows[:, 2])
+        await update_many(_WRITE_SCORE, [(float(score), int(reply_id), int(up), int(down))
+                                         for score, (reply_id, up, down) in zip(scores, rows)])
+
+        scored += len(data)
+        if len(data) < SCORE_BATCH_SIZE:
+            return scored
+        after = int(rows[-1, 0])
+
+
+async def start_score_updater() -> asyncio.Task | None:
+    """
+    Starts recomputing the stale scores every SCORE_INTERVAL seconds, unless it is 0
+    """
+    if not SCORE_INTERVAL:
+        return None
+
+    return asyncio.create_task(_recompute_periodically())
+
+
+async def stop_score_updater(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+async def _recompute_periodically() -> None:
+    while True:
+        # replies left stale by a failed run are picked up by the next one
+        try:
+            await recompute_scores()
+        except Exception:
+            _log.exception('Recomputing reply scores failed')
+        await asyncio.sleep(SCORE_INTERVAL)
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from common.utils import get_pagination_info, create_links
+from data.async_database import read_query, read_query_iter, query_count
+from data.models.search import TopicSearchResult, ReplySearchResult, SearchHit
+from data.models.user import User, AnonymousUser
+from services import categories_services
+from search.index import InvertedIndex, KINDS, KIND_NAMES
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+# InnoDB FULLTEXT indexes skip words shorter than innodb_ft_min_token_size (3 by default)
+MIN_TERM_LENGTH = 3
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'search_index')
+INDEX_MAINTENANCE_INTERVAL = 30  # seconds between flushes / merges of the in-process index
+
+search_index = InvertedIndex(INDEX_DIR)
+
+_log = logging.getLogger(__name__)
+
+_TOPICS_MATCH = 'MATCH(t.title) AGAINST(? IN NATURAL LANGUAGE MODE)'
+_REPLIES_MATCH = 'MATCH(r.text) AGAINST(? IN NATURAL LANGUAGE MODE)'
+
+
+def has_searchable_terms(query: str) -> bool:
+    return any(len(term) >= MIN_TERM_LENGTH for term in query.split())
+
+
+def _visible_categories(user: User | AnonymousUser) -> tuple[str, tuple]:
+    """
+    - Admins see every category, guests only public ones, users public ones and the private ones they were given access to
+    """
+
+    if isinstance(user, AnonymousUser):
+        return ' AND c.is_private = 0', ()
+    if user.is_admin:
+        return '', ()
+
+    return (
+        ' AND (c.is_private = 0 OR EXISTS ('
+        'SELECT 1 FROM users_categories_permissions p WHERE p.user_id = ? AND p.category_id = c.category_id))',
+        (user.user_id,)
+    )
+
+
+async def search_topics(request: Request, query: str, user: User | AnonymousUser, page: int, size: int):
+    """
+    - Ranks the topics whose title matches the query by relevance, using the ft_topics_title FULLTEXT index
+    """
+
+    visible, visible_params = _visible_categories(user)
+    sql = (
+        'FROM topics t '
+        'JOIN users u ON t.user_id = u.user_id '
+        'JOIN categories c ON t.category_id = c.category_id '
+        f'WHERE {_TOPICS_MATCH}{visible}'
+    )
+    params = (query,) + visible_params
+
+    data, total_count = await _read_page(
+        'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name, '
+        f'{_TOPICS_MATCH} AS score, COUNT(*) OVER() ' + sql + ' ORDER BY score DESC, t.topic_id',
+        (query,) + params, sql, params, page, size
+    )
+    topics = [TopicSearchResult.from_query(*row[:-1]) for row in data]
+
+    pagination_info = get_pagination_info(total_count, page, size)
+    return topics, pagination_info, create_links(request, pagination_info)
+
+
+async def search_replies(request: Request, query: str, user: User | AnonymousUser, page: int, size: int):
+    """
+    - Ranks the replies whose text matches the query by relevance, using the ft_replies_text FULLTEXT index
+    """
+
+    visible, visible_params = _visible_categories(user)
+    sql = (
+        'FROM replies r '
+        'JOIN users u ON r.user_id = u.user_id '
+        'JOIN topics t ON r.topic_id = t.topic_id '
+        'JOIN categories c ON t.category_id = c.category_id '
+        f'WHERE {_REPLIES_MATCH}{visible}'
+    )
+    params = (query,) + visible_params
+
+    data, total_count = await _read_page(
+        f'SELECT r.reply_id, r.text, u.username, r.topic_id, {_REPLIES_MATCH} AS score, COUNT(*) OVER() '
+        + sql + ' ORDER BY score DESC, r.reply_id',
+        (query,) + params, sql, params, page, size
+    )
+    replies = [ReplySearchResult.from_query(*row[:-1]) for row in data]
+
+    pagination_info = get_pagination_info(total_count, page, size)
+    return replies, pagination_info, create_links(request, pagination_info)
+
+
+async def _read_page(sql: str, params: tuple, count_sql: str, count_params: tuple, page: int, size: int):
+    # the window count of all matches comes with every row of the page, from the same snapshot
+    data = await read_query(sql + ' LIMIT ? OFFSET ?', params + (size, size * (page - 1)))
+    if data:
+        return data, data[0][-1]
+    if page > 1:
+        # past the last page there are no rows to carry the count
+        return data, await query_count('SELECT COUNT(*) ' + count_sql, count_params)
+
+    return data, 0
+
+
+async def search_in_index(
+        request: Request,
+        query: str,
+        user: User | AnonymousUser,
+        types: list[str],
+        page: int,
+        size: int
+):
+    """
+    - Answers the query from the in-process index; the categories the user can read come from
+      the category catalog and the user's permission snapshot
+    - Raises QuerySyntaxError for malformed queries
+    """
+
+    readable = None if isinstance(user, User) and user.is_admin else await readable_category_ids(user)
+    user_id = None if isinstance(user, AnonymousUser) else user.user_id
+
+    # off the event loop: a search waits for the index lock, which flushes and merges take
+    found, total_count = await run_in_threadpool(
+        search_index.search,
+        query, readable, user_id, {KINDS[name] for name in types}, limit=size, offset=size * (page - 1))
+    hits = [SearchHit(type=KIND_NAMES[kind], id=doc_id, topic_id=topic_id, score=score)
+            for kind, doc_id, topic_id, score in found]
+
+    pagination_info = get_pagination_info(total_count, page, size)
+    return hits, pagination_info, create_links(request, pagination_info)
+
+
+async def readable_category_ids(user: User | AnonymousUser) -> set[int]:
+    readable = {category.category_id for category in await categories_services.get_all() if not category.is_private}
+    if not isinstance(user, AnonymousUser):
+        readable |= (await categories_services.get_permissions(user.user_id)).read
+
+    return readable
+
+
+async def open_index() -> asyncio.Task:
+    """
+    Loads the in-process index and starts its upkeep task
+    - An index that doesn't exist yet, or was left by a crash, is built from the database by that task
+    """
+    found = await run_in_threadpool(search_index.open)
+    return asyncio.create_task(_maintain_index(rebuild=not found))
+
+
+async def close_index(task: asyncio.Task) -> None:
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    await run_in_threadpool(search_index.flush, True)
+    search_index.close()
+
+
+async def _maintain_index(rebuild: bool) -> None:
+    if rebuild:
+        try:
+            await rebuild_index()
+        except Exception:
+            # the index keeps what was indexed so far and the writes of the services from now on
+            _log.exception('Rebuilding the search index failed')
+
+    while True:
+        await asyncio.sleep(INDEX_MAINTENANCE_INTERVAL)
+        # a failed flush or merge leaves the index as it was; the next round retries it
+        try:
+            await run_in_threadpool(search_index.maintain)
+        except Exception:
+            _log.exception('Search index maintenance failed')
+
+
+async def rebuild_index() -> None:
+    """
+    Indexes every topic, reply and message, streaming them from the database
+    - Writes made meanwhile are indexed by their services too; indexing a document twice replaces it
+    """
+    async for topic_id, title, category_id in read_query_iter(
+            'SELECT topic_id, title, category_id FROM topics'):
+        search_index.add_topic(topic_id, title, category_id)
+
+    async for reply_id, text, topic_id in read_query_iter(
+            'SELECT reply_id, text, topic_id FROM replies'):
+        search_index.add_reply(reply_id, text, topic_id)
+
+    async for message_id, text, sender_id, receiver_id in read_query_iter(
+            'SELECT message_id, text, sender_id, receiver_id FROM messages'):
+        search_index.add_message(message_id, text, sender_id, receiver_id)
+
+    await run_in_threadpool(search_index.flush)
@@ -1,62 +1,113 @@
 from __future__ import annotations
 
-from common.utils import get_pagination_info, create_links
+from common.cache import TTLCache
 from data.models.topic import Status, TopicResponse, TopicCreate
 from data.models.user import User
-from data.database import read_query, update_query, insert_query, query_count
+from data.async_database import read_query, update_query, insert_query, query_count, after_commit
 from mariadb import IntegrityError
 from common.responses import HTTPNotFound, HTTPForbidden 
-from common.utils import get_pagination_info, create_links
+from common.utils import get_pagination_info, create_links, encode_cursor, decode_cursor
+from services.search_services import search_index
+from services.reputation_services import best_reply_changed
+from search.index import TOPIC
 from starlette.requests import Request
 
 
 _TOPIC_BEST_REPLY = None
 
+TOTAL_COUNT_CACHE_SIZE = 1024
+TOTAL_COUNT_TTL = 300  # seconds; a safety net for writes made outside this process
+# unfiltered totals may come from InnoDB's table statistics instead of a COUNT(*), once the table is this large
+APPROXIMATE_UNFILTERED_COUNT = False
+APPROXIMATE_COUNT_MIN_ROWS = 1_000_000
 
-def exists(id: int):
-    return any(read_query('SELECT 1 from topics WHERE topic_id=?', (id,)))
+# (search, user_id, category_id, status), normalized by _count_key -> number of topics
+_total_counts = TTLCache(maxsize=TOTAL_COUNT_CACHE_SIZE, ttl=TOTAL_COUNT_TTL)
 
+# sort_by -> (column, index of the column in a topic row, nullable)
+_SORT_COLUMNS = {
+    'topic_id': ('t.topic_id', 0, False),
+    'title': ('t.title', 1, False),
+    'user_id': ('t.user_id', 2, False),
+    'status': ('t.is_locked', 4, False),
+    'best_reply_id': ('t.best_reply_id', 5, True),
+    'category_id': ('t.category_id', 6, False),
+}
 
-def get_total_count(sql=None, params=None):
+
+async def exists(id: int):
+    return any(await read_query('SELECT 1 from topics WHERE topic_id=?', (id,)))
+
+
+async def get_total_count(sql=None, params=None):
     if sql and params:
-        return query_count(f'SELECT COUNT(*) FROM ({sql}) as filtered_topics', params)
-    return query_count('SELECT COUNT(*) FROM topics')
+        return await query_count(f'SELECT COUNT(*) FROM ({sql}) as filtered_topics', params)
+
+    if APPROXIMATE_UNFILTERED_COUNT:
+        estimate = await query_count(
+            '''SELECT TABLE_ROWS FROM information_schema.TABLES
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ?''', ('topics',))
+        if estimate is not None and estimate >= APPROXIMATE_COUNT_MIN_ROWS:
+            return estimate
+
+    return await query_count('SELECT COUNT(*) FROM topics')
+
+
+def _count_key(search: str = None, user_id: int = None, category_id: int = None, status: str = None) -> tuple:
+    # the title compares case-insensitively, so searches differing only in case count the same topics
+    return search.lower() if search else None, user_id, category_id, status.lower() if status else None
+
+
+async def _cached_total_count(key: tuple, sql: str, params: tuple) -> int:
+    generation = _total_counts.generation
+    total_count = _total_counts.get(key)
+    if total_count is None:
+        total_count = await get_total_count(sql, params)
+        _total_counts.put(key, total_count, generation)
+
+    return total_count
 
 
-def get_all(
+def _search_may_match(search: str | None, title: str) -> bool:
+    # LIKE wildcards in the search term make a plain substring check unreliable
+    return search is None or '%' in search or '_' in search or search in title.lower()
+
+
+def _invalidate_counts_on_create(title: str, user_id: int, category_id: int) -> None:
+    # a new topic is open, so counts filtered by status 'locked' stay valid, as do those of other authors and categories
+    _total_counts.invalidate_where(
+        lambda key: key[3] != Status.LOCKED and key[1] in (None, user_id) and key[2] in (None, category_id)
+        and _search_may_match(key[0], title))
+
+
+def _invalidate_counts_on_locking() -> None:
+    # locking moves a topic between the 'open' and 'locked' counts; counts not filtered by status stay valid
+    _total_counts.invalidate_where(lambda key: key[3] is not None)
+
+
+def total_count_cache_stats() -> dict:
+    return _total_counts.stats()
+
+
+async def get_all(
         page: int,
         size: int,
         search: str = None,
-        username: str = None,
-        category: str = None,
+        user_id: int = None,
+        category_id: int = None,
         status: str = None,
         sort: str = None,
         sort_by: str = None
 ):
-    params, filters = (), []
-    sql = (
-        'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name '
-        'FROM topics t '
-        'JOIN users u ON t.user_id = u.user_id '
-        'JOIN categories c ON t.category_id = c.category_id '
-    )
- 
-    if search:
-        filters.append('t.title LIKE ?')
-        params += (f'%{search}%',)
-    if username:
-        filters.append('u.username = ?')
-        params += (username,)
-    if category:
-        filters.append('c.name = ?')
-        params += (category,)
-    if status:
-        filters.append('t.is_locked = ?')
-        params += (Status.str_int[status],)
-    sql = (sql + ("WHERE " + " AND ".join(filters) if filters else ""))
+    key = _count_key(search, user_id, category_id, status)
+    generation = _total_counts.generation
+    cached_count = _total_counts.get(key)
 
-    # get count of filtered topics for pagination info
-    total_count = get_total_count(sql, params)
+    # the window count is only needed while the total isn't cached
+    extra_columns = ', COUNT(*) OVER()' if cached_count is None else ''
+    sql, filters, params = _filtered_topics_sql(extra_columns, search, user_id, category_id, status)
+    sql = (sql + ("WHERE " + " AND ".join(filters) if filters else ""))
+    filter_params = params
 
     if sort and sort != 'topic_id':
         if sort_by == 'user_id':
@@ -73,14 +124,152 @@ def get_all(
     pagination_sql = sql + ' LIMIT ? OFFSET ?'
     params += (size, size * (page - 1))
 
-    data = read_query(pagination_sql, params)
-    topics = [TopicResponse.from_query(*row) for row in data]
-    
+    data = await read_query(pagination_sql, params)
+    if cached_count is not None:
+        return [TopicResponse.from_query(*row) for row in data], cached_count
+
+    # the window count of all filtered topics comes with every row of the page, from the same snapshot
+    if data:
+        total_count = data[0][-1]
+    elif page > 1:
+        # past the last page there are no rows to carry the count
+        total_count = await get_total_count(sql, filter_params)
+    else:
+        total_count = 0
+    _total_counts.put(key, total_count, generation)
+
+    topics = [TopicResponse.from_query(*row[:-1]) for row in data]
+
     return topics, total_count
-      
 
-def get_by_id(topic_id: int) -> TopicResponse | None:
-    data = read_query(
+
+def _filtered_topics_sql(
+        extra_columns: str = '',
+        search: str = None,
+        user_id: int = None,
+        category_id: int = None,
+        status: str = None
+) -> tuple[str, list[str], tuple]:
+    params, filters = (), []
+    sql = (
+        'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name'
+        f'{extra_columns} '
+        'FROM topics t '
+        'JOIN users u ON t.user_id = u.user_id '
+        'JOIN categories c ON t.category_id = c.category_id '
+    )
+ 
+    if search:
+        filters.append('t.title LIKE ?')
+        params += (f'%{search}%',)
+    # filtering on the topics' own columns lets their foreign key indexes do the work
+    if user_id:
+        filters.append('t.user_id = ?')
+        params += (user_id,)
+    if category_id:
+        filters.append('t.category_id = ?')
+        params += (category_id,)
+    if status:
+        filters.append('t.is_locked = ?')
+        params += (Status.str_int[status],)
+
+    return sql, filters, params
+
+
+def parse_cursor(cursor: str | None, sort: str = None, sort_by: str = None) -> dict | None:
+    """
+    Returns the keyset position a cursor points to, or the first page, if there is no cursor
+    - The position is: s - the ordering it was made for, d - 'next' or 'prev', k - [sort value, topic_id]
+    - Returns None, if the cursor is malformed or was made for another ordering
+    """
+    ordering = f"{(sort_by or 'topic_id').lower()}:{(sort or 'asc').lower()}"
+    if cursor is None:
+        return {'s': ordering, 'd': 'next'}
+
+    position = decode_cursor(cursor)
+    if not position or position.get('s') != ordering or position.get('d') not in ('next', 'prev'):
+        return None
+
+    key = position.get('k')
+    if key is not None and not (isinstance(key, list) and len(key) == 2 and isinstance(key[1], int)):
+        return None
+
+    return position
+
+
+async def get_all_keyset(
+        size: int,
+        position: dict,
+        search: str = None,
+        user_id: int = None,
+        category_id: int = None,
+        status: str = None
+):
+    """
+    Keyset (seek) pagination: reads the page after (or before) the cursor's key instead of skipping OFFSET rows,
+    so every page costs the same, however deep it is
+    - Rows are ordered by the sort column and then by topic_id, so the key is unique; NULLs come last
+    - Returns the topics, the total count and the next, previous and last page cursors
+    """
+    sort_by, sort = position['s'].split(':')
+    column, index, nullable = _SORT_COLUMNS[sort_by]
+    forward, key = position['d'] == 'next', position.get('k')
+
+    sql, filters, params = _filtered_topics_sql('', search, user_id, category_id, status)
+    filter_sql = sql + ("WHERE " + " AND ".join(filters) if filters else "")
+    filter_params = params
+
+    # reading backwards flips the order, then the page is reversed back
+    ascending = (sort == 'asc') == forward
+    direction, op = ('ASC', '>') if ascending else ('DESC', '<')
+
+    if key is not None:
+        value, topic_id = key
+        if sort_by == 'topic_id':
+            filters.append(f't.topic_id {op} ?')
+            params += (topic_id,)
+        elif value is None:
+            # NULLs come after every value: forwards only NULLs remain, backwards every value does
+            filters.append(f'({column} IS NULL AND t.topic_id {op} ?)' if forward
+                           else f'({column} IS NOT NULL OR t.topic_id {op} ?)')
+            params += (topic_id,)
+        else:
+            seek = f'{column} {op} ? OR ({column} = ? AND t.topic_id {op} ?)'
+            filters.append(f'({column} IS NULL OR {seek})' if nullable and forward else f'({seek})')
+            params += (value, value, topic_id)
+
+    sql += "WHERE " + " AND ".join(filters) if filters else ""
+    if sort_by == 'topic_id':
+        sql += f' ORDER BY t.topic_id {direction}'
+    else:
+        nulls = f'{column} IS NULL {"ASC" if forward else "DESC"}, ' if nullable else ''
+        sql += f' ORDER BY {nulls}{column} {direction}, t.topic_id {direction}'
+
+    # one extra row tells whether there is another page in the reading direction
+    data = await read_query(sql + ' LIMIT ?', params + (size + 1,))
+    has_more, data = len(data) > size, data[:size]
+    if not forward:
+        data.reverse()
+
+    total_count = await _cached_total_count(_count_key(search, user_id, category_id, status), filter_sql, filter_params)
+    topics = [TopicResponse.from_query(*row) for row in data]
+
+    def cursor_to(row, d):
+        return encode_cursor({'s': position['s'], 'd': d, 'k': [row[index], row[0]]})
+
+    next_cursor = prev_cursor = None
+    if data:
+        if (has_more if forward else key is not None):
+            next_cursor = cursor_to(data[-1], 'next')
+        if (key is not None if forward else has_more):
+            prev_cursor = cursor_to(data[0], 'prev')
+    last_cursor = encode_cursor({'s': position['s'], 'd': 'prev'})
+
+    return topics, total_count, next_cursor, prev_cursor, last_cursor
+
+
+async def get_by_id(topic_id: int) -> TopicResponse | None:
+    data = await read_query(
         '''SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name
                FROM topics t 
                JOIN users u ON t.user_id = u.user_id
@@ -89,35 +278,41 @@ def get_by_id(topic_id: int) -> TopicResponse | None:
     return next((TopicResponse.from_query(*row) for row in data), None)
 
 
-def create(topic: TopicCreate, user_id: int):
+async def create(topic: TopicCreate, user_id: int):
     try:
-        generated_id = insert_query(
+        generated_id = await insert_query(
             'INSERT INTO topics(title, user_id, is_locked, best_reply_id, category_id) VALUES(?,?,?,?,?)',
             (topic.title, user_id, Status.str_int["open"], _TOPIC_BEST_REPLY, topic.category_id))
+        after_commit(lambda: search_index.add_topic(generated_id, topic.title, topic.category_id))
+        after_commit(lambda: _invalidate_counts_on_create(topic.title, user_id, topic.category_id))
 
         return generated_id  # return TopicResponse()
     except IntegrityError as e:
         return e
 
 
-def update_title(topic_id, title):
-    update_query(
+async def update_title(topic_id, title):
+    await update_query(
         '''UPDATE topics SET
            title = ?
            WHERE topic_id = ? 
         ''',
         (title, topic_id))
+    after_commit(lambda: search_index.update_text(TOPIC, topic_id, title))
 
     return f"Project title updated to {title}"
 
 
-def update_best_reply(topic_id, best_reply_id):
-    update_query(
+async def update_best_reply(topic_id, best_reply_id):
+    previous = await read_query('SELECT best_reply_id FROM topics WHERE topic_id = ? FOR UPDATE', (topic_id,))
+    await update_query(
         '''UPDATE topics SET
            best_reply_id = ?
            WHERE topic_id = ? 
         ''',
         (best_reply_id, topic_id))
+    if previous:
+        await best_reply_changed(previous[0][0], best_reply_id)
 
     return f"Best Reply Id updated to {best_reply_id}"
 
@@ -131,8 +326,8 @@ def custom_sort(topics: list[TopicResponse], attribute, reverse=False):
         reverse=reverse)
 
 
-def get_topic_replies(topic_id: int) -> list[int]:
-    data = read_query(
+async def get_topic_replies(topic_id: int) -> list[int]:
+    data = await read_query(
         '''SELECT reply_id
         FROM replies WHERE topic_id = ?''', (topic_id,))
 
@@ -140,8 +335,25 @@ def get_topic_replies(topic_id: int) -> list[int]:
     return replies_ids
 
 
-def get_categories_names():
-    data = read_query(
+async def resolve_filters(username: str = None, category: str = None) -> tuple[int | None, int | None]:
+    """
+    Resolves the username and category name filters of a listing to ids, in one query
+    - Returns (user_id, category_id); an id is None, if its filter wasn't given or matches nothing;
+      deleted users match nothing
+    """
+    if not username and not category:
+        return None, None
+
+    data = await read_query(
+        '''SELECT (SELECT user_id FROM users WHERE username = ? AND NOT is_deleted = ?),
+                  (SELECT category_id FROM categories WHERE name = ?)''',
+        (username, 1, category))
+
+    return data[0] if data else (None, None)
+
+
+async def get_categories_names():
+    data = await read_query(
         '''SELECT name FROM categories''')
 
     categories_names = [tupl[0] for tupl in data]
@@ -149,16 +361,16 @@ def get_categories_names():
     return categories_names
 
 
-def get_usernames():
-    data = read_query(
+async def get_usernames():
+    data = await read_query(
         '''SELECT username FROM users''')
 
     usernames = [tupl[0] for tupl in data]
     return usernames
 
 
-def validate_topic_access(topic_id: int, user: User)-> tuple[bool, str]:
-    existing_topic = get_by_id(topic_id)
+async def validate_topic_access(topic_id: int, user: User)-> tuple[bool, str]:
+    existing_topic = await get_by_id(topic_id)
 
     if not existing_topic:
         return False, f"Topic #ID:{topic_id} does not exist"
@@ -172,34 +384,48 @@ def validate_topic_access(topic_id: int, user: User)-> tuple[bool, str]:
     return True, "OK"
 
 
-def update_locking(locking: bool, topic_id: int):
-    update_query('UPDATE topics SET is_locked = ? WHERE topic_id = ?',
-                 (locking, topic_id))
+async def update_locking(locking: bool, topic_id: int):
+    await update_query('UPDATE topics SET is_locked = ? WHERE topic_id = ?',
+                       (locking, topic_id))
+    after_commit(_invalidate_counts_on_locking)
 
 
-def is_owner(topic_id: int, user_id: int) -> bool:
-    data = read_query('SELECT FROM topics = ? WHERE topic_id = ? AND user_id = ?',
-                      (topic_id, user_id))
+async def is_owner(topic_id: int, user_id: int) -> bool:
+    data = await read_query('SELECT FROM topics = ? WHERE topic_id = ? AND user_id = ?',
+                            (topic_id, user_id))
     if not data:
         return False
     return True
 
 
-def get_topics_paginate_links(
+async def get_topics_paginate_links(
         request: Request,
-        page: int,
+        page: int | None,
         size: int,
         sort: str = None,
         sort_by: str = None,
         search: str = None,
-        username: str = None,
-        category: str = None,
-        status: str = None
+        user_id: int = None,
+        category_id: int = None,
+        status: str = None,
+        position: dict = None
 ):
-    
-    topics, total_topics = get_all(
+    """
+    - Paginates by page number (OFFSET) when a page is given, otherwise by the keyset position of a cursor
+    """
+
+    if page is None:
+        topics, total_topics, next_cursor, prev_cursor, last_cursor = await get_all_keyset(
+            size=size, position=position or parse_cursor(None, sort, sort_by),
+            search=search, user_id=user_id, category_id=category_id, status=status
+        )
+        pagination_info = get_pagination_info(total_topics, None, size)
+        links = create_links(request, pagination_info, next_cursor, prev_cursor, last_cursor)
+        return topics, pagination_info, links
+
+    topics, total_topics = await get_all(
         page=page, size=size, sort=sort, sort_by=sort_by,
-        search=search, username=username, category=category, status=status
+        search=search, user_id=user_id, category_id=category_id, status=status
     )
     pagination_info = get_pagination_info(total_topics, page, size)
     links = create_links(request, pagination_info)
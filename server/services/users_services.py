@@ -1,25 +1,49 @@
+from collections.abc import AsyncIterator
+from common.cache import TTLCache
+from common.throttle import SlidingWindowLimiter
 from data.models.user import User, UserRegister, UserUpdate, UserInfo
-from data.database import read_query, update_query, insert_query
+from data.async_database import read_query, read_query_iter, update_query, insert_query, after_commit, \
+    outside_unit_of_work, transaction
+from services.categories_services import invalidate_permissions
+from services.reputation_services import exclude_user
+from services.search_services import search_index
 from mariadb import IntegrityError
-from common.utils import hash_pass, verify_password
+from common.passwords import hash_password, verify_and_update
 
+USER_CACHE_SIZE = 4096  # authenticated users kept in memory
+USER_CACHE_TTL = 60  # seconds; bounds how long changes made by other server processes go unseen
 
-def get_all() -> list[UserInfo]:
-    data = read_query(
+# login attempts, counted before the password is checked, so that rejected ones cost no bcrypt time;
+# a successful login clears the attempts on its username
+LOGIN_ATTEMPTS_PER_USERNAME = 5
+LOGIN_ATTEMPTS_PER_IP = 30
+LOGIN_ATTEMPTS_WINDOW = 300  # seconds
+
+_login_attempts_by_username = SlidingWindowLimiter(LOGIN_ATTEMPTS_PER_USERNAME, LOGIN_ATTEMPTS_WINDOW)
+_login_attempts_by_ip = SlidingWindowLimiter(LOGIN_ATTEMPTS_PER_IP, LOGIN_ATTEMPTS_WINDOW)
+
+# the users that get_current_user resolved, by user_id; usernames never change, so the
+# username -> user_id map needs no invalidation and a user is invalidated by id alone
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_user_ids = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+async def get_all() -> AsyncIterator[UserInfo]:
+    rows = read_query_iter(
         '''SELECT username, email, first_name, last_name
         FROM users WHERE NOT is_deleted = ?''', (1,))
 
-    users = [UserInfo.from_query(*row) for row in data]
-    return users
+    async for row in rows:
+        yield UserInfo.from_query(*row)
 
 
-def exists_by_username(username) -> bool:
-    return any(read_query(
+async def exists_by_username(username) -> bool:
+    return any(await read_query(
         '''SELECT 1 FROM users WHERE username = ? AND NOT is_deleted = ?''', (username, 1)))
 
 
-def get_by_id(user_id) -> UserInfo:
-    data = read_query(
+async def get_by_id(user_id) -> UserInfo:
+    data = await read_query(
         '''SELECT username, email, first_name, last_name
         FROM users WHERE user_id = ? AND NOT is_deleted = ?''', (user_id, 1))
 
@@ -27,8 +51,20 @@ def get_by_id(user_id) -> UserInfo:
         return UserInfo.from_query(*data[0])
 
 
-def find_by_username(username: str) -> User | None:
-    data = read_query(
+async def get_existing_ids(user_ids: list[int]) -> set[int]:
+    if not user_ids:
+        return set()
+
+    placeholders = ', '.join('?' * len(user_ids))
+    data = await read_query(
+        f'''SELECT user_id FROM users WHERE user_id IN ({placeholders}) AND NOT is_deleted = ?''',
+        (*user_ids, 1))
+
+    return {row[0] for row in data}
+
+
+async def find_by_username(username: str) -> User | None:
+    data = await read_query(
         '''SELECT user_id, username, password, email, first_name, last_name, is_admin FROM users 
         WHERE username = ? AND NOT is_deleted = ?''',
         (username, 1))
@@ -36,18 +72,45 @@ def find_by_username(username: str) -> User | None:
     return next((User.from_query(*row) for row in data), None)
 
 
-def register(user: UserRegister) -> User | IntegrityError:
+async def find_by_username_cached(username: str) -> User | None:
+    """
+    find_by_username, answered from memory for users resolved in the last USER_CACHE_TTL seconds
+    - update, change_password and delete invalidate the user once committed
+    - Returns a copy, so callers can't change the cached user
+    """
+    user = _users.get(_user_ids.get(username))
+    if user is None:
+        generation = _users.generation
+        user = await find_by_username(username)
+        if user is None:
+            return None
+
+        _user_ids.put(username, user.user_id)
+        _users.put(user.user_id, user, generation)
+
+    return user.model_copy()
+
+
+def invalidate_user(user_id: int) -> None:
+    _users.invalidate(user_id)
+
+
+def user_cache_stats() -> dict:
+    return _users.stats()
+
+
+async def register(user: UserRegister) -> User | IntegrityError:
     """
     Creates user without is_admin
     Handles columns violations with try/except
     todo check what happens if mariadb returns another error type
     """
 
-    # hashing the password and adding it to the db - line 52
-    hashed_password = hash_pass(user.password)
+    # hashing the password in the password process pool and adding it to the db
+    hashed_password = await hash_password(user.password)
 
     try:
-        generated_id = insert_query(
+        generated_id = await insert_query(
             'INSERT INTO users(username, password, email, first_name, last_name) VALUES(?,?,?,?,?)',
             (user.username, hashed_password, user.email,
              user.first_name, user.last_name)
@@ -57,14 +120,52 @@ def register(user: UserRegister) -> User | IntegrityError:
         return e
 
 
-def try_login(username: str, password: str) -> User | None:
-    user = find_by_username(username)
+async def try_login(username: str, password: str) -> User | None:
+    """
+    - Rehashes the password, if it was stored with another bcrypt cost than the configured one
+    - No connection is held while bcrypt runs: the user is read outside the request's unit of work,
+      and the rehash is written in a unit of work of its own
+    """
+    with outside_unit_of_work():
+        user = await find_by_username(username)
+    if not user:
+        return None
+
+    matches, new_hashed_password = await verify_and_update(password, user.password)
+    if not matches:
+        return None
+
+    if new_hashed_password:
+        async with transaction():
+            await change_password(user.user_id, new_hashed_password)
+        user.password = new_hashed_password
+    return user
+
+
+def throttle_login(username: str, ip: str | None) -> float:
+    """
+    Counts a login attempt for the username and the client ip
+    - Returns 0 when the attempt may go on, otherwise the seconds until the next one is allowed
+    """
+    retry_after = _login_attempts_by_ip.hit(ip) if ip else 0
+    if retry_after:
+        return retry_after
+
+    return _login_attempts_by_username.hit(username.lower())
+
+
+def login_succeeded(username: str) -> None:
+    _login_attempts_by_username.reset(username.lower())
+
 
-    if user and verify_password(password, user.password):
-        return user
+def login_throttle_stats() -> dict:
+    return {
+        'username': _login_attempts_by_username.stats(),
+        'ip': _login_attempts_by_ip.stats()
+    }
 
 
-def update(old: User, new: UserUpdate) -> UserUpdate:
+async def update(old: User, new: UserUpdate) -> UserUpdate:
     """
     Merges new user with old
     Handles columns violations with try/except
@@ -75,20 +176,27 @@ def update(old: User, new: UserUpdate) -> UserUpdate:
         last_name=new.last_name or old.last_name
     )
 
-    update_query(
+    await update_query(
         'UPDATE users SET first_name = ?, last_name = ? WHERE user_id = ?',
         (merged.first_name, merged.last_name, old.user_id)
     )
+    after_commit(lambda: invalidate_user(old.user_id))
 
     return merged
 
 
-def change_password(user_id: int, new_hashed_password: str) -> None:
-    update_query('UPDATE users SET password = ? WHERE user_id = ?',
-                 (new_hashed_password, user_id))
+async def change_password(user_id: int, new_hashed_password: str) -> None:
+    await update_query('UPDATE users SET password = ? WHERE user_id = ?',
+                       (new_hashed_password, user_id))
+    after_commit(lambda: invalidate_user(user_id))
 
 
-def delete(user_id: int) -> None:
-    update_query(
+async def delete(user_id: int) -> None:
+    await update_query(
         'UPDATE users SET is_deleted = ? WHERE user_id = ?;', (True, user_id)
     )
+    # the after_user_deleted trigger deletes the user's messages and category permissions
+    after_commit(lambda: search_index.remove_messages_of(user_id))
+    after_commit(lambda: invalidate_permissions(user_id))
+    after_commit(lambda: invalidate_user(user_id))
+    after_commit(lambda: exclude_user(user_id))
@@ -1,35 +1,250 @@
-from data.models.vote import VoteStatus
-from data.database import insert_query, read_query, update_query
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from data.models.reply import ReplyResponse
+from data.models.vote import VoteStatus, ReplyVotes
+from data.async_database import read_query, update_query, upsert_query, insert_many, update_many, after_commit
+from data.vote_buffer import VoteBuffer
+from services.reputation_services import vote_changed
+from starlette.concurrency import run_in_threadpool
 
+# write-behind mode: votes are kept in memory, where reads see them at once, and written in batches
+VOTE_WRITE_BEHIND = False
+VOTE_FLUSH_INTERVAL = 0.5  # seconds between flushes of the buffered votes
+VOTE_FLUSH_SIZE = 500  # buffered votes that start a flush before the interval is up
+# what happens to buffered votes on a crash: 'memory' - lost; 'journal' - every vote is appended to
+# VOTE_JOURNAL before it is acknowledged and written on the next start; 'fsync' - the same, and the journal
+# is fsynced on a thread before each flush, so an OS crash loses at most VOTE_FLUSH_INTERVAL of votes
+VOTE_DURABILITY = 'journal'
+VOTE_JOURNAL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vote_journal.log')
 
-def get_all(reply_id: int, type: str):
-    data = read_query('''SELECT count(type) FROM votes
-                      WHERE reply_id=?
-                      AND type=?''',
-                      (reply_id, VoteStatus.str_to_int[type]))
+# replies.upvotes / replies.downvotes are kept by the after_vote_* triggers
+_TALLY_COLUMNS = {'up': 'upvotes', 'down': 'downvotes'}
+# affected rows of INSERT ... ON DUPLICATE KEY UPDATE
+_UPSERT_OUTCOMES = {1: 'created', 2: 'switched', 0: 'unchanged'}
+_UPSERT_VOTE = '''INSERT INTO votes(user_id, reply_id, type) VALUES(?,?,?)
+                  ON DUPLICATE KEY UPDATE type = VALUES(type)'''
+
+_log = logging.getLogger(__name__)
+
+_buffer: VoteBuffer | None = None  # set while the write-behind mode runs
+_flush_wanted: asyncio.Event | None = None
+
+
+async def get_all(reply_id: int, type: str):
+    """
+    - Reads the tally kept on the reply, instead of counting its votes, plus the buffered votes
+    """
+    data = await read_query(f'SELECT {_TALLY_COLUMNS[type]} FROM replies WHERE reply_id = ?', (reply_id,))
     if data:
-        return data[0][0]
+        if _buffer is None:
+            return data[0][0]
+        return data[0][0] + _buffer.tally_delta(reply_id)[0 if type == 'up' else 1]
+
+
+def apply_buffered_tallies(replies: list[ReplyResponse]) -> list[ReplyResponse]:
+    """
+    Adds the votes not yet written to the tallies read from the replies table
+    """
+    if _buffer is not None:
+        for reply in replies:
+            up, down = _buffer.tally_delta(reply.reply_id)
+            reply.upvotes += up
+            reply.downvotes += down
+
+    return replies
+
+
+async def get_user_votes(user_id: int, topic_id: int, reply_ids: list[int]) -> list[ReplyVotes]:
+    """
+    Returns the user's vote and the tallies of the given replies of the topic, in one query
+    - The replies are read by their primary key and the votes by theirs; ids of other topics' replies are skipped
+    """
+    if not reply_ids:
+        return []
+
+    data = await read_query(
+        f'''SELECT r.reply_id, v.type, r.upvotes, r.downvotes
+            FROM replies r
+            LEFT JOIN votes v ON v.user_id = ? AND v.reply_id = r.reply_id
+            WHERE r.topic_id = ? AND r.reply_id IN ({", ".join("?" * len(reply_ids))})
+            ORDER BY r.reply_id''',
+        (user_id, topic_id, *reply_ids))
+    if _buffer is None:
+        return [ReplyVotes.from_query(*row) for row in data]
+
+    votes = []
+    for reply_id, vote, upvotes, downvotes in data:
+        if _buffer.knows(reply_id, user_id):
+            vote = _buffer.get(reply_id, user_id)
+        up, down = _buffer.tally_delta(reply_id)
+        votes.append(ReplyVotes.from_query(reply_id, vote, upvotes + up, downvotes + down))
+
+    return votes
+
+
+async def reconcile_tallies() -> None:
+    """
+    Recounts the votes of every reply and fixes the tallies that drifted from them
+    - The tallies are kept by triggers on votes; this repairs them after manual edits of the table
+    """
+    await update_query(
+        '''UPDATE replies r
+           LEFT JOIN (SELECT reply_id, SUM(type = 1) AS up, SUM(type = 0) AS down
+                      FROM votes GROUP BY reply_id) v ON v.reply_id = r.reply_id
+           SET r.upvotes = COALESCE(v.up, 0), r.downvotes = COALESCE(v.down, 0), r.score_stale = 1
+           WHERE r.upvotes <> COALESCE(v.up, 0) OR r.downvotes <> COALESCE(v.down, 0)''')
+
+
+async def get_vote_with_type(reply_id: int, user_id: int):
+    if _buffer is not None and _buffer.knows(reply_id, user_id):
+        vote = _buffer.get(reply_id, user_id)
+    else:
+        vote = await _read_vote(reply_id, user_id)
+
+    if vote is not None:
+        return VoteStatus.int_to_str[vote]
+
+
+async def _read_vote(reply_id: int, user_id: int) -> int | None:
+    vote_type = await read_query('SELECT type FROM votes WHERE reply_id=? AND user_id=?',
+                                 (reply_id, user_id))
+
+    return vote_type[0][0] if vote_type else None
+
+
+async def cast_vote(user_id: int, reply_id: int, type: str) -> str:
+    """
+    Creates the user's vote on the reply or switches its type, in one statement
+    - In write-behind mode the vote is buffered instead
+    - Returns 'created', 'switched' or 'unchanged', if the vote already had this type
+    """
+    vote = VoteStatus.str_to_int[type]
+    if _buffer is not None:
+        previous = await _buffer_vote(reply_id, user_id, vote)
+        outcome = 'created' if previous is None else 'unchanged' if previous == vote else 'switched'
+    else:
+        outcome = _UPSERT_OUTCOMES[await upsert_query(_UPSERT_VOTE, (user_id, reply_id, vote))]
+        # a switched vote had the other type, 1 - vote
+        previous = {'created': None, 'switched': 1 - vote, 'unchanged': vote}[outcome]
+
+    await vote_changed(reply_id, previous, vote)
+    return outcome
+
+
+async def delete_vote(reply_id: int, user_id: int):
+    if _buffer is not None:
+        previous = await _buffer_vote(reply_id, user_id, None)
+    else:
+        deleted = await read_query('''DELETE FROM votes
+                  WHERE reply_id = ? AND user_id = ?
+                  RETURNING type''', (reply_id, user_id))
+        previous = deleted[0][0] if deleted else None
+
+    await vote_changed(reply_id, previous, None)
+
+
+async def _buffer_vote(reply_id: int, user_id: int, vote: int | None) -> int | None:
+    """
+    Buffers the vote once the request's unit of work commits, so a request that fails leaves no vote behind
+    - Returns the vote it replaces
+    """
+    if _buffer.knows(reply_id, user_id):
+        previous, persisted = _buffer.get(reply_id, user_id), None
+    else:
+        previous = persisted = await _read_vote(reply_id, user_id)
+
+    # after_commit callbacks run on the db threads and the buffer belongs to the event loop
+    loop = asyncio.get_running_loop()
+    after_commit(lambda: loop.call_soon_threadsafe(_set_vote, reply_id, user_id, vote, persisted))
+    return previous
+
+
+def _set_vote(reply_id: int, user_id: int, vote: int | None, persisted: int | None) -> None:
+    if _buffer is None:
+        return
+
+    _buffer.set(reply_id, user_id, vote, persisted)
+    if len(_buffer) >= VOTE_FLUSH_SIZE:
+        _flush_wanted.set()
+
+
+async def start_vote_buffer() -> asyncio.Task | None:
+    """
+    Starts the write-behind mode, if VOTE_WRITE_BEHIND is on, and returns its flushing task
+    - First writes the votes a crashed run left in the journal
+    """
+    global _buffer, _flush_wanted
+    if not VOTE_WRITE_BEHIND:
+        return None
+
+    if VOTE_DURABILITY != 'memory':
+        await _write_votes(VoteBuffer.replay(VOTE_JOURNAL))
+        VoteBuffer.discard_journal(VOTE_JOURNAL)
+
+    _buffer = VoteBuffer(journal=None if VOTE_DURABILITY == 'memory' else VOTE_JOURNAL,
+                         fsync=VOTE_DURABILITY == 'fsync')
+    _flush_wanted = asyncio.Event()
+    return asyncio.create_task(_flush_periodically())
+
+
+async def stop_vote_buffer(task: asyncio.Task | None) -> None:
+    """
+    Drains the buffered votes to the database and leaves the write-behind mode
+    """
+    global _buffer
+    if task is None:
+        return
+
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    await flush_votes()
+    _buffer.close()
+    if VOTE_DURABILITY != 'memory':
+        VoteBuffer.discard_journal(VOTE_JOURNAL)
+    _buffer = None
+
 
+async def flush_votes() -> int:
+    """
+    Writes the buffered votes with one batched upsert and one batched delete
+    - Returns the number of votes written; if writing fails, they stay buffered for the next flush
+    """
+    await _sync_journal()
+    votes = _buffer.take()
+    try:
+        await _write_votes(votes)
+    except BaseException:
+        _buffer.done(written=False)
+        raise
 
-def get_vote_with_type(reply_id: int, user_id: int):
-    vote_type = read_query('SELECT type FROM votes WHERE reply_id=? AND user_id=?',
-                           (reply_id, user_id))
+    _buffer.done(written=True)
+    return len(votes)
 
-    if vote_type:
-        return VoteStatus.int_to_str[vote_type[0][0]]
 
+async def _sync_journal() -> None:
+    fds = _buffer.take_unsynced()
+    if fds:
+        await run_in_threadpool(VoteBuffer.fsync_all, fds)
 
-def add_vote(user_id, reply_id: int, type: str):
-    insert_query('INSERT INTO votes(user_id, reply_id, type) VALUES(?,?,?)',
-                 (user_id, reply_id, VoteStatus.str_to_int[type]))
 
+async def _flush_periodically() -> None:
+    while True:
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_flush_wanted.wait(), VOTE_FLUSH_INTERVAL)
+        _flush_wanted.clear()
 
-def switch_vote(user_id, reply_id: int, type: str):
-    new_type = 'up' if type == 'down' else 'down'
-    update_query('UPDATE votes SET type = ? WHERE user_id = ? AND reply_id = ?',
-                 (VoteStatus.str_to_int[new_type], user_id, reply_id))
+        # the votes of a failed flush stay buffered and the next one retries them
+        try:
+            await flush_votes()
+        except Exception:
+            _log.exception('Flushing buffered votes failed')
 
 
-def delete_vote(reply_id: int, user_id: int):
-    update_query('''DELETE FROM votes
-                  WHERE reply_id = ? AND user_id = ?''', (reply_id, user_id))
+async def _write_votes(votes: list[tuple[int, int, int | None]]) -> None:
+    await insert_many(_UPSERT_VOTE, [(user_id, reply_id, vote) for reply_id, user_id, vote in votes
+                                     if vote is not None])
+    await update_many('DELETE FROM votes WHERE reply_id = ? AND user_id = ?',
+                      [(reply_id, user_id) for reply_id, user_id, vote in votes if vote is None])
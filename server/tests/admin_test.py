@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, MagicMock, Mock
 from data.models.topic import TopicResponse
 from common.utils import PaginationInfo, Links
@@ -8,124 +8,170 @@ global_admin_mock = Mock(is_admin=True)
 dummy_string = 'dummy'
 
 
-class AdminRouter_Should(TestCase):
+class AdminRouter_Should(IsolatedAsyncioTestCase):
     @patch('routers.admin.categories_services.create')
-    def test_create_category_raises_BadRequest(self, mock_create):
+    async def test_create_category_raises_BadRequest(self, mock_create):
         mock_create.return_value = Mock(
             spec=r.categories_services.IntegrityError, msg=dummy_string)
 
         with self.assertRaises(r.HTTPBadRequest):
-            r.create_category(Mock(), global_admin_mock)
+            await r.create_category(Mock(), global_admin_mock)
 
     @patch('routers.admin.categories_services.get_by_id')
-    def test_switch_category_privacy_raises_NotFound(self, mock_get_by_id):
+    async def test_switch_category_privacy_raises_NotFound(self, mock_get_by_id):
         mock_get_by_id.return_value = None
 
         with self.assertRaises(r.HTTPNotFound):
-            r.switch_category_privacy(Mock(), global_admin_mock)
+            await r.switch_category_privacy(Mock(), global_admin_mock)
 
     @patch('routers.admin.categories_services.update_privacy')
     @patch('routers.admin.categories_services.get_by_id')
-    def test_switch_category_privacy_raises_HappyCase_update_called(
+    async def test_switch_category_privacy_raises_HappyCase_update_called(
             self, mock_get_by_id, mock_update_privacy):
         mock_get_by_id.return_value = Mock(spec=r.Category, is_private=True)
         mock_get_by_id.return_value.name = dummy_string
-        r.switch_category_privacy(Mock(), global_admin_mock)
+        await r.switch_category_privacy(Mock(), global_admin_mock)
 
         mock_update_privacy.assert_called_once()
 
     @patch('routers.admin.users_services.get_by_id')
-    def test_give_user_category_read_access_raises_NotFound_when_no_user(self, mock_get_by_id):
+    async def test_give_user_category_read_access_raises_NotFound_when_no_user(self, mock_get_by_id):
         mock_get_by_id.return_value = None
 
         with self.assertRaises(r.HTTPNotFound):
-            r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
+            await r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
 
     @patch('routers.admin.categories_services.get_by_id')
     @patch('routers.admin.users_services.get_by_id')
-    def test_give_user_category_read_access_raises_NotFound_when_no_category(
+    async def test_give_user_category_read_access_raises_NotFound_when_no_category(
             self, mock_get_by_id, mock_get_by_id_user):
         mock_get_by_id_user.return_value = None
         mock_get_by_id.return_value = None
 
         with self.assertRaises(r.HTTPNotFound):
-            r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
+            await r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
 
     @patch('routers.admin.categories_services.is_user_in')
     @patch('routers.admin.categories_services.get_by_id')
     @patch('routers.admin.users_services.get_by_id')
-    def test_give_user_category_read_access_raises_BadRequest_when_user_already_in(
+    async def test_give_user_category_read_access_raises_BadRequest_when_user_already_in(
             self, mock_get_by_id, mock_get_by_id_user, mock_is_user_in):
         mock_get_by_id_user.return_value = True
         mock_get_by_id.return_value = True
         mock_is_user_in.return_value = True
 
         with self.assertRaises(r.HTTPBadRequest):
-            r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
+            await r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
 
     @patch('routers.admin.categories_services.add_user')
     @patch('routers.admin.categories_services.is_user_in')
     @patch('routers.admin.categories_services.get_by_id')
     @patch('routers.admin.users_services.get_by_id')
-    def test_give_user_category_read_access_HappyCase(
+    async def test_give_user_category_read_access_HappyCase(
             self, mock_get_by_id, mock_get_by_id_user, mock_is_user_in, mock_add_user):
         mock_get_by_id_user.return_value = True
         mock_get_by_id.return_value = True
         mock_is_user_in.return_value = False
         mock_add_user.return_value = None
 
-        r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
+        await r.give_user_category_read_access(Mock(), Mock(), global_admin_mock)
         self.assertTrue(True)  # no Exceptions met so we return true
 
+    async def test_give_users_category_read_access_raises_BadRequest_when_no_users(self):
+        with self.assertRaises(r.HTTPBadRequest):
+            await r.give_users_category_read_access(Mock(), global_admin_mock, user_ids=[])
+
+    @patch('routers.admin.users_services.get_existing_ids')
+    @patch('routers.admin.categories_services.get_by_id')
+    async def test_give_users_category_read_access_raises_NotFound_when_user_missing(
+            self, mock_get_by_id, mock_get_existing_ids):
+        mock_get_by_id.return_value = True
+        mock_get_existing_ids.return_value = {1}
+
+        with self.assertRaises(r.HTTPNotFound):
+            await r.give_users_category_read_access(Mock(), global_admin_mock, user_ids=[1, 2])
+
+    @patch('routers.admin.categories_services.add_users')
+    @patch('routers.admin.users_services.get_existing_ids')
+    @patch('routers.admin.categories_services.get_by_id')
+    async def test_give_users_category_read_access_HappyCase(
+            self, mock_get_by_id, mock_get_existing_ids, mock_add_users):
+        mock_get_by_id.return_value = True
+        mock_get_existing_ids.return_value = {1, 2}
+        mock_add_users.return_value = [2]
+
+        result = await r.give_users_category_read_access(Mock(), global_admin_mock, user_ids=[1, 2])
+
+        self.assertEqual('1 users successfully added to that category and they can read', result)
+        mock_add_users.assert_called_once()
+
     @patch('routers.admin.categories_services.update_user_access_level')
     @patch('routers.admin.categories_services.get_by_id')
     @patch('routers.admin.users_services.get_by_id')
-    def test_switch_user_category_write_access_HappyCase(
+    async def test_switch_user_category_write_access_HappyCase(
             self, mock_get_by_id, mock_get_by_id_user, mock_update_user_access_level):
         mock_get_by_id_user.return_value = True
         mock_get_by_id.return_value = True
         mock_update_user_access_level.return_value = True
 
         try:
-            r.switch_user_category_write_access(Mock(), Mock(), global_admin_mock)
+            await r.switch_user_category_write_access(Mock(), Mock(), global_admin_mock)
             self.assertTrue(True)  # if no exception is raised - valid
         except Exception as e:
             self.fail(f"Unexpected error raised: {e}")
 
     @patch('routers.admin.categories_services.get_by_id')
-    def test_view_privileged_users_NotFound(
+    async def test_view_privileged_users_NotFound(
             self, mock_get_by_id, ):
         mock_get_by_id.return_value = None
 
         with self.assertRaises(r.HTTPNotFound):
-            r.view_privileged_users(Mock(), global_admin_mock)
+            await r.view_privileged_users(Mock(), global_admin_mock)
 
     @patch('routers.admin.categories_services.get_by_id')
-    def test_view_privileged_users_Category_was_public(
+    async def test_view_privileged_users_Category_was_public(
             self, mock_get_by_id, ):
         mock_get_by_id.return_value = Mock(spec=r.Category, is_private=False)
 
-        result = r.view_privileged_users(Mock(), global_admin_mock)
+        result = await r.view_privileged_users(Mock(), global_admin_mock)
         self.assertIsNotNone(result)  # no Exceptions met so we return true
 
     @patch('routers.admin.categories_services.get_privileged_users')
     @patch('routers.admin.categories_services.get_by_id')
-    def test_view_privileged_users_No_users_in_category(
+    async def test_view_privileged_users_No_users_in_category(
             self, mock_get_by_id, mock_get_privileged_users):
         mock_get_by_id.return_value = Mock(spec=r.Category, is_private=True)
         mock_get_privileged_users.return_value = []
 
-        result = r.view_privileged_users(Mock(), global_admin_mock)
+        result = await r.view_privileged_users(Mock(), global_admin_mock)
         self.assertIsNotNone(result)  # no Exceptions met so we return true
 
     @patch('routers.admin.categories_services.response_obj_privileged_users')
     @patch('routers.admin.categories_services.get_privileged_users')
     @patch('routers.admin.categories_services.get_by_id')
-    def test_view_privileged_users_HappyCase_final_return(
+    async def test_view_privileged_users_HappyCase_final_return(
             self, mock_get_by_id, mock_get_privileged_users, mock_response_obj_privileged_users):
         mock_get_by_id.return_value = Mock(spec=r.Category, is_private=True)
         mock_get_privileged_users.return_value = [Mock()]
         mock_response_obj_privileged_users.return_value = True
 
-        result = r.view_privileged_users(Mock(), global_admin_mock)
+        result = await r.view_privileged_users(Mock(), global_admin_mock)
         self.assertIsNotNone(result)  # no Exceptions met so we return true
+
+    @patch('routers.admin.topics_services.total_count_cache_stats', Mock(return_value={'hits': 0}))
+    @patch('routers.admin.categories_services.permissions_cache_stats', Mock(return_value={'hits': 0}))
+    @patch('routers.admin.users_services.user_cache_stats', Mock(return_value={'hits': 0}))
+    @patch('routers.admin.verified_token_cache_stats', Mock(return_value={'hits': 0}))
+    @patch('routers.admin.users_services.login_throttle_stats', Mock(return_value={'hits': 0}))
+    @patch('routers.admin.pool_stats')
+    async def test_get_stats_returns_counters(self, mock_pool_stats):
+        mock_pool_stats.return_value = {'in_use': 1}
+
+        result = await r.get_stats(global_admin_mock)
+
+        self.assertEqual({'in_use': 1}, result['pool'])
+        self.assertEqual({'hits': 0}, result['login_throttle'])
+        self.assertEqual({'hits': 0}, result['verified_tokens'])
+        self.assertEqual({'hits': 0}, result['users'])
+        self.assertEqual({'hits': 0}, result['permissions'])
+        self.assertEqual({'hits': 0}, result['total_counts'])
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+from data import async_database, database
+from data.pool import ConnectionPool, PoolTimeout
+
+POOL_SIZE = 2
+
+
+class AsyncDatabase_Should(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(MagicMock, min_size=0, max_size=POOL_SIZE, checkout_timeout=0.5)
+        for target, value in (('data.database._pool', self.pool),
+                              ('data.async_database.CONNECTION_PERMITS', POOL_SIZE),
+                              ('data.async_database._permits', None)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def request(self):
+        uow = database.begin_unit_of_work()
+        try:
+            await async_database.read_query('SELECT 1')
+            await asyncio.sleep(0.01)
+            await async_database.read_query('SELECT 2')
+        finally:
+            await async_database.finish_unit_of_work(uow, commit=True)
+            database.end_unit_of_work(uow)
+
+    async def test_unitsOfWork_holdingAllConnections_stillGetThreads(self):
+        results = await asyncio.gather(*(self.request() for _ in range(30)), return_exceptions=True)
+
+        self.assertEqual([None] * 30, results)
+        self.assertEqual(0, self.pool.stats()['in_use'])
+
+    async def test_runBlocking_raisesPoolTimeout_whenNoPermitInTime(self):
+        permits = async_database._get_permits()
+        for _ in range(POOL_SIZE):
+            await permits.acquire()
+
+        with patch('data.database.POOL_CHECKOUT_TIMEOUT', 0.01), self.assertRaises(PoolTimeout):
+            await async_database.read_query('SELECT 1')
+
+    async def test_finishUnitOfWork_returnsPermit_evenIfCommitFails(self):
+        uow = database.begin_unit_of_work()
+        try:
+            await async_database.read_query('SELECT 1')
+            with patch.object(uow, 'commit', side_effect=RuntimeError('commit failed')), \
+                    self.assertRaises(RuntimeError):
+                await async_database.finish_unit_of_work(uow, commit=True)
+        finally:
+            database.end_unit_of_work(uow)
+
+        self.assertFalse(uow.has_permit)
+        self.assertEqual(POOL_SIZE, async_database._get_permits()._value)
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch
+from common.cache import TTLCache
+
+
+class TTLCache_Should(unittest.TestCase):
+    def test_get_returnsStoredValue_andCountsHitsAndMisses(self):
+        cache = TTLCache()
+        cache.put('key', 'value')
+
+        self.assertEqual('value', cache.get('key'))
+        self.assertIsNone(cache.get('other'))
+        self.assertEqual(1, cache.stats()['hits'])
+        self.assertEqual(1, cache.stats()['misses'])
+
+    def test_get_returnsDefault_whenEntryExpired(self):
+        cache = TTLCache(ttl=10)
+        with patch('common.cache.monotonic', return_value=0):
+            cache.put('key', 'value')
+
+        with patch('common.cache.monotonic', return_value=11):
+            self.assertIsNone(cache.get('key'))
+        self.assertEqual(0, len(cache))
+
+    def test_put_evictsLeastRecentlyUsed_whenFull(self):
+        cache = TTLCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+
+        cache.put('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_put_dropsValue_computedBeforeAnInvalidation(self):
+        cache = TTLCache()
+        generation = cache.generation
+
+        cache.invalidate('key')
+        cache.put('key', 'stale', generation)
+
+        self.assertIsNone(cache.get('key'))
+
+    def test_invalidateWhere_dropsMatchingKeys(self):
+        cache = TTLCache()
+        cache.put(('a', 1), 1)
+        cache.put(('b', 2), 2)
+
+        cache.invalidate_where(lambda key: key[0] == 'a')
+
+        self.assertIsNone(cache.get(('a', 1)))
+        self.assertEqual(2, cache.get(('b', 2)))
@@ -1,6 +1,7 @@
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, Mock
 from data.models.category import Category
+from data.database import current_unit_of_work, transaction
 from services import categories_services as s
 from services.categories_services import IntegrityError
 
@@ -21,89 +22,155 @@ COUNT_1, COUNT_0 = 1, 0
 read_query_path = 'services.categories_services.read_query'
 update_query_path = 'services.categories_services.update_query'
 insert_query_path = 'services.categories_services.insert_query'
+insert_many_path = 'services.categories_services.insert_many'
 
 
-class CategoriesServices_Should(TestCase):
+class CategoriesServices_Should(IsolatedAsyncioTestCase):
+    def setUp(self):
+        s.invalidate_catalog()
+        s._permissions.clear()
+
     # exists_by_name
     @patch(read_query_path)
-    def test_exists_by_name_returns_True_when_exists(self, mock_read_query):
-        mock_read_query.return_value = [(1,)]
-        result = s.exists_by_name(CAT1_NAME)
+    async def test_exists_by_name_returns_True_when_exists(self, mock_read_query):
+        mock_read_query.return_value = [CAT1_VALUES_TUPLE]
+        result = await s.exists_by_name(CAT1_NAME)
         self.assertTrue(result)
 
     @patch(read_query_path)
-    def test_exists_by_name_returns_False_when_exists(self, mock_read_query):
+    async def test_exists_by_name_ignores_case(self, mock_read_query):
+        mock_read_query.return_value = [CAT1_VALUES_TUPLE]
+        self.assertTrue(await s.exists_by_name(CAT1_NAME.upper()))
+
+    @patch(read_query_path)
+    async def test_exists_by_name_returns_False_when_exists(self, mock_read_query):
         mock_read_query.return_value = []
-        result = s.exists_by_name(CAT1_NAME)
+        result = await s.exists_by_name(CAT1_NAME)
         self.assertFalse(result)
 
     # get_all
     @patch(read_query_path)
-    def test_get_all_returns_list_of_categories(self, mock_read_query):
+    async def test_get_all_returns_list_of_categories(self, mock_read_query):
         mock_read_query.return_value = [CAT1_VALUES_TUPLE, CAT2_VALUES_TUPLE2]
         expected = [Category.from_query(*row) for row in mock_read_query.return_value]
 
-        result = s.get_all()
+        result = await s.get_all()
         self.assertEqual(expected, result)
 
     @patch(read_query_path)
-    def test_get_all_returns_empty_list_when_no_categories(self, mock_read_query):
+    async def test_get_all_filters_by_part_of_name(self, mock_read_query):
+        mock_read_query.return_value = [CAT1_VALUES_TUPLE, CAT2_VALUES_TUPLE2]
+
+        result = await s.get_all(search='ST2')
+        self.assertEqual([Category.from_query(*CAT2_VALUES_TUPLE2)], result)
+
+    @patch(read_query_path)
+    async def test_get_all_returns_empty_list_when_no_categories(self, mock_read_query):
         mock_read_query.return_value = []
         expected = []
 
-        result = s.get_all()
+        result = await s.get_all()
         self.assertEqual(expected, result)
 
     # get_by_id
     @patch(read_query_path)
-    def test_get_by_id_returns_correct_object_with_correct_values(self, mock_read_query):
+    async def test_get_by_id_returns_correct_object_with_correct_values(self, mock_read_query):
         mock_read_query.return_value = [CAT1_VALUES_TUPLE]
         expected = Category.from_query(*CAT1_VALUES_TUPLE)
 
-        result = s.get_by_id(CAT1_ID)
+        result = await s.get_by_id(CAT1_ID)
 
         self.assertEqual(expected, result)
 
     @patch(read_query_path)
-    def test_get_by_id_returns_None_when_empty(self, mock_read_query):
+    async def test_get_by_id_returns_None_when_empty(self, mock_read_query):
         mock_read_query.return_value = []
-        result = s.get_by_id(CAT1_ID)
+        result = await s.get_by_id(CAT1_ID)
         self.assertIsNone(result)
 
+    # catalog
+    @patch(read_query_path)
+    async def test_catalog_serves_lookups_from_memory_once_loaded(self, mock_read_query):
+        mock_read_query.return_value = [CAT1_VALUES_TUPLE, CAT2_VALUES_TUPLE2]
+
+        await s.get_all()
+        await s.get_by_id(CAT1_ID)
+        await s.exists_by_name(CAT1_NAME)
+
+        mock_read_query.assert_called_once()
+
+    @patch(read_query_path)
+    async def test_catalog_returns_copies(self, mock_read_query):
+        mock_read_query.return_value = [CAT1_VALUES_TUPLE]
+
+        category = await s.get_by_id(CAT1_ID)
+        category.is_private = True
+
+        self.assertFalse((await s.get_by_id(CAT1_ID)).is_private)
+
+    @patch(update_query_path)
+    @patch(read_query_path)
+    async def test_catalog_reloads_after_update(self, mock_read_query, mock_update_query):
+        mock_read_query.return_value = [CAT1_VALUES_TUPLE]
+        await s.get_by_id(CAT1_ID)
+
+        await s.update_locking(True, CAT1_ID)
+        mock_read_query.return_value = [(CAT1_ID, CAT1_NAME, True, CAT1_PRIVATE)]
+
+        self.assertTrue((await s.get_by_id(CAT1_ID)).is_locked)
+        self.assertEqual(2, mock_read_query.call_count)
+
+    @patch(read_query_path)
+    async def test_catalog_stays_stale_when_invalidated_while_loading(self, mock_read_query):
+        async def invalidated_meanwhile(*args):
+            s.invalidate_catalog()
+            return [CAT1_VALUES_TUPLE]
+
+        mock_read_query.side_effect = invalidated_meanwhile
+        await s.load_catalog()
+
+        self.assertFalse(s._catalog.is_fresh())
+
     # create
     @patch(insert_query_path)
-    def test_create_returns_IntegrityError_when_db_level_violation(self, mock_insert_query):
+    async def test_create_returns_IntegrityError_when_db_level_violation(self, mock_insert_query):
         mock_insert_query.side_effect = IntegrityError
-        result = s.create(CAT1_OBJ)
+        result = await s.create(CAT1_OBJ)
         self.assertIsInstance(result, IntegrityError)
 
     @patch(insert_query_path)
-    def test_create_returns_correct_Category_obj(self, mock_insert_query):
+    async def test_create_returns_correct_Category_obj(self, mock_insert_query):
         mock_insert_query.return_value = CAT1_ID
         expected = CAT1_OBJ
 
         CAT1_OBJ.category_id = None
-        result = s.create(CAT1_OBJ)
+        result = await s.create(CAT1_OBJ)
         self.assertEqual(expected, result)
 
     # get_user_access_level
     @patch(read_query_path)
-    def test_get_user_access_level_returns_None(self, mock_read_query):
+    async def test_get_user_access_level_returns_None(self, mock_read_query):
         mock_read_query.return_value = []
-        result = s.get_user_access_level(USER_ID, CAT1_ID)
+        result = await s.get_user_access_level(USER_ID, CAT1_ID)
         self.assertIsNone(result)
 
     @patch(read_query_path)
-    def test_get_user_access_level_returns_True(self, mock_read_query):
-        mock_read_query.return_value = [(WRITE_ACCESS,)]
-        result = s.get_user_access_level(USER_ID, CAT1_ID)
+    async def test_get_user_access_level_returns_True(self, mock_read_query):
+        mock_read_query.return_value = [(CAT1_ID, WRITE_ACCESS)]
+        result = await s.get_user_access_level(USER_ID, CAT1_ID)
         self.assertTrue(result)
 
+    @patch(read_query_path)
+    async def test_get_user_access_level_returns_False_when_only_read_access(self, mock_read_query):
+        mock_read_query.return_value = [(CAT1_ID, 0)]
+        result = await s.get_user_access_level(USER_ID, CAT1_ID)
+        self.assertIs(False, result)
+
     # update_privacy
     @patch(update_query_path)
-    def test_update_privacy_update_query_used_once(self, mock_update_query):
+    async def test_update_privacy_update_query_used_once(self, mock_update_query):
         mock_update_query.return_value = None
-        s.update_privacy(not CAT1_PRIVATE, CAT1_ID)
+        await s.update_privacy(not CAT1_PRIVATE, CAT1_ID)
         mock_update_query.assert_called_once_with(
             'UPDATE categories SET is_private = ? WHERE category_id = ?',
             (not CAT1_PRIVATE, CAT1_ID,)
@@ -111,32 +178,125 @@ class CategoriesServices_Should(TestCase):
 
     # is_user_in
     @patch(read_query_path)
-    def test_is_user_in_returns_True(self, mock_read_query):
-        mock_read_query.return_value = [[COUNT_1, ]]
-        result = s.is_user_in(USER_ID, CAT1_ID)
+    async def test_is_user_in_returns_True(self, mock_read_query):
+        mock_read_query.return_value = [(CAT1_ID, 0)]
+        result = await s.is_user_in(USER_ID, CAT1_ID)
         self.assertTrue(result)
 
     @patch(read_query_path)
-    def test_is_user_in_returns_False(self, mock_read_query):
-        mock_read_query.return_value = [[]]
-        result = s.is_user_in(USER_ID, CAT1_ID)
+    async def test_is_user_in_returns_False(self, mock_read_query):
+        mock_read_query.return_value = [(2, 1)]
+        result = await s.is_user_in(USER_ID, CAT1_ID)
         self.assertFalse(result)
 
+    # permission snapshot
+    @patch(read_query_path)
+    async def test_permission_checks_share_one_query(self, mock_read_query):
+        mock_read_query.return_value = [(CAT1_ID, 0), (2, WRITE_ACCESS)]
+
+        self.assertTrue(await s.has_access_to_private_category(USER_ID, CAT1_ID))
+        self.assertFalse(await s.has_write_access(USER_ID, CAT1_ID))
+        self.assertTrue(await s.has_write_access(USER_ID, 2))
+        self.assertTrue(await s.is_user_in(USER_ID, 2))
+
+        mock_read_query.assert_called_once()
+
+    @patch(update_query_path)
+    @patch(read_query_path)
+    async def test_permission_snapshot_reloaded_after_revoke(self, mock_read_query, mock_update_query):
+        mock_read_query.return_value = [(CAT1_ID, 0)]
+        self.assertTrue(await s.is_user_in(USER_ID, CAT1_ID))
+
+        await s.remove_user(USER_ID, CAT1_ID)
+        mock_read_query.return_value = []
+
+        self.assertFalse(await s.is_user_in(USER_ID, CAT1_ID))
+        self.assertEqual(2, mock_read_query.call_count)
+
+    @patch(update_query_path)
+    @patch(read_query_path)
+    async def test_permission_snapshot_reloaded_after_access_switch(self, mock_read_query, mock_update_query):
+        mock_read_query.return_value = [(CAT1_ID, 0)]
+        self.assertFalse(await s.has_write_access(USER_ID, CAT1_ID))
+
+        await s.update_user_access_level(USER_ID, CAT1_ID, True)
+        mock_read_query.return_value = [(CAT1_ID, WRITE_ACCESS)]
+
+        self.assertTrue(await s.has_write_access(USER_ID, CAT1_ID))
+
     # add_user
     @patch(insert_query_path)
-    def test_update_add_user_insert_query_used_once(self, mock_insert_query):
+    async def test_update_add_user_insert_query_used_once(self, mock_insert_query):
         mock_insert_query.return_value = None
-        s.add_user(USER_ID, CAT1_ID)
+        await s.add_user(USER_ID, CAT1_ID)
         mock_insert_query.assert_called_once_with(
             'INSERT INTO users_categories_permissions(user_id,category_id) VALUES(?,?)',
             (USER_ID, CAT1_ID,)
         )
 
+    # add_users
+    @patch(insert_many_path)
+    @patch(read_query_path)
+    async def test_add_users_inserts_only_users_not_in_category(self, mock_read_query, mock_insert_many):
+        mock_read_query.return_value = [(USER_ID,)]
+
+        result = await s.add_users([USER_ID, 2, 3, 3], CAT1_ID)
+
+        self.assertEqual([2, 3], result)
+        mock_insert_many.assert_called_once_with(
+            'INSERT INTO users_categories_permissions(user_id,category_id) VALUES(?,?)',
+            [(2, CAT1_ID), (3, CAT1_ID)]
+        )
+
+    @patch(insert_many_path)
+    @patch(read_query_path)
+    async def test_add_users_returns_empty_list_without_queries_when_no_users(self, mock_read_query, mock_insert_many):
+        result = await s.add_users([], CAT1_ID)
+
+        self.assertEqual([], result)
+        mock_read_query.assert_not_called()
+        mock_insert_many.assert_not_called()
+
     # get_privileged_users
     @patch(read_query_path)
-    def test_get_privileged_users_returns_list_of_tuples(self, mock_read_query):
+    async def test_get_privileged_users_returns_list_of_tuples(self, mock_read_query):
         mock_read_query.return_value = [(USER_ID, USERNAME, WRITE_ACCESS)]
 
-        result = s.get_privileged_users(CAT1_ID)
+        result = await s.get_privileged_users(CAT1_ID)
         self.assertEqual(type(result), list)
         self.assertTrue(all(type(x) is tuple for x in result))
+
+    @patch(read_query_path)
+    async def test_get_permissions_reads_outside_request_unit_of_work(self, mock_read_query):
+        units_of_work = []
+        mock_read_query.side_effect = lambda *args: units_of_work.append(current_unit_of_work()) or [(CAT1_ID, 1)]
+
+        with transaction():
+            permissions = await s.get_permissions(USER_ID)
+
+        self.assertEqual([None], units_of_work)
+        self.assertEqual(s.Permissions(read=frozenset({CAT1_ID}), write=frozenset({CAT1_ID})), permissions)
+
+    @patch(read_query_path)
+    async def test_load_catalog_reads_outside_request_unit_of_work(self, mock_read_query):
+        units_of_work = []
+        mock_read_query.side_effect = lambda *args: units_of_work.append(current_unit_of_work()) or [CAT1_VALUES_TUPLE]
+
+        with transaction():
+            await s.load_catalog()
+
+        self.assertEqual([None], units_of_work)
+        self.assertEqual(CAT1_OBJ, await s.get_by_id(CAT1_ID))
+
+    @patch(read_query_path)
+    async def test_load_catalog_skips_storing_when_invalidated_meanwhile(self, mock_read_query):
+        def read_and_invalidate(*args):
+            s.invalidate_catalog()
+            return [CAT2_VALUES_TUPLE2]
+        mock_read_query.side_effect = read_and_invalidate
+        by_id = s._catalog.by_id
+
+        await s.load_catalog()
+
+        self.assertFalse(s._catalog.is_fresh())
+        self.assertIs(by_id, s._catalog.by_id)
@@ -0,0 +1,146 @@
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+from data import database
+from data.pool import ConnectionPool
+
+
+class UnitOfWork_Should(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+        patcher = patch('data.database._pool', ConnectionPool(self.connect, min_size=0, max_size=2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self):
+        conn = MagicMock()
+        self.connections.append(conn)
+        return conn
+
+    def test_transaction_beginsLazily_onFirstQuery(self):
+        with database.transaction():
+            self.assertEqual([], self.connections)
+
+            database.read_query('SELECT 1')
+            database.read_query('SELECT 2')
+
+        conn, = self.connections
+        conn.begin.assert_called_once()
+        conn.commit.assert_called_once()
+        conn.rollback.assert_not_called()
+
+    def test_transaction_skipsConnection_whenNoQueries(self):
+        with database.transaction():
+            pass
+
+        self.assertEqual([], self.connections)
+
+    def test_transaction_rollsBack_onError(self):
+        with self.assertRaises(ValueError), database.transaction():
+            database.update_query('UPDATE users SET username = ?', ('x',))
+            raise ValueError
+
+        conn, = self.connections
+        conn.rollback.assert_called_once()
+        conn.commit.assert_not_called()
+        self.assertIsNone(database.current_unit_of_work())
+
+    def test_nestedTransaction_joinsOuterOne(self):
+        with database.transaction() as outer:
+            database.read_query('SELECT 1')
+            with database.transaction() as inner:
+                database.read_query('SELECT 2')
+            self.assertIs(outer, inner)
+            self.assertIs(outer, database.current_unit_of_work())
+
+        conn, = self.connections
+        conn.commit.assert_called_once()
+
+    def test_afterCommit_runsCallbacks_onlyOnceCommitted(self):
+        callback = Mock()
+
+        with database.transaction():
+            database.update_query('UPDATE users SET username = ?', ('x',))
+            database.after_commit(callback)
+            callback.assert_not_called()
+
+        callback.assert_called_once()
+
+    def test_afterCommit_dropsCallbacks_onRollback(self):
+        callback = Mock()
+
+        with self.assertRaises(ValueError), database.transaction():
+            database.after_commit(callback)
+            raise ValueError
+
+        callback.assert_not_called()
+
+    def test_afterCommit_runsRightAway_outsideUnitOfWork(self):
+        callback = Mock()
+
+        database.after_commit(callback)
+
+        callback.assert_called_once()
+
+    def test_commit_runsRemainingCallbacks_whenOneFails(self):
+        first, last = Mock(side_effect=RuntimeError), Mock()
+
+        with self.assertLogs('data.database', 'ERROR'), database.transaction():
+            database.after_commit(first)
+            database.after_commit(last)
+
+        first.assert_called_once()
+        last.assert_called_once()
+
+
+class BulkQueries_Should(unittest.TestCase):
+    def setUp(self):
+        self.conn = MagicMock()
+        self.cursor = self.conn.cursor.return_value.__enter__.return_value
+        self.cursor.description = None
+        pool = ConnectionPool(lambda: self.conn, min_size=0, max_size=1)
+        patcher = patch('data.database._pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_executeMany_commitsEachChunk_outsideUnitOfWork(self):
+        database.update_many('DELETE FROM votes WHERE reply_id = ?', [(i,) for i in range(5)], chunk_size=2)
+
+        self.assertEqual([[(0,), (1,)], [(2,), (3,)], [(4,)]],
+                         [call.args[1] for call in self.cursor.executemany.call_args_list])
+        self.assertEqual(3, self.conn.begin.call_count)
+        self.assertEqual(3, self.conn.commit.call_count)
+
+    def test_executeMany_leavesCommitToUnitOfWork(self):
+        with database.transaction():
+            database.update_many('DELETE FROM votes WHERE reply_id = ?', [(i,) for i in range(5)], chunk_size=2)
+            self.conn.commit.assert_not_called()
+
+        self.assertEqual(3, self.cursor.executemany.call_count)
+        self.conn.begin.assert_called_once()
+        self.conn.commit.assert_called_once()
+
+    def test_executeMany_skipsConnection_whenNoRows(self):
+        self.assertEqual([], database.insert_many('INSERT INTO votes VALUES(?, ?, ?)', []))
+
+        self.conn.cursor.assert_not_called()
+
+    def test_updateMany_sumsAffectedRowsOfChunks(self):
+        self.cursor.rowcount = 2
+
+        self.assertEqual(6, database.update_many('DELETE FROM votes WHERE reply_id = ?',
+                                                 [(i,) for i in range(5)], chunk_size=2))
+
+    def test_insertMany_returnsReturningRows_inRowOrder(self):
+        self.cursor.description = (('message_id',),)
+        self.cursor.fetchall.side_effect = [[(7,), (9,)], [(12,)]]
+
+        ids = database.insert_many('INSERT INTO messages(text) VALUES(?) RETURNING message_id',
+                                   [('a',), ('b',), ('c',)], chunk_size=2)
+
+        self.assertEqual([(7,), (9,), (12,)], ids)
+
+    def test_insertMany_returnsNoIds_withoutReturning(self):
+        self.cursor.lastrowid = 7
+
+        self.assertEqual([], database.insert_many('INSERT INTO messages(text) VALUES(?)', [('a',), ('b',)]))
+        self.cursor.fetchall.assert_not_called()
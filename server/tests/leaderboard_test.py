@@ -0,0 +1,33 @@
+import unittest
+from data.leaderboard import Leaderboard
+
+
+class Leaderboard_Should(unittest.TestCase):
+    def test_top_ranksByReputation_andTiesShareRank(self):
+        board = Leaderboard()
+        board.load([(1, 5), (2, 20), (3, 5), (4, -3)])
+
+        self.assertEqual([(1, 2, 20), (2, 1, 5), (2, 3, 5)], board.top(3))
+
+    def test_add_movesUser_andRankCountsHigherReputations(self):
+        board = Leaderboard()
+        board.load([(1, 5), (2, 20)])
+
+        board.add(1, 16)
+        board.add(3, 2)
+
+        self.assertEqual((1, 21), board.rank(1))
+        self.assertEqual((3, 2), board.rank(3))
+        # users without reputation rank like 0
+        self.assertEqual((4, 0), board.rank(99))
+
+    def test_excludedUsers_leaveBoard_andTheirChangesAreIgnored(self):
+        board = Leaderboard()
+        board.load([(1, 5), (2, 20)], excluded=[3])
+
+        board.exclude(2)
+        board.add(2, 1)
+        board.add(3, 1)
+
+        self.assertEqual([(1, 1, 5)], board.top(10))
+        self.assertEqual(1, len(board))
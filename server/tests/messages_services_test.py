@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+from data.models.message import Message
+from search.index import MESSAGE
+from services import messages_services as messages
+from tests.test_utils import USER_ID
+
+OTHER_USER_ID = USER_ID + 1
+LIMIT = 2
+
+
+def row(message_id):
+    return message_id, 'text', USER_ID, OTHER_USER_ID
+
+
+class MessagesServices_Should(unittest.IsolatedAsyncioTestCase):
+
+    async def test_getConversation_readsLatestPage_byConversationKey(self):
+        with patch('services.messages_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [row(9), row(8), row(7)]
+
+            page = await messages.get_conversation(OTHER_USER_ID, USER_ID, limit=LIMIT)
+
+            self.assertEqual([Message.from_query(*row(8)), Message.from_query(*row(9))], page.messages)
+            self.assertEqual((8, None), (page.before, page.after))
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('WHERE user_low = ? AND user_high = ?', sql)
+            self.assertIn('ORDER BY user_low DESC, user_high DESC, message_id DESC LIMIT ?', sql)
+            self.assertEqual((USER_ID, OTHER_USER_ID, LIMIT + 1), params)
+
+    async def test_getConversation_readsNewerMessages_afterMessageId(self):
+        with patch('services.messages_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [row(6)]
+
+            page = await messages.get_conversation(USER_ID, OTHER_USER_ID, after=5, limit=LIMIT)
+
+            self.assertEqual([Message.from_query(*row(6))], page.messages)
+            self.assertEqual((6, None), (page.before, page.after))
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('AND message_id > ? ORDER BY user_low ASC, user_high ASC, message_id ASC LIMIT ?', sql)
+            self.assertEqual((USER_ID, OTHER_USER_ID, 5, LIMIT + 1), params)
+
+    async def test_getConversation_pointsToNewerMessages_whenReadBefore(self):
+        with patch('services.messages_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [row(4), row(3)]
+
+            page = await messages.get_conversation(USER_ID, OTHER_USER_ID, before=5, limit=LIMIT)
+
+            self.assertEqual((None, 4), (page.before, page.after))
+            self.assertEqual((USER_ID, OTHER_USER_ID, 5, LIMIT + 1), mock_read_query.call_args.args[1])
+
+    async def test_updateText_reindexesMessage_afterCommit(self):
+        with (patch('services.messages_services.update_query'),
+              patch('services.messages_services.after_commit') as mock_after_commit,
+              patch('services.messages_services.search_index') as mock_index):
+            await messages.update_text(5, 'new text')
+
+            mock_index.update_text.assert_not_called()
+            mock_after_commit.call_args.args[0]()
+            mock_index.update_text.assert_called_once_with(MESSAGE, 5, 'new text')
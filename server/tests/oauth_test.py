@@ -0,0 +1,66 @@
+import hashlib
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from common import oauth
+from data.models.user import TokenData
+from jose import jwt
+from tests.test_utils import USER_ID, USERNAME
+
+
+def old_format_token(expire: datetime) -> str:
+    return jwt.encode({'username': USERNAME, 'is_admin': False, 'expire': expire.strftime('%Y-%m-%d %H:%M:%S')},
+                      oauth.SECRET_KEY, oauth.ALGORITHM)
+
+
+class OAuth_Should(unittest.TestCase):
+
+    def setUp(self):
+        oauth._verified_tokens.clear()
+
+    def test_createAccessToken_addsNumericExpAndUserId(self):
+        token = oauth.create_access_token(TokenData(username=USERNAME, is_admin=False, user_id=USER_ID))
+
+        payload = jwt.decode(token.access_token, oauth.SECRET_KEY, algorithms=oauth.ALGORITHM)
+
+        self.assertIsInstance(payload['exp'], int)
+        self.assertEqual(USER_ID, payload['user_id'])
+
+    def test_verifyTokenAccess_returnsTokenData_forNewToken(self):
+        token = oauth.create_access_token(TokenData(username=USERNAME, is_admin=True, user_id=USER_ID))
+
+        self.assertEqual(TokenData(username=USERNAME, is_admin=True, user_id=USER_ID),
+                         oauth.verify_token_access(token.access_token))
+
+    def test_verifyTokenAccess_acceptsOldFormatToken(self):
+        token = old_format_token(datetime.now() + timedelta(days=1))
+
+        self.assertEqual(TokenData(username=USERNAME, is_admin=False), oauth.verify_token_access(token))
+
+    def test_verifyTokenAccess_rejectsExpiredTokens(self):
+        expired = jwt.encode({'username': USERNAME, 'is_admin': False, 'exp': 1}, oauth.SECRET_KEY, oauth.ALGORITHM)
+
+        self.assertEqual('Token has expired. Please log in again', oauth.verify_token_access(expired))
+        self.assertEqual('Token has expired. Please log in again',
+                         oauth.verify_token_access(old_format_token(datetime.now() - timedelta(days=1))))
+
+    def test_verifyTokenAccess_rejectsInvalidTokens(self):
+        self.assertEqual('Invalid token', oauth.verify_token_access('not.a.token'))
+        self.assertEqual(0, oauth.verified_token_cache_stats()['size'])
+
+    def test_verifyTokenAccess_decodesOnce_forRepeatedToken(self):
+        token = oauth.create_access_token(TokenData(username=USERNAME, is_admin=False, user_id=USER_ID))
+
+        with patch('common.oauth.jwt.decode', wraps=jwt.decode) as mock_decode:
+            first = oauth.verify_token_access(token.access_token)
+            second = oauth.verify_token_access(token.access_token)
+
+        self.assertEqual(first, second)
+        mock_decode.assert_called_once()
+
+    def test_verifyTokenAccess_doesNotTrustCachedToken_afterItExpires(self):
+        expired = jwt.encode({'username': USERNAME, 'is_admin': False, 'exp': 1}, oauth.SECRET_KEY, oauth.ALGORITHM)
+        oauth._verified_tokens.put(hashlib.sha256(expired.encode()).digest(),
+                                   (TokenData(username=USERNAME, is_admin=False), 1))
+
+        self.assertEqual('Token has expired. Please log in again', oauth.verify_token_access(expired))
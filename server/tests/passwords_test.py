@@ -0,0 +1,28 @@
+import unittest
+from passlib.hash import bcrypt
+from common import passwords, utils
+
+PASSWORD = 'password'
+
+
+class Passwords_Should(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        passwords.shutdown()
+
+    async def test_hashPassword_producesHashThatVerifies(self):
+        hashed = await passwords.hash_password(PASSWORD)
+
+        self.assertTrue(await passwords.verify_password(PASSWORD, hashed))
+        self.assertFalse(await passwords.verify_password('wrong', hashed))
+        self.assertEqual({'workers': passwords.PASSWORD_WORKERS, 'running': 0, 'queued': 0}, passwords.stats())
+
+    async def test_verifyAndUpdate_rehashes_whenStoredWithAnotherCost(self):
+        cheap_hash = bcrypt.using(rounds=4).hash(PASSWORD)
+
+        matches, new_hash = await passwords.verify_and_update(PASSWORD, cheap_hash)
+
+        self.assertTrue(matches)
+        self.assertEqual(utils.BCRYPT_ROUNDS, bcrypt.from_string(new_hash).rounds)
+        self.assertEqual((False, None), await passwords.verify_and_update('wrong', cheap_hash))
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import Mock, patch
+from data.pool import ConnectionPool, PoolTimeout
+
+
+def create_pool(**kwargs):
+    connect = Mock(side_effect=lambda: Mock())
+    return ConnectionPool(connect, **kwargs), connect
+
+
+class ConnectionPool_Should(unittest.TestCase):
+    def test_acquire_reusesReleasedConnection(self):
+        pool, connect = create_pool()
+
+        conn = pool.acquire()
+        pool.release(conn)
+
+        self.assertIs(conn, pool.acquire())
+        self.assertEqual(1, connect.call_count)
+
+    def test_warmUp_opensMinSizeConnections(self):
+        pool, connect = create_pool(min_size=3, max_size=5)
+
+        pool.warm_up()
+
+        self.assertEqual(3, connect.call_count)
+        self.assertEqual(3, pool.stats()['idle'])
+
+    def test_acquire_raisesPoolTimeout_whenPoolExhausted(self):
+        pool, _ = create_pool(min_size=0, max_size=1, checkout_timeout=0.01)
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        self.assertEqual(1, pool.stats()['waits'])
+
+    def test_acquire_replacesDeadConnection_whenPingFails(self):
+        pool, connect = create_pool(ping_after=0)
+        dead = pool.acquire()
+        dead.ping.side_effect = Exception('gone away')
+        pool.release(dead)
+
+        conn = pool.acquire()
+
+        self.assertIsNot(dead, conn)
+        dead.close.assert_called_once()
+        self.assertEqual(1, pool.stats()['discarded'])
+
+    def test_release_closesIdleConnectionsAboveMinSize(self):
+        pool, _ = create_pool(min_size=1, max_size=3, idle_timeout=60)
+        first, second = pool.acquire(), pool.acquire()
+
+        with patch('data.pool.monotonic', return_value=0):
+            pool.release(first)
+        with patch('data.pool.monotonic', return_value=120):
+            pool.release(second)
+
+        first.close.assert_called_once()
+        self.assertEqual(1, pool.stats()['size'])
+
+    def test_connection_rollsBackAndReturnsConnection_onError(self):
+        pool, _ = create_pool()
+
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                raise ValueError()
+
+        conn.rollback.assert_called_once()
+        self.assertEqual(1, pool.stats()['idle'])
+
+    def test_connection_discardsConnection_whenRollbackFails(self):
+        pool, _ = create_pool()
+
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                conn.rollback.side_effect = Exception('broken socket')
+                raise ValueError()
+
+        conn.close.assert_called_once()
+        self.assertEqual(0, pool.stats()['size'])
+
+    def test_stats_countCheckouts(self):
+        pool, _ = create_pool()
+
+        with pool.connection():
+            pass
+        with pool.connection():
+            pass
+
+        self.assertEqual(2, pool.stats()['checkouts'])
+        self.assertEqual(1, pool.stats()['created'])
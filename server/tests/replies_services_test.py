@@ -1,8 +1,11 @@
 import unittest
 from unittest.mock import Mock, patch
 from data.models.reply import ReplyResponse, ReplyCreateUpdate
-from common.utils import PaginationInfo
+from common.utils import PaginationInfo, encode_cursor, decode_cursor
+from starlette.datastructures import URL as StarletteURL
+from data.leaderboard import Leaderboard
 from services import replies_services as replies
+from services import reputation_services as reputation
 from tests.test_utils import TOPIC_ID, REPLY_ID, USER_ID, fake_category, fake_topic
 
 
@@ -13,6 +16,7 @@ USERNAME = 'someuser'
 # pagination params
 PAGE = 1
 SIZE = 1
+URL = StarletteURL(f'http://localhost/topics/{TOPIC_ID}')
 
 
 def create_reply(reply_id):
@@ -23,10 +27,11 @@ def create_reply(reply_id):
         topic_id=TOPIC_ID)
 
 
-class RepliesServices_Should(unittest.TestCase):
+class RepliesServices_Should(unittest.IsolatedAsyncioTestCase):
 
-    def test_getAll_returnsListOfReplyResponseObjectsPaginationInfoAndLinks_whenRepliesExist(self):
+    async def test_getAll_returnsListOfReplyResponseObjectsPaginationInfoAndLinks_whenRepliesExist(self):
         with patch('services.replies_services.read_query') as mock_get_all_replies, \
+                patch('services.replies_services.get_reply_count'), \
                 patch('services.replies_services.get_pagination_info') as mock_pagination_info, \
                 patch('services.replies_services.create_links') as mock_create_links:
             reply_id_1, reply_id_2, reply_id_3 = 1, 2, 3
@@ -46,13 +51,14 @@ class RepliesServices_Should(unittest.TestCase):
             expected = [create_reply(reply_id_1), create_reply(reply_id_2), create_reply(reply_id_3)], PaginationInfo(
                 total_elements=len(mock_get_all_replies.return_value), page=PAGE, size=SIZE, pages=1), links
 
-            actual = replies.get_all(
+            actual = await replies.get_all(
                 topic_id=TOPIC_ID, request=request, page=PAGE, size=SIZE)
 
             self.assertEqual(expected, actual)
 
-    def test_getAll_returnsEmptyListPaginationInfoAndLinks_whenNoReplies(self):
+    async def test_getAll_returnsEmptyListPaginationInfoAndLinks_whenNoReplies(self):
         with patch('services.replies_services.read_query') as mock_get_all_replies, \
+                patch('services.replies_services.get_reply_count'), \
                 patch('services.replies_services.get_pagination_info') as mock_pagination_info, \
                 patch('services.replies_services.create_links') as mock_create_links:
 
@@ -70,48 +76,116 @@ class RepliesServices_Should(unittest.TestCase):
                                           size=SIZE,
                                           pages=0), links
 
-            actual = replies.get_all(
+            actual = await replies.get_all(
                 topic_id=TOPIC_ID, request=request, page=PAGE, size=SIZE)
 
             self.assertEqual(expected, actual)
 
-    def test_getById_returnsReplyResponseObject_whenExists(self):
+    async def test_getAll_takesTotalFromTopicReplyCount(self):
+        with patch('services.replies_services.read_query') as mock_read_query, \
+                patch('services.replies_services.get_reply_count') as mock_get_reply_count:
+
+            mock_read_query.return_value = [(REPLY_ID, TEXT, USERNAME, TOPIC_ID)]
+            mock_get_reply_count.return_value = 40
+
+            _, pagination_info, _ = await replies.get_all(
+                topic_id=TOPIC_ID, request=Mock(url=URL), page=2, size=SIZE)
+
+            self.assertEqual(40, pagination_info.total_elements)
+            self.assertEqual(40, pagination_info.pages)
+            mock_read_query.assert_called_once()
+            self.assertIn('ORDER BY r.topic_id, r.reply_id', mock_read_query.call_args.args[0])
+
+    async def test_getAll_seeksPastCursor_whenNoPage(self):
+        with patch('services.replies_services.read_query') as mock_read_query, \
+                patch('services.replies_services.get_reply_count') as mock_get_reply_count:
+
+            mock_read_query.return_value = [(6, TEXT, USERNAME, TOPIC_ID), (7, TEXT, USERNAME, TOPIC_ID)]
+            mock_get_reply_count.return_value = 10
+            position = replies.parse_cursor(encode_cursor({'t': TOPIC_ID, 'd': 'next', 'k': 5}), TOPIC_ID)
+
+            result, pagination_info, links = await replies.get_all(
+                topic_id=TOPIC_ID, request=Mock(url=URL), page=None, size=SIZE, position=position)
+
+            self.assertEqual([create_reply(6)], result)
+            self.assertIsNone(pagination_info.page)
+            self.assertEqual({'t': TOPIC_ID, 'd': 'next', 'k': 6}, decode_cursor(links.next_cursor))
+            self.assertEqual({'t': TOPIC_ID, 'd': 'prev', 'k': 6}, decode_cursor(links.prev_cursor))
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('AND r.reply_id > ? ORDER BY r.topic_id ASC, r.reply_id ASC LIMIT ?', sql)
+            self.assertEqual((TOPIC_ID, 5, SIZE + 1), params)
+
+    async def test_getAll_seeksPastScoreAndReplyId_whenSortedByBest(self):
+        with patch('services.replies_services.read_query') as mock_read_query, \
+                patch('services.replies_services.get_reply_count') as mock_get_reply_count:
+
+            mock_read_query.return_value = [(6, TEXT, USERNAME, TOPIC_ID, 0, 0, 0.25),
+                                            (4, TEXT, USERNAME, TOPIC_ID, 0, 0, 0.25)]
+            mock_get_reply_count.return_value = 10
+            cursor = encode_cursor({'t': TOPIC_ID, 'd': 'next', 'k': [0.5, 2], 's': 'best'})
+            position = replies.parse_cursor(cursor, TOPIC_ID, 'best')
+
+            result, _, links = await replies.get_all(
+                topic_id=TOPIC_ID, request=Mock(url=URL), page=None, size=SIZE, position=position, sort_by='best')
+
+            self.assertEqual([create_reply(6)], result)
+            self.assertEqual({'t': TOPIC_ID, 'd': 'next', 'k': [0.25, 6], 's': 'best'},
+                             decode_cursor(links.next_cursor))
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('AND (r.score < ? OR (r.score = ? AND r.reply_id < ?)) '
+                          'ORDER BY r.topic_id DESC, r.score DESC, r.reply_id DESC LIMIT ?', sql)
+            self.assertEqual((TOPIC_ID, 0.5, 0.5, 2, SIZE + 1), params)
+
+    def test_parseCursor_returnsNone_whenCursorForAnotherOrder(self):
+        best_cursor = encode_cursor({'t': TOPIC_ID, 'd': 'next', 'k': [0.5, 2], 's': 'best'})
+        reply_id_cursor = encode_cursor({'t': TOPIC_ID, 'd': 'next', 'k': 5})
+
+        self.assertIsNone(replies.parse_cursor(best_cursor, TOPIC_ID))
+        self.assertIsNone(replies.parse_cursor(reply_id_cursor, TOPIC_ID, 'best'))
+
+    def test_parseCursor_returnsNone_whenCursorForAnotherTopic(self):
+        cursor = encode_cursor({'t': TOPIC_ID + 1, 'd': 'next', 'k': 5})
+
+        self.assertIsNone(replies.parse_cursor(cursor, TOPIC_ID))
+        self.assertIsNone(replies.parse_cursor('not a cursor', TOPIC_ID))
+
+    async def test_getById_returnsReplyResponseObject_whenExists(self):
         with patch('services.replies_services.read_query') as mock_get_reply_by_id:
             reply_id = 1
             mock_get_reply_by_id.return_value = [
-                (reply_id, TEXT, USERNAME, TOPIC_ID)]
+                (reply_id, TEXT, USERNAME, TOPIC_ID, 3, 1)]
 
-            expected = create_reply(reply_id)
+            expected = create_reply(reply_id).model_copy(update={'upvotes': 3, 'downvotes': 1})
 
-            actual = replies.get_by_id(id=reply_id)
+            actual = await replies.get_by_id(id=reply_id)
 
             self.assertEqual(expected, actual)
 
-    def test_getById_returnsNone_whenNoSuchReply(self):
+    async def test_getById_returnsNone_whenNoSuchReply(self):
         with patch('services.replies_services.read_query') as mock_get_reply_by_id:
             reply_id = 1
 
             mock_get_reply_by_id.return_value = []
 
             expected = None
-            actual = replies.get_by_id(id=reply_id)
+            actual = await replies.get_by_id(id=reply_id)
 
             self.assertEqual(expected, actual)
 
-    def test_createReply_returnsReplyId(self):
+    async def test_createReply_returnsReplyId(self):
         with patch('services.replies_services.insert_query') as mock_add_reply:
             reply_id = 1
 
             mock_add_reply.return_value = reply_id
 
             expected = 1
-            actual = replies.create_reply(topic_id=TOPIC_ID,
-                                          reply=ReplyCreateUpdate(text='text'), user_id=USER_ID)
+            actual = await replies.create_reply(topic_id=TOPIC_ID,
+                                                reply=ReplyCreateUpdate(text='text'), user_id=USER_ID)
 
             self.assertEqual(expected, actual)
 
     # cat is private, no write access
-    def test_canUserAccessTopicContent_returnsFalseAndCorrectMsg_whenCategoryPrivateAndNotHasWriteAccess(self):
+    async def test_canUserAccessTopicContent_returnsFalseAndCorrectMsg_whenCategoryPrivateAndNotHasWriteAccess(self):
         with patch('services.replies_services.get_cat_by_id') as mock_get_cat, \
                 patch('services.replies_services.has_write_access') as mock_has_write_access:
 
@@ -122,12 +196,12 @@ class RepliesServices_Should(unittest.TestCase):
 
             expected = (
                 False, 'You don\'t have permissions to post, modify replies or vote in this topic')
-            actual = replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
+            actual = await replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
 
             self.assertEqual(expected, actual)
 
     # cat is private, has write access, topic locked
-    def test_CanUserAccessTopicContent_returnsFalseAndCorrectMsg_whenTopicLocked(self):
+    async def test_CanUserAccessTopicContent_returnsFalseAndCorrectMsg_whenTopicLocked(self):
         with patch('services.replies_services.get_cat_by_id') as mock_get_cat, \
                 patch('services.replies_services.has_write_access') as mock_has_write_access, \
                 patch('services.replies_services.get_topic_by_id') as mock_get_topic:
@@ -139,12 +213,12 @@ class RepliesServices_Should(unittest.TestCase):
             mock_get_topic.return_value = mock_topic
 
             expected = (False, 'This topic is read-only')
-            actual = replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
+            actual = await replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
 
             self.assertEqual(expected, actual)
 
     # cat is private, has_write_access, topic open
-    def test_CanUserAccessTopicContent_returnsTrueAndOk_whenCatPrivate_hasWriteAccess(self):
+    async def test_CanUserAccessTopicContent_returnsTrueAndOk_whenCatPrivate_hasWriteAccess(self):
         with patch('services.replies_services.get_cat_by_id') as mock_get_cat, \
                 patch('services.replies_services.has_write_access') as mock_has_write_access, \
                 patch('services.replies_services.get_topic_by_id') as mock_get_topic:
@@ -158,12 +232,12 @@ class RepliesServices_Should(unittest.TestCase):
             mock_get_topic.return_value = mock_topic
 
             expected = (True, 'OK')
-            actual = replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
+            actual = await replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
 
             self.assertEqual(expected, actual)
 
     # cat not private, topic not locked
-    def test_CanUserAccessTopicContent_returnsTrueAndOk_whenCatNotPrivate_TopicNotLocked(self):
+    async def test_CanUserAccessTopicContent_returnsTrueAndOk_whenCatNotPrivate_TopicNotLocked(self):
         with patch('services.replies_services.get_cat_by_id') as mock_get_cat, \
                 patch('services.replies_services.has_write_access') as mock_has_write_access, \
                 patch('services.replies_services.get_topic_by_id') as mock_get_topic:
@@ -177,12 +251,12 @@ class RepliesServices_Should(unittest.TestCase):
             mock_has_write_access.return_value = False
 
             expected = (True, 'OK')
-            actual = replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
+            actual = await replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
 
             self.assertEqual(expected, actual)
 
     # cat not private, topic locked
-    def test_CanUserAccessTopicContent_returnsFalseAndCorrectMsg_whenCatNotPrivate_TopicLocked(self):
+    async def test_CanUserAccessTopicContent_returnsFalseAndCorrectMsg_whenCatNotPrivate_TopicLocked(self):
         with patch('services.replies_services.get_cat_by_id') as mock_get_cat, \
                 patch('services.replies_services.has_write_access') as mock_has_write_access, \
                 patch('services.replies_services.get_topic_by_id') as mock_get_topic:
@@ -196,28 +270,49 @@ class RepliesServices_Should(unittest.TestCase):
             mock_has_write_access.return_value = False
 
             expected = (False, 'This topic is read-only')
-            actual = replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
+            actual = await replies.can_user_access_topic_content(TOPIC_ID, USER_ID)
 
             self.assertEqual(expected, actual)
 
-    def test_replyExists_returnsTrue_ifReply(self):
+    async def test_replyExists_returnsTrue_ifReply(self):
         with patch('services.replies_services.read_query') as mock_exists:
 
             mock_exists.return_value = [(1,)]
 
             expected = True
 
-            actual = replies.exists(reply_id=REPLY_ID, topic_id=TOPIC_ID)
+            actual = await replies.exists(reply_id=REPLY_ID, topic_id=TOPIC_ID)
 
             self.assertEqual(expected, actual)
 
-    def test_replyExists_returnsFalse_ifNotReply(self):
+    async def test_replyExists_returnsFalse_ifNotReply(self):
         with patch('services.votes_services.read_query') as mock_get_vote_type:
 
             mock_get_vote_type.return_value = []
 
             expected = False
 
-            actual = replies.exists(reply_id=REPLY_ID, topic_id=TOPIC_ID)
+            actual = await replies.exists(reply_id=REPLY_ID, topic_id=TOPIC_ID)
 
             self.assertEqual(expected, actual)
+
+    async def test_deleteReply_takesVotesAndBestReplyBonus_offAuthorsReputation(self):
+        with patch('services.replies_services.read_query') as mock_read_query, \
+                patch('services.replies_services.update_query') as mock_update_query, \
+                patch('services.topics_services.read_query') as mock_topics_read_query, \
+                patch('services.topics_services.update_query'), \
+                patch('services.reputation_services.read_query') as mock_reputation_read_query, \
+                patch('services.reputation_services._leaderboard', Leaderboard()), \
+                patch('services.reputation_services._leaderboard_expires_at', float('inf')):
+            reputation._reply_authors.clear()
+            reputation._leaderboard.load([(USER_ID, 1 + 1 - 1 + reputation.BEST_REPLY_BONUS)])
+            # the reply's votes, then the topic it is the best reply of
+            mock_read_query.side_effect = [[(1,), (1,), (0,)], [(TOPIC_ID,)]]
+            mock_topics_read_query.return_value = [(REPLY_ID,)]
+            mock_reputation_read_query.return_value = [(USER_ID,)]
+
+            await replies.delete_reply(REPLY_ID)
+
+            self.assertEqual((1, 0), reputation._leaderboard.rank(USER_ID))
+            self.assertIn('DELETE FROM votes', mock_read_query.call_args_list[0].args[0])
+            self.assertIn('DELETE from replies', mock_update_query.call_args.args[0])
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+from data.leaderboard import Leaderboard
+from data.models.user import UserRank
+from services import reputation_services as reputation
+from tests.test_utils import REPLY_ID, USER_ID, USERNAME
+
+OTHER_USER_ID = USER_ID + 1
+
+
+class ReputationServices_Should(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        reputation._leaderboard = Leaderboard()
+        reputation._leaderboard_expires_at = float('inf')
+        reputation._reply_authors.clear()
+
+    async def test_voteChanged_movesAuthorByVotePoints(self):
+        with patch('services.reputation_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [(USER_ID,)]
+
+            await reputation.vote_changed(REPLY_ID, None, 1)
+            await reputation.vote_changed(REPLY_ID, 1, 0)
+
+            self.assertEqual((1, -1), reputation._leaderboard.rank(USER_ID))
+            # the reply's author is read once
+            mock_read_query.assert_called_once()
+
+    async def test_bestReplyChanged_movesBonusBetweenAuthors(self):
+        with patch('services.reputation_services.read_query') as mock_read_query:
+            mock_read_query.side_effect = [[(USER_ID,)], [(OTHER_USER_ID,)]]
+            reputation._leaderboard.load([(USER_ID, reputation.BEST_REPLY_BONUS)])
+
+            await reputation.best_reply_changed(REPLY_ID, REPLY_ID + 1)
+
+            self.assertEqual((2, 0), reputation._leaderboard.rank(USER_ID))
+            self.assertEqual((1, reputation.BEST_REPLY_BONUS), reputation._leaderboard.rank(OTHER_USER_ID))
+
+    async def test_getTop_addsUsernames(self):
+        with patch('services.reputation_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [(USER_ID, USERNAME)]
+            reputation._leaderboard.load([(USER_ID, 7)])
+
+            result = await reputation.get_top(10)
+
+            self.assertEqual([UserRank(rank=1, user_id=USER_ID, username=USERNAME, reputation=7)], result)
+
+    async def test_loadLeaderboard_leavesOutDeletedUsers(self):
+        with patch('services.reputation_services.read_query') as mock_read_query:
+            mock_read_query.side_effect = [[(USER_ID, 7), (OTHER_USER_ID, 9)], [(OTHER_USER_ID,)]]
+
+            await reputation.load_leaderboard()
+
+            self.assertEqual([(1, USER_ID, 7)], reputation._leaderboard.top(10))
+
+    async def test_getRank_reloadsLeaderboard_onceExpired(self):
+        with patch('services.reputation_services.read_query') as mock_read_query:
+            mock_read_query.side_effect = [[(USER_ID, 7), (OTHER_USER_ID, 9)], []]
+            reputation._leaderboard.load([(USER_ID, 3)])
+            reputation._leaderboard_expires_at = 0.0
+
+            result = await reputation.get_rank(USER_ID, USERNAME)
+            await reputation.get_rank(USER_ID, USERNAME)
+
+            self.assertEqual(UserRank(rank=2, user_id=USER_ID, username=USERNAME, reputation=7), result)
+            self.assertEqual(2, mock_read_query.call_count)
@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+import numpy as np
+from services import scores_services as scores
+
+
+class ScoresServices_Should(unittest.IsolatedAsyncioTestCase):
+
+    def test_wilsonLowerBound_matchesFormula_andIsZeroWithoutVotes(self):
+        actual = scores.wilson_lower_bound(np.array([0, 1, 10, 0]), np.array([0, 0, 0, 5]))
+
+        self.assertEqual(0.0, actual[0])
+        self.assertAlmostEqual(0.2065, actual[1], places=4)
+        self.assertAlmostEqual(0.7225, actual[2], places=4)
+        self.assertAlmostEqual(0.0, actual[3], places=9)
+
+    def test_wilsonLowerBound_ranksManyVotesAboveFewWithSameRatio(self):
+        few, many = scores.wilson_lower_bound(np.array([2, 200]), np.array([1, 100]))
+
+        self.assertGreater(many, few)
+
+    async def test_recomputeScores_scoresStaleRepliesInBatches(self):
+        with patch('services.scores_services.read_query') as mock_read_query, \
+                patch('services.scores_services.update_many') as mock_update_many, \
+                patch('services.scores_services.SCORE_BATCH_SIZE', 2):
+            mock_read_query.side_effect = [[(1, 1, 0), (3, 0, 0)], [(7, 0, 5)]]
+
+            scored = await scores.recompute_scores()
+
+            self.assertEqual(3, scored)
+            self.assertEqual([((0, 2),), ((3, 2),)], [call.args[1:] for call in mock_read_query.call_args_list])
+            first_batch = mock_update_many.call_args_list[0].args[1]
+            self.assertEqual([(1, 1, 0), (3, 0, 0)], [params[1:] for params in first_batch])
+            self.assertAlmostEqual(0.2065, first_batch[0][0], places=4)
+            self.assertIn('WHERE reply_id = ? AND upvotes = ? AND downvotes = ?', mock_update_many.call_args.args[0])
+
+    async def test_recomputeScores_returnsZero_whenNothingStale(self):
+        with patch('services.scores_services.read_query') as mock_read_query, \
+                patch('services.scores_services.update_many') as mock_update_many:
+            mock_read_query.return_value = []
+
+            self.assertEqual(0, await scores.recompute_scores())
+            mock_update_many.assert_not_called()
+
+    async def test_recomputePeriodically_logsFailure_andKeepsRunning(self):
+        with patch('services.scores_services.recompute_scores') as mock_recompute, \
+                patch('services.scores_services.SCORE_INTERVAL', 0):
+            mock_recompute.side_effect = [RuntimeError, 0, asyncio.CancelledError]
+
+            with self.assertLogs('services.scores_services', 'ERROR'), self.assertRaises(asyncio.CancelledError):
+                await scores._recompute_periodically()
+
+            self.assertEqual(3, mock_recompute.call_count)
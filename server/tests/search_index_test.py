@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from search import segment
+from search.index import InvertedIndex, TOPIC, REPLY, MESSAGE, FLUSH_AFTER_SECONDS
+from search.query import QuerySyntaxError, parse
+
+
+PUBLIC_CATEGORY = 1
+PRIVATE_CATEGORY = 2
+
+
+class InvertedIndex_Should(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = InvertedIndex(self.directory.name)
+        self.index.add_topic(1, 'Fishing by the river', PUBLIC_CATEGORY)
+        self.index.add_topic(2, 'The river in winter', PRIVATE_CATEGORY)
+        self.index.add_reply(10, 'I caught a big fish by the river bank', 1)
+        self.index.add_reply(20, 'The river is frozen', 2)
+        self.index.add_message(5, 'Meet me by the river', 7, 8)
+
+    def tearDown(self):
+        self.index.close()
+        self.directory.cleanup()
+
+    def ids(self, query, readable=None, user_id=None):
+        hits, _ = self.index.search(query, readable, user_id)
+        return {(kind, doc_id) for kind, doc_id, _, _ in hits}
+
+    def manifest(self):
+        with open(os.path.join(self.directory.name, 'manifest.json')) as file:
+            return json.load(file)
+
+    def test_search_matchesAllWords_andExcludesNegatedOnes(self):
+        self.assertEqual({(TOPIC, 1), (REPLY, 10)}, self.ids('river fish OR fishing'))
+        self.assertEqual({(TOPIC, 2), (REPLY, 20)}, self.ids('river -fishing -fish'))
+
+    def test_search_raisesQuerySyntaxError_forExclusionInsideOr(self):
+        with self.assertRaises(QuerySyntaxError):
+            self.index.search('river (-fishing OR frozen)', None, None)
+
+    def test_search_matchesPhrasesInOrder(self):
+        self.assertEqual({(TOPIC, 1), (REPLY, 10)}, self.ids('"by the river"'))
+        self.assertEqual(set(), self.ids('"river the by"'))
+
+    def test_search_filtersByReadableCategoriesAndMessageParticipants(self):
+        self.assertEqual({(TOPIC, 1), (REPLY, 10)}, self.ids('river', readable={PUBLIC_CATEGORY}))
+        self.assertIn((MESSAGE, 5), self.ids('river', user_id=8))
+        self.assertNotIn((MESSAGE, 5), self.ids('river', user_id=9))
+
+    def test_updateAndRemove_replaceIndexedText(self):
+        self.index.update_text(REPLY, 20, 'The lake is frozen')
+        self.index.remove(TOPIC, 1)
+
+        self.assertEqual({(REPLY, 20)}, self.ids('lake'))
+        self.assertEqual({(TOPIC, 2)}, self.ids('river'))
+
+    def test_flushAndMerge_persistSegmentsThatReopen(self):
+        self.index.flush()
+        self.index.add_topic(3, 'River cruise', PUBLIC_CATEGORY)
+        self.index.remove(REPLY, 10)
+        self.index.flush()
+        self.index.merge()
+        self.index.flush(clean=True)
+
+        reopened = InvertedIndex(self.directory.name)
+        self.assertTrue(reopened.open())
+        hits, total = reopened.search('river', None, None)
+        reopened.close()
+
+        self.assertEqual(4, total)
+        self.assertNotIn((REPLY, 10), {(kind, doc_id) for kind, doc_id, _, _ in hits})
+        self.assertEqual(1, len([name for name in os.listdir(self.directory.name) if name.endswith('.seg')]))
+
+    def test_open_returnsFalse_andRemovesFiles_afterUncleanShutdown(self):
+        self.index.flush(clean=True)
+        self.assertTrue(self.index.open())
+        self.index.remove(REPLY, 10)
+        self.index.flush()
+
+        reopened = InvertedIndex(self.directory.name)
+        self.assertFalse(reopened.open())
+
+        self.assertEqual(0, len(reopened))
+        self.assertEqual([], os.listdir(self.directory.name))
+
+    def test_maintain_flushesChanges_onceTheOldestIsDue(self):
+        self.index.flush(clean=True)
+        self.index.remove(REPLY, 10)
+
+        self.index.maintain()
+        self.assertEqual([], self.manifest()['deleted'])
+
+        with patch('search.index.time.monotonic', return_value=time.monotonic() + FLUSH_AFTER_SECONDS):
+            self.index.maintain()
+        manifest = self.manifest()
+
+        self.assertEqual(1, len(manifest['deleted']))
+        self.assertFalse(manifest['clean'])
+
+    def test_search_doesNotWaitForFlush_andSeesDocumentsBeingWritten(self):
+        searched = []
+
+        def write_segment(*args):
+            # a search from another thread while the segment file is being written
+            thread = threading.Thread(target=lambda: searched.append(self.ids('fishing')))
+            thread.start()
+            thread.join(timeout=5)
+            return segment.write_segment(*args)
+
+        with patch('search.index.write_segment', write_segment):
+            self.index.flush()
+
+        self.assertEqual([{(TOPIC, 1)}], searched)
+        self.assertEqual({(TOPIC, 1)}, self.ids('fishing'))
+
+    def test_search_pagesHitsByScore(self):
+        self.index.add_reply(11, 'river river river', 1)
+
+        hits, total = self.index.search('river', None, None, limit=1)
+
+        self.assertEqual(5, total)
+        self.assertEqual((REPLY, 11), hits[0][:2])
+
+
+class QueryParser_Should(unittest.TestCase):
+    def test_parse_buildsBooleanTree(self):
+        self.assertEqual(
+            ('or', [('and', [('term', 'a1'), ('not', ('term', 'b1'))]), ('phrase', ['c1', 'd1'])]),
+            parse('a1 -b1 OR "c1 d1"'))
+
+    def test_parse_rejectsExclusionsOutsideAnd(self):
+        for query in ('apple (-banana OR cherry)', 'apple (-banana -cherry)', 'apple -(NOT banana)'):
+            with self.subTest(query=query), self.assertRaises(QuerySyntaxError):
+                parse(query)
+
+    def test_parse_rejectsQueriesWithOnlyExclusions(self):
+        with self.assertRaises(QuerySyntaxError):
+            parse('NOT river')
+        with self.assertRaises(QuerySyntaxError):
+            parse('(river')
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+from data.models.category import Category
+from data.models.search import TopicSearchResult, ReplySearchResult
+from data.models.user import AnonymousUser
+from services import search_services as search
+from services.categories_services import Permissions
+from starlette.datastructures import URL
+from tests.test_utils import TOPIC_ID, REPLY_ID, USER_ID, USERNAME, fake_user
+
+
+QUERY = 'fishing river'
+TITLE = 'Fishing by the river'
+SCORE = 1.5
+
+# pagination params
+PAGE = 1
+SIZE = 2
+
+
+def fake_request():
+    return Mock(url=URL('http://localhost/search/topics?q=fishing'))
+
+
+class SearchServices_Should(unittest.IsolatedAsyncioTestCase):
+
+    def test_hasSearchableTerms_returnsFalse_whenAllTermsTooShort(self):
+        self.assertFalse(search.has_searchable_terms('a to be'))
+        self.assertTrue(search.has_searchable_terms('to fish'))
+
+    async def test_readableCategoryIds_addsUsersPrivateCategoriesToPublicOnes(self):
+        categories = [Category(category_id=1, name='public'), Category(category_id=2, name='private', is_private=True),
+                      Category(category_id=3, name='secret', is_private=True)]
+        with patch('services.search_services.categories_services.get_all', AsyncMock(return_value=categories)), \
+                patch('services.search_services.categories_services.get_permissions',
+                      AsyncMock(return_value=Permissions(read=frozenset({2}), write=frozenset()))):
+            self.assertEqual({1}, await search.readable_category_ids(AnonymousUser()))
+            self.assertEqual({1, 2}, await search.readable_category_ids(fake_user()))
+
+    async def test_searchTopics_returnsRankedTopicsAndTotal(self):
+        with patch('services.search_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [
+                (TOPIC_ID, TITLE, USER_ID, USERNAME, 0, None, 1, 'Uncategorized', SCORE, 3)]
+
+            topics, pagination_info, _ = await search.search_topics(
+                fake_request(), QUERY, AnonymousUser(), PAGE, SIZE)
+
+            self.assertIsInstance(topics[0], TopicSearchResult)
+            self.assertEqual(SCORE, topics[0].score)
+            self.assertEqual(3, pagination_info.total_elements)
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('MATCH(t.title) AGAINST(? IN NATURAL LANGUAGE MODE) AND c.is_private = 0', sql)
+            self.assertIn('ORDER BY score DESC', sql)
+            self.assertEqual((QUERY, QUERY, SIZE, 0), params)
+
+    async def test_searchReplies_filtersPrivateCategoriesByPermission_whenUserNotAdmin(self):
+        with patch('services.search_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [(REPLY_ID, 'some text', USERNAME, TOPIC_ID, SCORE, 1)]
+            user = fake_user()
+            user.is_admin = False
+
+            replies, _, _ = await search.search_replies(fake_request(), QUERY, user, PAGE, SIZE)
+
+            self.assertEqual([ReplySearchResult(
+                reply_id=REPLY_ID, text='some text', username=USERNAME, topic_id=TOPIC_ID, score=SCORE)], replies)
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('users_categories_permissions p WHERE p.user_id = ?', sql)
+            self.assertEqual((QUERY, QUERY, user.user_id, SIZE, 0), params)
+
+    async def test_searchTopics_countsMatches_whenPagePastTheEnd(self):
+        with patch('services.search_services.read_query') as mock_read_query, \
+                patch('services.search_services.query_count') as mock_query_count:
+            mock_read_query.return_value = []
+            mock_query_count.return_value = 3
+
+            topics, pagination_info, _ = await search.search_topics(fake_request(), QUERY, AnonymousUser(), 5, SIZE)
+
+            self.assertEqual([], topics)
+            self.assertEqual(3, pagination_info.total_elements)
+            mock_query_count.assert_called_once()
+
+    async def test_maintainIndex_logsFailures_andKeepsMaintaining(self):
+        with patch('services.search_services.rebuild_index') as mock_rebuild_index, \
+                patch('services.search_services.search_index') as mock_index, \
+                patch('services.search_services.INDEX_MAINTENANCE_INTERVAL', 0):
+            mock_rebuild_index.side_effect = RuntimeError
+            mock_index.maintain.side_effect = [OSError, None, asyncio.CancelledError]
+
+            with self.assertLogs('services.search_services', 'ERROR') as logs, \
+                    self.assertRaises(asyncio.CancelledError):
+                await search._maintain_index(rebuild=True)
+
+            self.assertEqual(2, len(logs.records))
+            self.assertEqual(3, mock_index.maintain.call_count)
@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import Mock, patch
+from fastapi import HTTPException
+from routers import search as search_router
+from data.models.user import AnonymousUser
+
+
+class SearchRouter_Should(unittest.IsolatedAsyncioTestCase):
+
+    async def test_searchTopics_raises400_whenNoSearchableTerms(self):
+        with patch('services.search_services.search_topics') as mock_search_topics:
+            with self.assertRaises(HTTPException) as ex:
+                await search_router.search_topics(Mock(), AnonymousUser(), q='a b', page=1, size=1)
+
+            self.assertEqual(400, ex.exception.status_code)
+            mock_search_topics.assert_not_called()
+
+    async def test_searchReplies_passesCurrentUserToService(self):
+        with patch('services.search_services.search_replies') as mock_search_replies:
+            user = Mock()
+            mock_search_replies.return_value = ([], Mock(), Mock())
+
+            with patch('routers.search.ReplySearchPaginate') as mock_paginate:
+                await search_router.search_replies(Mock(), user, q='fishing', page=1, size=1)
+
+            mock_search_replies.assert_called_once()
+            self.assertIs(user, mock_search_replies.call_args.args[2])
+            mock_paginate.assert_called_once()
+
+    async def test_search_raises400_whenQueryMalformed(self):
+        with patch('services.search_services.readable_category_ids') as mock_readable:
+            mock_readable.return_value = set()
+
+            with self.assertRaises(HTTPException) as ex:
+                await search_router.search(Mock(), AnonymousUser(), q='NOT river', page=1, size=1)
+
+            self.assertEqual(400, ex.exception.status_code)
+
+    async def test_search_raises400_whenInvalidTypes(self):
+        with self.assertRaises(HTTPException) as ex:
+            await search_router.search(Mock(), AnonymousUser(), q='river', types='topics,polls', page=1, size=1)
+
+        self.assertEqual(400, ex.exception.status_code)
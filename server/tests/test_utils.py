@@ -50,6 +50,11 @@ def fake_create_update_reply(text: str):
     return reply
 
 
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
 def create_user_info(username: str ='username'):
     return UserInfo(username=username,
                     email=EMAIL,
@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import patch
+from common.throttle import SlidingWindowLimiter
+
+
+class SlidingWindowLimiter_Should(unittest.TestCase):
+    def test_hit_rejectsOverLimit_andReturnsSecondsToWait(self):
+        limiter = SlidingWindowLimiter(limit=2, window=60)
+        with patch('common.throttle.monotonic', return_value=100):
+            self.assertEqual(0, limiter.hit('key'))
+        with patch('common.throttle.monotonic', return_value=110):
+            self.assertEqual(0, limiter.hit('key'))
+            self.assertEqual(50, limiter.hit('key'))
+            self.assertEqual(0, limiter.hit('other'))
+
+        self.assertEqual({'keys': 2, 'allowed': 3, 'rejected': 1}, limiter.stats())
+
+    def test_hit_allowsAgain_onceOldestHitLeavesWindow(self):
+        limiter = SlidingWindowLimiter(limit=1, window=60)
+        with patch('common.throttle.monotonic', return_value=100):
+            limiter.hit('key')
+        with patch('common.throttle.monotonic', return_value=160):
+            self.assertEqual(0, limiter.hit('key'))
+
+    def test_reset_forgetsHitsOfKey(self):
+        limiter = SlidingWindowLimiter(limit=1, window=60)
+        limiter.hit('key')
+        limiter.reset('key')
+
+        self.assertEqual(0, limiter.hit('key'))
+
+    def test_hit_forgetsLeastRecentlyHitKey_whenFull(self):
+        limiter = SlidingWindowLimiter(limit=1, window=60, maxsize=2)
+        limiter.hit('a')
+        limiter.hit('b')
+        limiter.hit('c')
+
+        self.assertEqual(2, limiter.stats()['keys'])
+        self.assertEqual(0, limiter.hit('a'))
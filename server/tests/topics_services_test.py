@@ -1,8 +1,9 @@
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch
 from data.models.topic import TopicResponse, TopicCreate
 from data.models.user import User
 from services import topics_services as topics
+from common.utils import encode_cursor, decode_cursor
 from mariadb import IntegrityError
 
 
@@ -33,57 +34,60 @@ def create_topic(topic_id, topic_title=TITLE, author=AUTHOR):
         category_name=CATEGORY_NAME)
 
   
-class TopicsServices_Should(TestCase):
+class TopicsServices_Should(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        topics._total_counts.clear()
    
-    def test_getById_returnsTopicResponseObject_whenExists(self):
+    async def test_getById_returnsTopicResponseObject_whenExists(self):
         with patch('services.topics_services.read_query') as mock_read_query:
             topic_id = 1
             mock_read_query.return_value = [
                 (TOPIC_ID, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME)]
 
             expected = create_topic(topic_id)
-            result = topics.get_by_id(topic_id)
+            result = await topics.get_by_id(topic_id)
 
             self.assertEqual(expected, result)
     
     
-    def test_getById_returnsNone_whenNoSuchTopic(self):
+    async def test_getById_returnsNone_whenNoSuchTopic(self):
         with patch('services.topics_services.read_query') as mock_read_query:
             topic_id = 1
             mock_read_query.return_value = []
 
             expected = None
-            result = topics.get_by_id(topic_id)
+            result = await topics.get_by_id(topic_id)
 
             self.assertEqual(expected, result)
           
         
-    def test_exists_returns_True_when_topicIsPresent(self):
+    async def test_exists_returns_True_when_topicIsPresent(self):
         with patch('services.topics_services.read_query') as mock_read_query:
             mock_read_query.return_value = [(1)]
         
-            result = topics.exists(TOPIC_ID)
+            result = await topics.exists(TOPIC_ID)
         
             self.assertTrue(result)
                
                
-    def test_exists_returns_False_when_noTopic(self):
+    async def test_exists_returns_False_when_noTopic(self):
         with patch('services.topics_services.read_query') as mock_read_query:
             mock_read_query.return_value = []
         
-            result = topics.exists(TOPIC_ID)
+            result = await topics.exists(TOPIC_ID)
         
             self.assertFalse(result)
         
         
-    def test_getTotalCount_returns_countOfTopics_when_SqlAndParams_areProvided(self):
+    async def test_getTotalCount_returns_countOfTopics_when_SqlAndParams_areProvided(self):
         with patch('services.topics_services.query_count') as mock_query_count:
            mock_query_count.return_value = 10
            sql = 'SELECT * FROM table'
            params = ('filter_1', 'filter_2')
            
            expected = 10
-           result = topics.get_total_count(sql, params) 
+           result = await topics.get_total_count(sql, params) 
         
            self.assertEqual(expected, result)
            mock_query_count.assert_called_once_with(
@@ -91,46 +95,59 @@ class TopicsServices_Should(TestCase):
                 ('filter_1', 'filter_2')
             ) 
     
-    def test_getAll_returns_ListOfTopicResponseObjectssAndTotalCount_when_TopicsExist_when_noFilters(self):
+    async def test_getAll_returns_ListOfTopicResponseObjectssAndTotalCount_when_TopicsExist_when_noFilters(self):
         with patch('services.topics_services.read_query') as mock_read_query, \
                 patch('services.topics_services.get_total_count') as mock_get_total_count:
                     
             topic_id_1, topic_id_2, topic_id_3 = 1, 2, 3
-            mock_read_query.return_value = [(topic_id_1, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME),
-                                            (topic_id_2, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME),
-                                            (topic_id_3, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME)]
-            
-            mock_get_total_count.return_value = 3
+            total_count = 7
+            mock_read_query.return_value = [(topic_id_1, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME, total_count),
+                                            (topic_id_2, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME, total_count),
+                                            (topic_id_3, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME, total_count)]
 
             expected_topics = [create_topic(topic_id_1),
                                create_topic(topic_id_2),
                                create_topic(topic_id_3)]
-            expected_total_count = 3
+            expected_total_count = 7
             expected_result = (expected_topics, expected_total_count)
-            result = topics.get_all(page=PAGE, size=SIZE)
+            result = await topics.get_all(page=PAGE, size=SIZE)
 
             self.assertEqual(expected_result, result)
+            mock_get_total_count.assert_not_called()
             
-    def test_getAll_returnsEmptyTuple_whenNoTopics(self): 
+    async def test_getAll_returnsEmptyTuple_whenNoTopics(self): 
         with patch('services.topics_services.read_query') as mock_read_query, \
                 patch('services.topics_services.get_total_count') as mock_get_total_count: 
                     
             mock_read_query.return_value = []  
-            mock_get_total_count.return_value = 0
             expected_result = ([], 0)  
             
-            result = topics.get_all(page=PAGE, size=SIZE)
+            result = await topics.get_all(page=PAGE, size=SIZE)
 
             self.assertEqual(expected_result, result) 
+            mock_get_total_count.assert_not_called()
+
+    async def test_getAll_fallsBackToTotalCount_whenPagePastTheEnd(self):
+        with patch('services.topics_services.read_query') as mock_read_query, \
+                patch('services.topics_services.get_total_count') as mock_get_total_count:
+
+            mock_read_query.return_value = []
+            mock_get_total_count.return_value = 3
+
+            result = await topics.get_all(page=5, size=SIZE)
+
+            self.assertEqual(([], 3), result)
+            mock_get_total_count.assert_called_once()
     
-    def test_getAll_checksIf_ReadQueryCalled_withCorrectSqlAndParams_whenSearchFilter(self):
+    async def test_getAll_checksIf_ReadQueryCalled_withCorrectSqlAndParams_whenSearchFilter(self):
         with patch('services.topics_services.read_query') as mock_read_query, \
                 patch('services.topics_services.get_total_count') as mock_get_total_count:
                     
             mock_get_total_count.return_value = 1
                    
             expected_sql= (
-    'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name ' 
+    'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name, '
+    'COUNT(*) OVER() '
     'FROM topics t ' 
     'JOIN users u ON t.user_id = u.user_id ' 
     'JOIN categories c ON t.category_id = c.category_id ' 
@@ -142,59 +159,165 @@ class TopicsServices_Should(TestCase):
             offset = SIZE * (PAGE - 1)  
             expected_params = (f'%{search_filter}%', limit, offset) 
             
-            topics.get_all(PAGE, SIZE, search=search_filter)                                    
+            await topics.get_all(PAGE, SIZE, search=search_filter)                                    
             mock_read_query.assert_called_with(expected_sql, expected_params)
             
     
-    def test_getAll_checksIf_ReadQueryCalled_withCorrectSqlAndParams_whenAllFiltersAndSortApplied(self):
+    async def test_getAll_checksIf_ReadQueryCalled_withCorrectSqlAndParams_whenAllFiltersAndSortApplied(self):
         with patch('services.topics_services.read_query') as mock_read_query, \
                 patch('services.topics_services.get_total_count') as mock_get_total_count:
                     
             mock_get_total_count.return_value = 1
                    
             expected_sql = (
-    'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name '
+    'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name, '
+    'COUNT(*) OVER() '
     'FROM topics t '
     'JOIN users u ON t.user_id = u.user_id '
     'JOIN categories c ON t.category_id = c.category_id '
     'WHERE t.title LIKE ? '
-    'AND u.username = ? '
-    'AND c.name = ? '
+    'AND t.user_id = ? '
+    'AND t.category_id = ? '
     'AND t.is_locked = ? '
     'ORDER BY title IS NULL, title ASC '
     'LIMIT ? OFFSET ?'
 )
                           
             search_filter = 'example'
-            username_filter = AUTHOR
-            category_filter = CATEGORY_NAME
+            user_id_filter = USER_ID
+            category_id_filter = CATEGORY_ID
             status_filter = 0
             sort = 'asc'
             sort_by = 'title'
             limit = SIZE
             offset = SIZE * (PAGE - 1)  
-            expected_params = (f'%{search_filter}%', username_filter, category_filter, status_filter, limit, offset) 
+            expected_params = (f'%{search_filter}%', user_id_filter, category_id_filter, status_filter, limit, offset) 
             
-            topics.get_all(PAGE,
-                           SIZE, 
-                           search=search_filter, 
-                           username=username_filter,
-                           category=category_filter,
-                           status='open',
-                           sort=sort,
-                           sort_by=sort_by
+            await topics.get_all(PAGE,
+                                 SIZE, 
+                                 search=search_filter, 
+                                 user_id=user_id_filter,
+                                 category_id=category_id_filter,
+                                 status='open',
+                                 sort=sort,
+                                 sort_by=sort_by
                        ) 
                                                
             mock_read_query.assert_called_with(expected_sql, expected_params)
             
               
-    def test_create_returnsTopicId(self):
+    async def test_getAll_usesCachedTotal_andSkipsWindowCount(self):
+        with patch('services.topics_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [(TOPIC_ID, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME, 7)]
+            await topics.get_all(page=PAGE, size=SIZE, search='Title')
+
+            mock_read_query.return_value = [(TOPIC_ID, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME)]
+            result = await topics.get_all(page=PAGE, size=SIZE, search='title')
+
+            self.assertEqual(([create_topic(TOPIC_ID)], 7), result)
+            self.assertNotIn('COUNT(*) OVER()', mock_read_query.call_args.args[0])
+
+    async def test_create_invalidatesOnlyCountsTheNewTopicCanBeIn(self):
+        with patch('services.topics_services.insert_query') as mock_insert_query:
+            mock_insert_query.return_value = TOPIC_ID
+            for key in [(None, None, None, None), ('river', None, None, None),
+                        ('cake', None, None, None), (None, None, None, 'locked'),
+                        (None, None, CATEGORY_ID + 1, None), (None, USER_ID, CATEGORY_ID, None)]:
+                topics._total_counts.put(key, 1)
+
+            await topics.create(TopicCreate(title='Fishing by the river', category_id=CATEGORY_ID), USER_ID)
+
+            self.assertIsNone(topics._total_counts.get((None, None, None, None)))
+            self.assertIsNone(topics._total_counts.get(('river', None, None, None)))
+            self.assertEqual(1, topics._total_counts.get(('cake', None, None, None)))
+            self.assertEqual(1, topics._total_counts.get((None, None, None, 'locked')))
+            self.assertEqual(1, topics._total_counts.get((None, None, CATEGORY_ID + 1, None)))
+            self.assertIsNone(topics._total_counts.get((None, USER_ID, CATEGORY_ID, None)))
+
+    async def test_updateLocking_invalidatesOnlyCountsFilteredByStatus(self):
+        with patch('services.topics_services.update_query'):
+            topics._total_counts.put((None, None, None, None), 1)
+            topics._total_counts.put((None, None, None, 'open'), 1)
+
+            await topics.update_locking(True, TOPIC_ID)
+
+            self.assertEqual(1, topics._total_counts.get((None, None, None, None)))
+            self.assertIsNone(topics._total_counts.get((None, None, None, 'open')))
+
+    async def test_resolveFilters_returnsIdsFromOneQuery(self):
+        with patch('services.topics_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [(USER_ID, None)]
+
+            result = await topics.resolve_filters(AUTHOR, 'no such category')
+
+            self.assertEqual((USER_ID, None), result)
+            mock_read_query.assert_called_once()
+            self.assertEqual((AUTHOR, 1, 'no such category'), mock_read_query.call_args.args[1])
+
+    async def test_resolveFilters_skipsQuery_whenNoFilters(self):
+        with patch('services.topics_services.read_query') as mock_read_query:
+            self.assertEqual((None, None), await topics.resolve_filters())
+            mock_read_query.assert_not_called()
+
+    def test_parseCursor_returnsFirstPage_whenNoCursor(self):
+        self.assertEqual({'s': 'title:desc', 'd': 'next'}, topics.parse_cursor(None, 'DESC', 'title'))
+
+    def test_parseCursor_returnsNone_whenCursorMalformedOrForAnotherSort(self):
+        cursor = encode_cursor({'s': 'title:asc', 'd': 'next', 'k': [TITLE, TOPIC_ID]})
+
+        self.assertIsNone(topics.parse_cursor('not a cursor', 'asc', 'title'))
+        self.assertIsNone(topics.parse_cursor(cursor, 'desc', 'title'))
+        self.assertEqual([TITLE, TOPIC_ID], topics.parse_cursor(cursor, 'asc', 'title')['k'])
+
+    async def test_getAllKeyset_returnsFirstPageAndNextCursor_whenMoreTopics(self):
+        with patch('services.topics_services.read_query') as mock_read_query, \
+                patch('services.topics_services.get_total_count') as mock_get_total_count:
+
+            mock_read_query.return_value = [(1, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME),
+                                            (2, TITLE, USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME)]
+            mock_get_total_count.return_value = 2
+
+            result, total_count, next_cursor, prev_cursor, _ = await topics.get_all_keyset(
+                SIZE, topics.parse_cursor(None))
+
+            self.assertEqual([create_topic(1)], result)
+            self.assertEqual(2, total_count)
+            self.assertEqual({'s': 'topic_id:asc', 'd': 'next', 'k': [1, 1]}, decode_cursor(next_cursor))
+            self.assertIsNone(prev_cursor)
+            mock_read_query.assert_called_once_with(
+                'SELECT t.topic_id, t.title, t.user_id, u.username, t.is_locked, t.best_reply_id, t.category_id, c.name '
+                'FROM topics t '
+                'JOIN users u ON t.user_id = u.user_id '
+                'JOIN categories c ON t.category_id = c.category_id '
+                ' ORDER BY t.topic_id ASC LIMIT ?',
+                (SIZE + 1,))
+
+    async def test_getAllKeyset_seeksBeforeKeyAndReversesPage_whenReadingBackwards(self):
+        with patch('services.topics_services.read_query') as mock_read_query, \
+                patch('services.topics_services.get_total_count') as mock_get_total_count:
+
+            mock_read_query.return_value = [(3, 'b', USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME),
+                                            (2, 'a', USER_ID, AUTHOR, STATUS_OPEN, BEST_REPLY_ID, CATEGORY_ID, CATEGORY_NAME)]
+            mock_get_total_count.return_value = 5
+            position = {'s': 'title:asc', 'd': 'prev', 'k': ['c', 4]}
+
+            result, _, next_cursor, prev_cursor, _ = await topics.get_all_keyset(2, position, search='example')
+
+            self.assertEqual([create_topic(2, 'a'), create_topic(3, 'b')], result)
+            self.assertEqual(['b', 3], decode_cursor(next_cursor)['k'])
+            self.assertIsNone(prev_cursor)
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('WHERE t.title LIKE ? AND (t.title < ? OR (t.title = ? AND t.topic_id < ?))', sql)
+            self.assertIn('ORDER BY t.title DESC, t.topic_id DESC LIMIT ?', sql)
+            self.assertEqual(('%example%', 'c', 'c', 4, 3), params)
+
+    async def test_create_returnsTopicId(self):
         with patch('services.topics_services.insert_query') as mock_insert_query:
             topic_id = 1
             mock_insert_query.return_value = topic_id
 
             expected = 1
-            result = topics.create(topic=TopicCreate(title=TITLE, category_id=CATEGORY_ID), user_id=USER_ID)
+            result = await topics.create(topic=TopicCreate(title=TITLE, category_id=CATEGORY_ID), user_id=USER_ID)
 
             self.assertEqual(expected, result)
 
@@ -204,33 +327,37 @@ class TopicsServices_Should(TestCase):
     #         mock_insert_query.side_effect = IntegrityError("Integrity constraint violated")
     
     #         with self.assertRaises(IntegrityError):
-    #              topics.create(topic=TopicCreate(title=TITLE, category_id=CATEGORY_ID), user_id=USER_ID)   
+    #              await topics.create(topic=TopicCreate(title=TITLE, category_id=CATEGORY_ID), user_id=USER_ID)   
 
     
-    def test_updateBestReply_updatesBestReplyId_returns_Message(self):
-        with patch('services.topics_services.update_query') as mock_update_query:
+    async def test_updateBestReply_updatesBestReplyId_returns_Message(self):
+        with patch('services.topics_services.update_query') as mock_update_query, \
+                patch('services.topics_services.read_query') as mock_read_query, \
+                patch('services.topics_services.best_reply_changed') as mock_best_reply_changed:
             best_reply_id = 1
+            mock_read_query.return_value = [(None,)]
         
             expected = f"Best Reply Id updated to {best_reply_id}"
-            result = topics.update_best_reply(TOPIC_ID, best_reply_id)
+            result = await topics.update_best_reply(TOPIC_ID, best_reply_id)
             
             self.assertEqual(expected, result)
+            mock_best_reply_changed.assert_called_once_with(None, best_reply_id)
             
     
-    def test_get_topic_replies_returnsListWithReplies_whenExist(self):
+    async def test_get_topic_replies_returnsListWithReplies_whenExist(self):
         pass  
     
-    def test_get_topic_replies_returnsEmptyList_whenNoReplies(self):
+    async def test_get_topic_replies_returnsEmptyList_whenNoReplies(self):
         pass    
           
-    def test_validate_topic_access_returnsErrorResponse_whenTopicNotExist(self):
+    async def test_validate_topic_access_returnsErrorResponse_whenTopicNotExist(self):
         pass
     
-    def test_validate_topic_access_returnsErrorResponse_whenTopicIsLocked(self):
+    async def test_validate_topic_access_returnsErrorResponse_whenTopicIsLocked(self):
         pass
     
-    def test_validate_topic_access_returnsErrorResponse_whenUserIsNotOwner(self):
+    async def test_validate_topic_access_returnsErrorResponse_whenUserIsNotOwner(self):
         pass
     
-    def test_validate_topic_access_returnsNone_whenValidatingSuccessful(self):
+    async def test_validate_topic_access_returnsNone_whenValidatingSuccessful(self):
         pass
\ No newline at end of file
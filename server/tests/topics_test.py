@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
 from unittest.mock import Mock, patch
 from routers import topics as topics_router
 from routers.replies import HTTPException
@@ -70,18 +70,16 @@ def fake_category(is_private: bool = False , is_locked: bool = False):
 
     return category
     
-class TopicsRouter_Should(TestCase):
+class TopicsRouter_Should(IsolatedAsyncioTestCase):
       
-    def test_getAllTopics_returnsTopicPaginateObject_when_TopicsExist(self):
-        with patch('services.users_services.exists_by_username') as mock_exists_by_username, \
-          patch('services.categories_services.exists_by_name') as mock_exists_by_name, \
+    async def test_getAllTopics_returnsTopicPaginateObject_when_TopicsExist(self):
+        with patch('services.topics_services.resolve_filters') as mock_resolve_filters, \
           patch('services.topics_services.get_topics_paginate_links') as mock_topics_paginate_links:
             
             fake_topics_total = 1   
             pagination_info = create_pagination_info(fake_topics_total)
                         
-            mock_exists_by_username.return_value = True
-            mock_exists_by_name.return_value = True
+            mock_resolve_filters.return_value = (None, None)
             mock_topics_paginate_links.return_value = ([TestTopic.OBJ], pagination_info, FAKE_LINKS)
                          
             expected_result = TopicsPaginate(
@@ -89,79 +87,100 @@ class TopicsRouter_Should(TestCase):
                            pagination_info=pagination_info,
                            links=FAKE_LINKS
                            )
-            result = topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE)
+            result = await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE)
             
             self.assertEqual(expected_result, result)
             
             
-    def test_getAllTopics_returnsEmptyList_when_NoTopics(self):
-        with patch('services.users_services.exists_by_username') as mock_exists_by_username, \
-          patch('services.categories_services.exists_by_name') as mock_exists_by_name, \
+    async def test_getAllTopics_returnsEmptyList_when_NoTopics(self):
+        with patch('services.topics_services.resolve_filters') as mock_resolve_filters, \
           patch('services.topics_services.get_topics_paginate_links') as mock_topics_paginate_links:
                 
             fake_topics_total = 0
             pagination_info = create_pagination_info(fake_topics_total)
-            mock_exists_by_username.return_value = True
-            mock_exists_by_name.return_value = True
+            mock_resolve_filters.return_value = (None, None)
             mock_topics_paginate_links.return_value = ([], pagination_info, FAKE_LINKS )
             
             expected_result = []
-            result = topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE)
+            result = await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE)
             
             self.assertEqual(expected_result, result)
             
             
-    def test_getAllTopics_raisesHTTPException_whenUsernameNotExists(self):
-        with patch('services.users_services.exists_by_username') as mock_exists_by_username:
+    async def test_getAllTopics_raisesHTTPException_whenUsernameNotExists(self):
+        with patch('services.topics_services.resolve_filters') as mock_resolve_filters:
               
-            mock_exists_by_username.return_value = False 
+            mock_resolve_filters.return_value = (None, None)
     
             with self.assertRaises(HTTPException) as ex:
-                topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, username='fake_username')
+                await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, username='fake_username')
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('User not found', ex.exception.detail)
             
                 
-    def test_getAllTopics_raisesHTTPException_whenCategoryNotExists(self):
-        with patch('services.categories_services.exists_by_name') as mock_exists_by_name:
-            mock_exists_by_name.return_value = False
+    async def test_getAllTopics_raises404_whenUsernameBelongsToDeletedUser(self):
+        with patch('services.topics_services.read_query') as mock_read_query:
+            # the users subquery skips deleted users, so a deleted author resolves to no user_id
+            mock_read_query.return_value = [(None, None)]
 
             with self.assertRaises(HTTPException) as ex:
-                topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, category='fake_category')
+                await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, username='deleted_user')
+
+            self.assertEqual(SC.NotFound, ex.exception.status_code)
+            self.assertEqual('User not found', ex.exception.detail)
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('NOT is_deleted = ?', sql)
+            self.assertEqual(('deleted_user', 1, None), params)
+                
+    async def test_getAllTopics_raisesHTTPException_whenCategoryNotExists(self):
+        with patch('services.topics_services.resolve_filters') as mock_resolve_filters:
+            mock_resolve_filters.return_value = (None, None)
+
+            with self.assertRaises(HTTPException) as ex:
+                await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, category='fake_category')
                 
             self.assertEqual(404, ex.exception.status_code)
             self.assertEqual('Category not found', ex.exception.detail)
                 
                 
-    def test_getAllTopics_raisesHTTPException_whenInvalidStatusParameterProvided(self):
+    async def test_getAllTopics_raisesHTTPException_whenInvalidStatusParameterProvided(self):
         
         with self.assertRaises(HTTPException) as ex:
-                topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, status='invalid status')
+                await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, status='invalid status')
 
                 self.assertEqual(400, ex.exception.status_code)
                 self.assertEqual('Invalid status value', ex.exception.detail)
                 
                 
-    def test_getAllTopics_raisesHTTPException_whenInvalidSortParameterProvided(self):
+    async def test_getAllTopics_raisesHTTPException_whenInvalidSortParameterProvided(self):
         
         with self.assertRaises(HTTPException) as ex:
-                topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, sort='invalid sort')
+                await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, sort='invalid sort')
 
                 self.assertEqual(400, ex.exception.status_code)
                 self.assertEqual('Invalid sort parameter', ex.exception.detail)
                 
                 
-    def test_getAllTopics_raisesHTTPException_whenInvalidSort_byParameterProvided(self):
+    async def test_getAllTopics_raisesHTTPException_whenInvalidSort_byParameterProvided(self):
         
         with self.assertRaises(HTTPException) as ex:
-                topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, sort_by='invalid sort_by')
+                await topics_router.get_all_topics(Mock(), page=PAGE, size=SIZE, sort_by='invalid sort_by')
 
                 self.assertEqual(400, ex.exception.status_code)
                 self.assertEqual('Invalid sort_by parameter', ex.exception.detail)
                 
                 
-    def test_getTopicById_returnsTopicRepliesPaginateObject_when_TopicsExist_userHasAccessToTopic(self):
+    async def test_getAllTopics_raisesHTTPException_whenInvalidCursorProvided(self):
+
+        with self.assertRaises(HTTPException) as ex:
+            await topics_router.get_all_topics(Mock(), page=None, size=SIZE, cursor='invalid cursor')
+
+        self.assertEqual(400, ex.exception.status_code)
+        self.assertEqual('Invalid cursor', ex.exception.detail)
+
+
+    async def test_getTopicById_returnsTopicRepliesPaginateObject_when_TopicsExist_userHasAccessToTopic(self):
         with patch('services.topics_services.get_by_id') as mock_topic_by_id, \
           patch('services.categories_services.get_by_id') as mock_category_by_id, \
           patch('services.categories_services.has_access_to_private_category') as mock_access, \
@@ -179,37 +198,37 @@ class TopicsRouter_Should(TestCase):
                            pagination_info=pagination_info,
                            links=FAKE_LINKS
                            )
-            result = topics_router.get_topic_by_id(TestTopic.ID, Mock(), Mock(), page=PAGE, size=SIZE)
+            result = await topics_router.get_topic_by_id(TestTopic.ID, Mock(), Mock(), page=PAGE, size=SIZE)
             
             self.assertEqual(expected_result, result)
         
         
-    def test_getTopicById_raisesHTTPException_whenTopicNotExists(self):
+    async def test_getTopicById_raisesHTTPException_whenTopicNotExists(self):
         with patch('services.topics_services.get_by_id') as mock_topic_by_id:
               
             mock_topic_by_id.return_value = None 
     
             with self.assertRaises(HTTPException) as ex:
-                topics_router.get_topic_by_id(TestTopic.ID, Mock(), Mock(), page=PAGE, size=SIZE)
+                await topics_router.get_topic_by_id(TestTopic.ID, Mock(), Mock(), page=PAGE, size=SIZE)
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('Topic #ID:1 does not exist', ex.exception.detail)
                 
                 
-    def test_getTopicById_raisesHTTPException_whenCategoryPrivate_userNoPermission(self):
+    async def test_getTopicById_raisesHTTPException_whenCategoryPrivate_userNoPermission(self):
         with patch('services.categories_services.get_by_id') as mock_category_by_id:
             
             mock_category_by_id.return_value = fake_category(is_private=True)
             anonymous_user = topics_router.AnonymousUser()
  
             with self.assertRaises(HTTPException) as ex:
-                topics_router.get_topic_by_id(TestTopic.ID, anonymous_user, Mock(), page=PAGE, size=SIZE)
+                await topics_router.get_topic_by_id(TestTopic.ID, anonymous_user, Mock(), page=PAGE, size=SIZE)
 
                 self.assertEqual(401, ex.exception.status_code)
                 self.assertEqual('Login to view topics in private categories', ex.exception.detail)
                 
                 
-    def test_getTopicById_raisesHTTPException_whenUserHasNotAccessToTopic(self):
+    async def test_getTopicById_raisesHTTPException_whenUserHasNotAccessToTopic(self):
         with patch('services.topics_services.get_by_id') as mock_topic_by_id, \
           patch('services.categories_services.get_by_id') as mock_category_by_id, \
           patch('services.categories_services.has_access_to_private_category') as mock_access:
@@ -219,13 +238,13 @@ class TopicsRouter_Should(TestCase):
             mock_access.return_value = False
         
             with self.assertRaises(HTTPException) as ex:
-                topics_router.get_topic_by_id(TestTopic.ID, fake_user(), Mock(), page=PAGE, size=SIZE)
+                await topics_router.get_topic_by_id(TestTopic.ID, fake_user(), Mock(), page=PAGE, size=SIZE)
 
                 self.assertEqual(403, ex.exception.status_code)
                 self.assertEqual('You do not have permission to access this private category', ex.exception.detail)
                 
                 
-    def test_createTopic_returnsCorrectMsg_whenCategoryExistsAndNotLockedNotPrivate_userHasAccessToCategory(self):
+    async def test_createTopic_returnsCorrectMsg_whenCategoryExistsAndNotLockedNotPrivate_userHasAccessToCategory(self):
         with patch('services.categories_services.get_by_id') as mock_category_by_id, \
           patch('services.topics_services.create') as mock_create:
                 
@@ -234,25 +253,25 @@ class TopicsRouter_Should(TestCase):
             new_topic= topics_router.TopicCreate(title='TestTitle', category_id=TestCategory.ID)
             
             expected = f'Topic 1 was successfully created!'
-            result = topics_router.create_topic(new_topic, fake_user())
+            result = await topics_router.create_topic(new_topic, fake_user())
 
             self.assertEqual(expected, result)
             
             
-    def test_createTopic_raisesHTTPException_whenCategoryNotExists(self):
+    async def test_createTopic_raisesHTTPException_whenCategoryNotExists(self):
         with patch('services.categories_services.get_by_id') as mock_category_by_id:
               
             mock_category_by_id.return_value = None 
             new_topic= topics_router.TopicCreate(title='TestTitle', category_id=TestCategory.ID)
     
             with self.assertRaises(HTTPException) as ex:
-                topics_router.create_topic(new_topic, fake_user())
+                await topics_router.create_topic(new_topic, fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('Category #ID:1 does not exist', ex.exception.detail)
               
               
-    def test_createTopic_raisesHTTPException_whenCategoryIsLocked(self):
+    async def test_createTopic_raisesHTTPException_whenCategoryIsLocked(self):
         with patch('services.categories_services.get_by_id') as mock_category_by_id:
             
             category = TestCategory.OBJ
@@ -261,12 +280,12 @@ class TopicsRouter_Should(TestCase):
             new_topic= topics_router.TopicCreate(title='TestTitle', category_id=TestCategory.ID)
     
             with self.assertRaises(HTTPException) as ex:
-                topics_router.create_topic(new_topic, fake_user())
+                await topics_router.create_topic(new_topic, fake_user())
 
                 self.assertEqual(403, ex.exception.status_code)
                 self.assertEqual('Category #ID:1, Name: TestName is locked', ex.exception.detail)
                 
-    def test_createTopic_raisesHTTPException_whenCategoryPrivate_userNoPermission(self):
+    async def test_createTopic_raisesHTTPException_whenCategoryPrivate_userNoPermission(self):
         with patch('services.categories_services.get_by_id') as mock_category_by_id, \
           patch('services.categories_services.has_write_access') as mock_write_access:
             
@@ -277,7 +296,7 @@ class TopicsRouter_Should(TestCase):
             new_topic= topics_router.TopicCreate(title='TestTitle', category_id=TestCategory.ID)
 
             with self.assertRaises(HTTPException) as ex:
-                topics_router.create_topic(new_topic, fake_user())
+                await topics_router.create_topic(new_topic, fake_user())
 
                 self.assertEqual(403, ex.exception.status_code)
                 self.assertEqual('You do not have permission to post in this private category', ex.exception.detail)
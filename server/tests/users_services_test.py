@@ -1,150 +1,242 @@
 import unittest
 from unittest.mock import patch
 from data.models.user import UserInfo, UserUpdate, User, UserRegister
+from data import database
 from services import users_services as users
 from services.users_services import IntegrityError
-from tests.test_utils import EMAIL, FIRST_NAME, LAST_NAME, USER_ID, USERNAME, PASSWORD, create_user, create_user_info
+from tests.test_utils import async_iter, EMAIL, FIRST_NAME, LAST_NAME, USER_ID, USERNAME, PASSWORD, create_user, create_user_info
 
 
 username1, username2, username3 = 'user1', 'user2', 'user3'
 
 
-class UsersServices_Should(unittest.TestCase):
+class UsersServices_Should(unittest.IsolatedAsyncioTestCase):
 
-    def test_getAll_returnsListOfUserInfoObjects_ifUsers(self):
-        with patch('services.users_services.read_query') as mock_get_all_users:
+    def setUp(self):
+        users._users.clear()
+        users._user_ids.clear()
 
-            mock_get_all_users.return_value = [(username1, EMAIL, FIRST_NAME, LAST_NAME),
-                                               (username2, EMAIL,
-                                                FIRST_NAME, LAST_NAME),
-                                               (username3, EMAIL, FIRST_NAME, LAST_NAME)]
+    async def test_getAll_yieldsUserInfoObjects_ifUsers(self):
+        with patch('services.users_services.read_query_iter') as mock_get_all_users:
+
+            mock_get_all_users.return_value = async_iter([(username1, EMAIL, FIRST_NAME, LAST_NAME),
+                                                          (username2, EMAIL, FIRST_NAME, LAST_NAME),
+                                                          (username3, EMAIL, FIRST_NAME, LAST_NAME)])
 
             expected = [create_user_info(username1),
                         create_user_info(username2),
                         create_user_info(username3)]
 
-            actual = users.get_all()
+            actual = [user async for user in users.get_all()]
 
             self.assertEqual(expected, actual)
 
-    def test_getAll_returnsEmptyList_ifNotUsers(self):
-        with patch('services.users_services.read_query') as mock_get_all_users:
-            mock_get_all_users.return_value = []
+    async def test_getAll_yieldsNothing_ifNotUsers(self):
+        with patch('services.users_services.read_query_iter') as mock_get_all_users:
+            mock_get_all_users.return_value = async_iter([])
             expected = []
 
-            actual = users.get_all()
+            actual = [user async for user in users.get_all()]
 
             self.assertEqual(expected, actual)
 
-    def test_getById_returnsUserInfoObject_ifUser(self):
+    async def test_getById_returnsUserInfoObject_ifUser(self):
         with patch('services.users_services.read_query') as mock_get_user:
             mock_get_user.return_value = [
                 (username1, EMAIL, FIRST_NAME, LAST_NAME)]
             expected = create_user_info(username1)
 
-            actual = users.get_by_id(user_id=USER_ID)
+            actual = await users.get_by_id(user_id=USER_ID)
 
             self.assertEqual(expected, actual)
 
-    def test_getById_returnsNone_ifNotUser(self):
+    async def test_getById_returnsNone_ifNotUser(self):
         with patch('services.users_services.read_query') as mock_get_user:
             mock_get_user.return_value = []
             expected = None
 
-            actual = users.get_by_id(user_id=USER_ID)
+            actual = await users.get_by_id(user_id=USER_ID)
 
             self.assertEqual(expected, actual)
 
-    def test_findByUsername_returnsUser_ifUser(self):
+    async def test_findByUsername_returnsUser_ifUser(self):
         with patch('services.users_services.read_query') as mock_find_by_name:
             mock_find_by_name.return_value = [
                 (USER_ID, USERNAME, PASSWORD, EMAIL, FIRST_NAME, LAST_NAME, False)]
             expected = create_user()
 
-            actual = users.find_by_username(username=USERNAME)
+            actual = await users.find_by_username(username=USERNAME)
 
             self.assertEqual(expected, actual)
 
-    def test_findByUsername_returnsNone_ifNotUser(self):
+    async def test_findByUsername_returnsNone_ifNotUser(self):
         with patch('services.users_services.read_query') as mock_find_by_name:
             mock_find_by_name.return_value = []
             expected = None
 
-            actual = users.find_by_username(username=USERNAME)
+            actual = await users.find_by_username(username=USERNAME)
 
             self.assertEqual(expected, actual)
 
-    def test_registerReturnsUser_ifSuccessful(self):
-        with patch('services.users_services.hash_pass') as mock_hash_pass, \
+    async def test_findByUsernameCached_queriesOnce_forRepeatedLookups(self):
+        with patch('services.users_services.find_by_username') as mock_find_user:
+            mock_find_user.return_value = create_user()
+
+            first = await users.find_by_username_cached(USERNAME)
+            second = await users.find_by_username_cached(USERNAME)
+
+            self.assertEqual(first, second)
+            mock_find_user.assert_called_once_with(USERNAME)
+            self.assertEqual(1, users.user_cache_stats()['hits'])
+
+    async def test_findByUsernameCached_returnsCopies(self):
+        with patch('services.users_services.find_by_username') as mock_find_user:
+            mock_find_user.return_value = create_user()
+
+            (await users.find_by_username_cached(USERNAME)).password = 'changed'
+
+            self.assertEqual(PASSWORD, (await users.find_by_username_cached(USERNAME)).password)
+
+    async def test_findByUsernameCached_doesNotCache_missingUsers(self):
+        with patch('services.users_services.find_by_username') as mock_find_user:
+            mock_find_user.return_value = None
+
+            self.assertIsNone(await users.find_by_username_cached(USERNAME))
+            self.assertIsNone(await users.find_by_username_cached(USERNAME))
+
+            self.assertEqual(2, mock_find_user.call_count)
+
+    async def test_changePassword_invalidatesCachedUser(self):
+        with patch('services.users_services.find_by_username') as mock_find_user, \
+                patch('services.users_services.update_query'):
+            mock_find_user.return_value = create_user()
+            await users.find_by_username_cached(USERNAME)
+
+            await users.change_password(USER_ID, 'new hash')
+            mock_find_user.return_value = create_user().model_copy(update={'password': 'new hash'})
+
+            self.assertEqual('new hash', (await users.find_by_username_cached(USERNAME)).password)
+            self.assertEqual(2, mock_find_user.call_count)
+
+    async def test_delete_invalidatesCachedUser(self):
+        with patch('services.users_services.find_by_username') as mock_find_user, \
+                patch('services.users_services.update_query'):
+            mock_find_user.return_value = create_user()
+            await users.find_by_username_cached(USERNAME)
+
+            await users.delete(USER_ID)
+            mock_find_user.return_value = None
+
+            self.assertIsNone(await users.find_by_username_cached(USERNAME))
+
+    async def test_registerReturnsUser_ifSuccessful(self):
+        with patch('services.users_services.hash_password') as mock_hash_pass, \
                 patch('services.users_services.insert_query') as mock_register_user:
 
             mock_hash_pass.return_value = PASSWORD
             mock_register_user.return_value = USER_ID
             expected = USER_ID
 
-            actual = users.register(user=UserRegister(username=USERNAME,
-                                                      password=PASSWORD,
-                                                      email=EMAIL,
-                                                      first_name=FIRST_NAME,
-                                                      last_name=LAST_NAME))
+            actual = await users.register(user=UserRegister(username=USERNAME,
+                                                            password=PASSWORD,
+                                                            email=EMAIL,
+                                                            first_name=FIRST_NAME,
+                                                            last_name=LAST_NAME))
 
             self.assertEqual(expected, actual)
 
-    def test_registerReturnsIntegrityError_ifRaised(self):
-        with patch('services.users_services.hash_pass') as mock_hash_pass, \
+    async def test_registerReturnsIntegrityError_ifRaised(self):
+        with patch('services.users_services.hash_password') as mock_hash_pass, \
                 patch('services.users_services.insert_query') as mock_register_user:
 
             mock_hash_pass.return_value = PASSWORD
             mock_register_user.side_effect = IntegrityError
 
-            result = users.register(user=UserRegister(username=USERNAME,
-                                                      password=PASSWORD,
-                                                      email=EMAIL,
-                                                      first_name=FIRST_NAME,
-                                                      last_name=LAST_NAME))
+            result = await users.register(user=UserRegister(username=USERNAME,
+                                                            password=PASSWORD,
+                                                            email=EMAIL,
+                                                            first_name=FIRST_NAME,
+                                                            last_name=LAST_NAME))
             self.assertIsInstance(result, IntegrityError)
 
-    def test_tryLogin_returnsUser_ifUserAndPass(self):
+    async def test_tryLogin_returnsUser_ifUserAndPass(self):
         with patch('services.users_services.find_by_username') as mock_find_user, \
-                patch('services.users_services.verify_password') as mock_verify_pass:
+                patch('services.users_services.verify_and_update') as mock_verify_pass:
 
             user = create_user()
             mock_find_user.return_value = user
-            mock_verify_pass.return_value = True
+            mock_verify_pass.return_value = (True, None)
             excepted = user
 
-            actual = users.try_login(
+            actual = await users.try_login(
                 username=user.username, password=user.password)
 
             self.assertEqual(excepted, actual)
 
-    def test_tryLogin_returnsNone_ifNotUser(self):
+    async def test_tryLogin_rehashesPassword_ifStoredWithAnotherCost(self):
+        with patch('services.users_services.find_by_username') as mock_find_user, \
+                patch('services.users_services.verify_and_update') as mock_verify_pass, \
+                patch('services.users_services.change_password') as mock_change_pass:
+
+            mock_find_user.return_value = create_user()
+            mock_verify_pass.return_value = (True, 'new hash')
+
+            actual = await users.try_login(username=USERNAME, password=PASSWORD)
+
+            mock_change_pass.assert_called_once_with(USER_ID, 'new hash')
+            self.assertEqual('new hash', actual.password)
+
+    async def test_tryLogin_readsUserOutsideRequestUnitOfWork(self):
+        uow = database.begin_unit_of_work()
+        self.addCleanup(database.end_unit_of_work, uow)
+        units_of_work = []
+
+        async def find_user(username):
+            units_of_work.append(database.current_unit_of_work())
+            return create_user()
+
+        async def change_pass(user_id, password):
+            units_of_work.append(database.current_unit_of_work())
+
+        with patch('services.users_services.find_by_username', side_effect=find_user), \
+                patch('services.users_services.verify_and_update') as mock_verify_pass, \
+                patch('services.users_services.change_password', side_effect=change_pass):
+            mock_verify_pass.return_value = (True, 'new hash')
+
+            await users.try_login(username=USERNAME, password=PASSWORD)
+
+        lookup_uow, rehash_uow = units_of_work
+        self.assertIsNone(lookup_uow)
+        self.assertNotIn(rehash_uow, (None, uow))
+        self.assertIs(uow, database.current_unit_of_work())
+
+    async def test_tryLogin_returnsNone_ifNotUser(self):
         with patch('services.users_services.find_by_username') as mock_find_user:
 
             user = create_user()
             mock_find_user.return_value = None
             excepted = None
 
-            actual = users.try_login(
+            actual = await users.try_login(
                 username=user.username, password=user.password)
 
             self.assertEqual(excepted, actual)
 
-    def test_tryLogin_returnsNone_ifUserAndNotPass(self):
+    async def test_tryLogin_returnsNone_ifUserAndNotPass(self):
         with patch('services.users_services.find_by_username') as mock_find_user, \
-                patch('services.users_services.verify_password') as mock_verify_pass:
+                patch('services.users_services.verify_and_update') as mock_verify_pass:
 
             user = create_user()
             mock_find_user.return_value = user
-            mock_verify_pass.return_value = False
+            mock_verify_pass.return_value = (False, None)
             excepted = None
 
-            actual = users.try_login(
+            actual = await users.try_login(
                 username=user.username, password=user.password)
 
             self.assertEqual(excepted, actual)
 
-    def test_updateReturnsUserUpdateObject_ifUpdates(self):
+    async def test_updateReturnsUserUpdateObject_ifUpdates(self):
         with patch('services.users_services.update_query') as mock_update:
             mock_update.return_value = True
             user = create_user()
@@ -152,11 +244,11 @@ class UsersServices_Should(unittest.TestCase):
             expected = UserUpdate(first_name=edited_user.first_name,
                                   last_name=user.last_name)
 
-            actual = users.update(old=user, new=edited_user)
+            actual = await users.update(old=user, new=edited_user)
 
             self.assertEqual(expected, actual)
 
-    def test_updateReturnsUserUpdateObject_ifNotUpdates(self):
+    async def test_updateReturnsUserUpdateObject_ifNotUpdates(self):
         with patch('services.users_services.update_query') as mock_update:
             mock_update.return_value = True
             user = create_user()
@@ -164,6 +256,6 @@ class UsersServices_Should(unittest.TestCase):
             expected = UserUpdate(first_name=user.first_name,
                                   last_name=user.last_name)
 
-            actual = users.update(old=user, new=edited_user)
+            actual = await users.update(old=user, new=edited_user)
 
             self.assertEqual(expected, actual)
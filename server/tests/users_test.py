@@ -1,13 +1,23 @@
+import json
 import unittest
 from unittest.mock import Mock, patch
 from routers import users
 from routers.users import HTTPException, OAuth2PasswordRequestForm
-from tests.test_utils import create_user_info, create_user, USERNAME, PASSWORD, EMAIL, fake_token, USER_ID, fake_user
+from tests.test_utils import async_iter, create_user_info, create_user, USERNAME, PASSWORD, EMAIL, fake_token, USER_ID, fake_user
 from data.models.user import UserDelete, UserRegister, UserUpdate, UserChangePassword
 
 
-class UsersRouter_Should(unittest.TestCase):
-    def test_registerUser_returnsSuccessMessage_ifUserRegistered(self):
+def fake_request():
+    return Mock(client=Mock(host='127.0.0.1'))
+
+
+class UsersRouter_Should(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        users.users_services._login_attempts_by_username.clear()
+        users.users_services._login_attempts_by_ip.clear()
+
+    async def test_registerUser_returnsSuccessMessage_ifUserRegistered(self):
         with patch('routers.users.users_services.register') as mock_register:
 
             user = create_user()
@@ -16,11 +26,11 @@ class UsersRouter_Should(unittest.TestCase):
             mock_register.return_value = user.user_id
             expected = f"User with ID: {user.user_id} registered"
 
-            actual = users.register_user(user=registration_info)
+            actual = await users.register_user(user=registration_info)
 
             self.assertEqual(expected, actual)
 
-    def test_registerUser_raises400_ifIncorrectRegisterData(self):
+    async def test_registerUser_raises400_ifIncorrectRegisterData(self):
         with patch('routers.users.users_services.register') as mock_register:
 
             fake_integrity_error = Mock()
@@ -29,11 +39,11 @@ class UsersRouter_Should(unittest.TestCase):
             mock_register.side_effect = fake_integrity_error
 
             with self.assertRaises(HTTPException) as ex:
-                users.register_user(user=registration_info)
+                await users.register_user(user=registration_info)
 
                 self.assertEqual(400, ex.exception.status_code)
 
-    def test_loginReturnsToken_ifSuccessfulLogin(self):
+    async def test_loginReturnsToken_ifSuccessfulLogin(self):
         with patch('routers.users.users_services.try_login') as mock_try_login, \
                 patch('routers.users.create_access_token') as mock_create_token:
 
@@ -42,71 +52,118 @@ class UsersRouter_Should(unittest.TestCase):
             mock_create_token.return_value = fake_token
             expected = fake_token
 
-            actual = users.login(form_data=OAuth2PasswordRequestForm(
+            actual = await users.login(request=fake_request(), form_data=OAuth2PasswordRequestForm(
                 username=USERNAME, password=PASSWORD))
 
             self.assertEqual(expected, actual)
 
-    def test_loginRaises401_ifIncorrectUsernameOrPassword(self):
+    async def test_loginRaises429_beforeCheckingPassword_whenTooManyAttempts(self):
+        with patch('routers.users.users_services.try_login') as mock_try_login:
+            mock_try_login.return_value = None
+
+            for _ in range(users.users_services.LOGIN_ATTEMPTS_PER_USERNAME):
+                with self.assertRaises(HTTPException):
+                    await users.login(request=fake_request(), form_data=OAuth2PasswordRequestForm(
+                        username=USERNAME, password=PASSWORD))
+
+            with self.assertRaises(HTTPException) as ex:
+                await users.login(request=fake_request(), form_data=OAuth2PasswordRequestForm(
+                    username=USERNAME, password=PASSWORD))
+
+            self.assertEqual(429, ex.exception.status_code)
+            self.assertIn('Retry-After', ex.exception.headers)
+            self.assertEqual(users.users_services.LOGIN_ATTEMPTS_PER_USERNAME, mock_try_login.call_count)
+
+    async def test_loginRaises401_ifIncorrectUsernameOrPassword(self):
         with patch('routers.users.users_services.try_login') as mock_try_login:
 
             mock_try_login.return_value = None
 
             with self.assertRaises(HTTPException) as ex:
 
-                users.login(form_data=OAuth2PasswordRequestForm(
+                await users.login(request=fake_request(), form_data=OAuth2PasswordRequestForm(
                     username=USERNAME, password=PASSWORD))
 
                 self.assertEqual(401, ex.exception.status_code)
                 self.assertEqual("Invalid credentials", ex.exception.detail)
 
-    def test_getAllUsers_returnsUsers(self):
+    async def test_getAllUsers_streamsUsersAsJsonArray(self):
         with patch('routers.users.users_services.get_all') as mock_get_all:
 
-            mock_get_all.return_value = [
-                create_user(), create_user(), create_user()]
-            expected = [create_user(), create_user(), create_user()]
+            mock_get_all.return_value = async_iter([
+                create_user_info('user1'), create_user_info('user2')])
+            expected = [create_user_info('user1').model_dump(), create_user_info('user2').model_dump()]
 
-            actual = users.get_all_users()
+            response = await users.get_all_users()
+            actual = json.loads(''.join([chunk async for chunk in response.body_iterator]))
 
             self.assertEqual(expected, actual)
 
-    def test_getUserById_returnsUser_ifUser(self):
+    async def test_getAllUsers_streamsEmptyArray_ifNoUsers(self):
+        with patch('routers.users.users_services.get_all') as mock_get_all:
+
+            mock_get_all.return_value = async_iter([])
+
+            response = await users.get_all_users()
+            actual = json.loads(''.join([chunk async for chunk in response.body_iterator]))
+
+            self.assertEqual([], actual)
+
+    async def test_getUserById_returnsUser_ifUser(self):
         with patch('routers.users.users_services.get_by_id') as mock_get_by_id:
 
             mock_get_by_id.return_value = create_user_info()
             expected = create_user_info()
 
-            actual = users.get_user_by_id(user_id=USER_ID)
+            actual = await users.get_user_by_id(user_id=USER_ID)
 
             self.assertEqual(expected, actual)
 
-    def test_getUserById_raises404_ifNotUser(self):
+    async def test_getUserById_raises404_ifNotUser(self):
         with patch('routers.users.users_services.get_by_id') as mock_get_by_id:
 
             mock_get_by_id.return_value = None
 
             with self.assertRaises(HTTPException) as ex:
-                users.get_user_by_id(user_id=USER_ID)
+                await users.get_user_by_id(user_id=USER_ID)
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual(f"User with ID: {USER_ID} does\'t exist!",
                                  ex.exception.detail)
 
-    def test_updateUser_returnsUpdatedUser(self):
+    async def test_getUserRank_returnsRankOfUser_ifUser(self):
+        with patch('routers.users.users_services.get_by_id') as mock_get_by_id, \
+                patch('routers.users.reputation_services.get_rank') as mock_get_rank:
+            mock_get_by_id.return_value = create_user_info()
+
+            actual = await users.get_user_rank(user_id=USER_ID)
+
+            self.assertEqual(mock_get_rank.return_value, actual)
+            mock_get_rank.assert_called_once_with(USER_ID, USERNAME)
+
+    async def test_getUserRank_raises404_ifNotUser(self):
+        with patch('routers.users.users_services.get_by_id') as mock_get_by_id:
+            mock_get_by_id.return_value = None
+
+            with self.assertRaises(HTTPException) as ex:
+                await users.get_user_rank(user_id=USER_ID)
+
+            self.assertEqual(404, ex.exception.status_code)
+
+    async def test_updateUser_returnsUpdatedUser(self):
         with patch('routers.users.users_services.update') as mock_update:
             fake_updated_user = Mock(spec=UserUpdate)
             mock_update.return_value = fake_updated_user
             expected = fake_updated_user
 
-            actual = users.update_user(
+            actual = await users.update_user(
                 user=fake_updated_user, existing_user=fake_user())
 
             self.assertEqual(expected, actual)
 
-    def test_changeUserPassword_returnsSuccessMessage_ifSuccessful(self):
-        with patch('routers.users.utils.verify_password') as mock_verify_pass, \
-                patch('routers.users.utils.hash_pass') as mock_hash_pass, \
+    async def test_changeUserPassword_returnsSuccessMessage_ifSuccessful(self):
+        with patch('routers.users.passwords.verify_password') as mock_verify_pass, \
+                patch('routers.users.passwords.hash_password') as mock_hash_pass, \
                 patch('routers.users.users_services.change_password') as mock_change_pass:
             mock_verify_pass.return_value = True
             mock_hash_pass.return_value = PASSWORD
@@ -115,53 +172,53 @@ class UsersRouter_Should(unittest.TestCase):
                 current_password='password', new_password='somepass', confirm_password='somepass')
             expected = 'Password changed successfully'
 
-            actual = users.change_user_password(data, fake_user())
+            actual = await users.change_user_password(data, fake_user())
 
             self.assertEqual(expected, actual)
 
-    def test_changeUserPassword_raises401_ifCurrentPassNotMatch(self):
-        with patch('routers.users.utils.verify_password') as mock_verify_pass:
+    async def test_changeUserPassword_raises401_ifCurrentPassNotMatch(self):
+        with patch('routers.users.passwords.verify_password') as mock_verify_pass:
             mock_verify_pass.return_value = False
             data = Mock()
 
             with self.assertRaises(HTTPException) as ex:
-                users.change_user_password(data, fake_user())
+                await users.change_user_password(data, fake_user())
 
                 self.assertEqual(401, ex.exception.status_code)
                 self.assertEqual(
                     "Current password does not match", ex.exception.detail)
 
-    def test_change_UserPassword_raises401_ifNewPasswordNotMatch(self):
-        with patch('routers.users.utils.verify_password') as mock_verify_pass:
+    async def test_change_UserPassword_raises401_ifNewPasswordNotMatch(self):
+        with patch('routers.users.passwords.verify_password') as mock_verify_pass:
             mock_verify_pass.return_value = True
             data = UserChangePassword(
                 current_password='password', new_password='somepass', confirm_password='pass')
 
             with self.assertRaises(HTTPException) as ex:
-                users.change_user_password(data, fake_user())
+                await users.change_user_password(data, fake_user())
 
                 self.assertEqual(401, ex.exception.status_code)
                 self.assertEqual("New password does not match",
                                  ex.exception.detail)
 
-    def test_deleteReturnsNone_ifSuccess(self):
-        with patch('routers.users.utils.verify_password') as mock_verify_pass, \
+    async def test_deleteReturnsNone_ifSuccess(self):
+        with patch('routers.users.passwords.verify_password') as mock_verify_pass, \
                 patch('routers.users.users_services.delete') as mock_delete:
             mock_verify_pass.return_value = True
             mock_delete.return_value = True
             expected = None
 
-            actual = users.delete_user_by_id(
+            actual = await users.delete_user_by_id(
                 existing_user=fake_user(), body=UserDelete(current_password=PASSWORD))
 
             self.assertEqual(expected, actual)
 
-    def test_delete_raises400_ifCurrentPasswordNotMatch(self):
-        with patch('routers.users.utils.verify_password') as mock_verify_pass:
+    async def test_delete_raises400_ifCurrentPasswordNotMatch(self):
+        with patch('routers.users.passwords.verify_password') as mock_verify_pass:
             mock_verify_pass.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                users.delete_user_by_id(existing_user=fake_user(
+                await users.delete_user_by_id(existing_user=fake_user(
                 ), body=UserDelete(current_password=PASSWORD))
 
                 self.assertEqual(400, ex.exception.status_code)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from data.vote_buffer import VoteBuffer
+
+REPLY_ID, USER_ID, OTHER_USER_ID = 1, 2, 3
+UP, DOWN = 1, 0
+
+
+class VoteBuffer_Should(unittest.TestCase):
+    def test_set_returnsReplacedVote_andGetSeesIt(self):
+        buffer = VoteBuffer()
+
+        self.assertIsNone(buffer.set(REPLY_ID, USER_ID, UP, persisted=None))
+        self.assertEqual(UP, buffer.set(REPLY_ID, USER_ID, DOWN))
+        self.assertEqual(DOWN, buffer.get(REPLY_ID, USER_ID))
+        self.assertFalse(buffer.knows(REPLY_ID, OTHER_USER_ID))
+
+    def test_tallyDelta_countsChangesAgainstPersistedVotes(self):
+        buffer = VoteBuffer()
+        buffer.set(REPLY_ID, USER_ID, UP, persisted=DOWN)
+        buffer.set(REPLY_ID, OTHER_USER_ID, None, persisted=UP)
+
+        self.assertEqual((0, -1), buffer.tally_delta(REPLY_ID))
+
+    def test_take_returnsOnlyChangedVotes(self):
+        buffer = VoteBuffer()
+        buffer.set(REPLY_ID, USER_ID, UP, persisted=UP)
+        buffer.set(REPLY_ID, OTHER_USER_ID, DOWN, persisted=None)
+
+        self.assertEqual([(REPLY_ID, OTHER_USER_ID, DOWN)], buffer.take())
+        self.assertEqual(0, len(buffer))
+
+    def test_flushingVotes_stayVisible_untilDone(self):
+        buffer = VoteBuffer()
+        buffer.set(REPLY_ID, USER_ID, UP, persisted=None)
+        buffer.take()
+
+        self.assertEqual(UP, buffer.get(REPLY_ID, USER_ID))
+        self.assertEqual((1, 0), buffer.tally_delta(REPLY_ID))
+
+        buffer.done(written=True)
+        self.assertFalse(buffer.knows(REPLY_ID, USER_ID))
+        self.assertEqual((0, 0), buffer.tally_delta(REPLY_ID))
+
+    def test_voteCastDuringFlush_buildsOnFlushingVote(self):
+        buffer = VoteBuffer()
+        buffer.set(REPLY_ID, USER_ID, UP, persisted=None)
+        buffer.take()
+
+        self.assertEqual(UP, buffer.set(REPLY_ID, USER_ID, DOWN))
+        buffer.done(written=True)
+
+        # the table counts the flushed upvote now
+        self.assertEqual((-1, 1), buffer.tally_delta(REPLY_ID))
+        self.assertEqual([(REPLY_ID, USER_ID, DOWN)], buffer.take())
+
+    def test_failedFlush_makesVotesPendingAgain(self):
+        buffer = VoteBuffer()
+        buffer.set(REPLY_ID, USER_ID, UP, persisted=None)
+        buffer.take()
+
+        buffer.done(written=False)
+
+        self.assertEqual([(REPLY_ID, USER_ID, UP)], buffer.take())
+
+    def test_journal_isReplayed_untilFlushWritten(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = os.path.join(directory, 'votes.log')
+            buffer = VoteBuffer(journal=journal)
+            buffer.set(REPLY_ID, USER_ID, UP, persisted=None)
+            buffer.set(REPLY_ID, USER_ID, DOWN)
+            buffer.take()
+            buffer.set(REPLY_ID, OTHER_USER_ID, None, persisted=UP)
+            buffer.close()
+
+            self.assertEqual({(REPLY_ID, USER_ID, DOWN), (REPLY_ID, OTHER_USER_ID, None)},
+                             set(VoteBuffer.replay(journal)))
+
+            buffer.done(written=True)
+            self.assertEqual([(REPLY_ID, OTHER_USER_ID, None)], VoteBuffer.replay(journal))
+
+            VoteBuffer.discard_journal(journal)
+            self.assertEqual([], VoteBuffer.replay(journal))
+
+    def test_journal_isFsyncedOnlyByFsyncAll_includingRotatedFile(self):
+        with tempfile.TemporaryDirectory() as directory, patch('data.vote_buffer.os.fsync') as mock_fsync:
+            buffer = VoteBuffer(journal=os.path.join(directory, 'votes.log'), fsync=True)
+            buffer.set(REPLY_ID, USER_ID, UP, persisted=None)
+            buffer.take()
+            buffer.set(REPLY_ID, OTHER_USER_ID, DOWN, persisted=None)
+            mock_fsync.assert_not_called()
+
+            fds = buffer.take_unsynced()
+            VoteBuffer.fsync_all(fds)
+
+            self.assertEqual(2, mock_fsync.call_count)
+            self.assertEqual([], buffer.take_unsynced())
+            buffer.close()
@@ -1,52 +1,215 @@
+import asyncio
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, call, patch
+from data.database import transaction
+from data.vote_buffer import VoteBuffer
 from services import votes_services as votes
-from tests.test_utils import REPLY_ID, USER_ID, VOTE_TYPE_INT, VOTE_TYPE_STR
+from data.models.vote import ReplyVotes
+from tests.test_utils import REPLY_ID, TOPIC_ID, USER_ID, VOTE_TYPE_INT, VOTE_TYPE_STR
 
 
-class VotesServices_Should(unittest.TestCase):
-    def test_getAll_returnsNumberOfVotes_ifVotes(self):
+class VotesServices_Should(unittest.IsolatedAsyncioTestCase):
+    async def test_getAll_returnsNumberOfVotes_ifVotes(self):
         with patch('services.votes_services.read_query') as mock_get_all_votes_per_reply:
             total_votes = [(5,)]
             mock_get_all_votes_per_reply.return_value = total_votes
 
             expected = total_votes[0][0]
 
-            actual = votes.get_all(reply_id=REPLY_ID, type=VOTE_TYPE_STR)
+            actual = await votes.get_all(reply_id=REPLY_ID, type=VOTE_TYPE_STR)
 
             self.assertEqual(expected, actual)
+            sql, params = mock_get_all_votes_per_reply.call_args.args
+            self.assertIn('FROM replies', sql)
+            self.assertEqual((REPLY_ID,), params)
 
-    def test_getAll_returnsNone_ifNotVotes(self):
+    async def test_reconcileTallies_updatesOnlyDriftedReplies(self):
+        with patch('services.votes_services.update_query') as mock_update_query:
+            await votes.reconcile_tallies()
+
+            sql = mock_update_query.call_args.args[0]
+            self.assertIn('GROUP BY reply_id', sql)
+            self.assertIn('WHERE r.upvotes <> COALESCE(v.up, 0) OR r.downvotes <> COALESCE(v.down, 0)', sql)
+
+    async def test_getAll_returnsNone_ifNotVotes(self):
         with patch('services.votes_services.read_query') as mock_get_all_votes_per_reply:
             total_votes = []
             mock_get_all_votes_per_reply.return_value = total_votes
 
             expected = None
 
-            actual = votes.get_all(reply_id=REPLY_ID, type=VOTE_TYPE_STR)
+            actual = await votes.get_all(reply_id=REPLY_ID, type=VOTE_TYPE_STR)
 
             self.assertEqual(expected, actual)
 
-    def test_getVoteWithType_returnsVoteType_ifVote(self):
+    async def test_castVote_reportsOutcome_fromAffectedRows(self):
+        with patch('services.votes_services.upsert_query') as mock_upsert_query, \
+                patch('services.votes_services.vote_changed') as mock_vote_changed:
+            for affected_rows, outcome in ((1, 'created'), (2, 'switched'), (0, 'unchanged')):
+                mock_upsert_query.return_value = affected_rows
+
+                self.assertEqual(outcome, await votes.cast_vote(USER_ID, REPLY_ID, VOTE_TYPE_STR))
+
+            sql, params = mock_upsert_query.call_args.args
+            self.assertIn('ON DUPLICATE KEY UPDATE type = VALUES(type)', sql)
+            self.assertEqual((USER_ID, REPLY_ID, VOTE_TYPE_INT), params)
+            self.assertEqual([call(REPLY_ID, None, VOTE_TYPE_INT), call(REPLY_ID, 1 - VOTE_TYPE_INT, VOTE_TYPE_INT),
+                              call(REPLY_ID, VOTE_TYPE_INT, VOTE_TYPE_INT)], mock_vote_changed.call_args_list)
+
+    async def test_deleteVote_reportsDeletedVote_toReputation(self):
+        with patch('services.votes_services.read_query') as mock_read_query, \
+                patch('services.votes_services.vote_changed') as mock_vote_changed:
+            mock_read_query.return_value = [(VOTE_TYPE_INT,)]
+
+            await votes.delete_vote(REPLY_ID, USER_ID)
+
+            self.assertIn('RETURNING type', mock_read_query.call_args.args[0])
+            mock_vote_changed.assert_called_once_with(REPLY_ID, VOTE_TYPE_INT, None)
+
+    async def test_getUserVotes_readsVotesAndTalliesInOneQuery(self):
+        with patch('services.votes_services.read_query') as mock_read_query:
+            mock_read_query.return_value = [(REPLY_ID, 1, 3, 0), (REPLY_ID + 1, None, 0, 2)]
+
+            result = await votes.get_user_votes(USER_ID, TOPIC_ID, [REPLY_ID, REPLY_ID + 1])
+
+            self.assertEqual([ReplyVotes(reply_id=REPLY_ID, vote='up', upvotes=3, downvotes=0),
+                              ReplyVotes(reply_id=REPLY_ID + 1, vote=None, upvotes=0, downvotes=2)], result)
+            sql, params = mock_read_query.call_args.args
+            self.assertIn('r.reply_id IN (?, ?)', sql)
+            self.assertEqual((USER_ID, TOPIC_ID, REPLY_ID, REPLY_ID + 1), params)
+            mock_read_query.assert_called_once()
+
+    async def test_getUserVotes_skipsQuery_whenNoReplyIds(self):
+        with patch('services.votes_services.read_query') as mock_read_query:
+            self.assertEqual([], await votes.get_user_votes(USER_ID, TOPIC_ID, []))
+
+            mock_read_query.assert_not_called()
+
+    async def test_getVoteWithType_returnsVoteType_ifVote(self):
         with patch('services.votes_services.read_query') as mock_get_vote_type:
 
             mock_get_vote_type.return_value = [(VOTE_TYPE_INT,)]
 
             expected = VOTE_TYPE_STR
 
-            actual = votes.get_vote_with_type(
+            actual = await votes.get_vote_with_type(
                 reply_id=REPLY_ID, user_id=USER_ID)
 
             self.assertEqual(expected, actual)
 
-    def test_getVoteWithType_returnsNone_ifNotVote(self):
+    async def test_getVoteWithType_returnsNone_ifNotVote(self):
         with patch('services.votes_services.read_query') as mock_get_vote_type:
 
             mock_get_vote_type.return_value = []
 
             expected = None
 
-            actual = votes.get_vote_with_type(
+            actual = await votes.get_vote_with_type(
                 reply_id=REPLY_ID, user_id=USER_ID)
 
             self.assertEqual(expected, actual)
+
+
+class VotesServicesWriteBehind_Should(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        votes._buffer = VoteBuffer()
+        votes._flush_wanted = Mock()
+        vote_changed = patch('services.votes_services.vote_changed')
+        vote_changed.start()
+        self.addCleanup(vote_changed.stop)
+
+    def tearDown(self):
+        votes._buffer = None
+        votes._flush_wanted = None
+
+    async def cast_vote(self, *args):
+        outcome = await votes.cast_vote(*args)
+        # the vote reaches the buffer on the event loop, once committed
+        await asyncio.sleep(0)
+        return outcome
+
+    async def delete_vote(self, *args):
+        await votes.delete_vote(*args)
+        await asyncio.sleep(0)
+
+    async def test_castVote_buffersNothing_whenUnitOfWorkRollsBack(self):
+        with patch('services.votes_services.read_query') as mock_read_query:
+            mock_read_query.return_value = []
+
+            with self.assertRaises(ValueError), transaction():
+                await self.cast_vote(USER_ID, REPLY_ID, 'up')
+                raise ValueError
+            await asyncio.sleep(0)
+
+            self.assertFalse(votes._buffer.knows(REPLY_ID, USER_ID))
+
+    async def test_castVote_buffersVote_whenUnitOfWorkCommits(self):
+        with patch('services.votes_services.read_query') as mock_read_query:
+            mock_read_query.return_value = []
+
+            with transaction():
+                self.assertEqual('created', await self.cast_vote(USER_ID, REPLY_ID, 'up'))
+                self.assertFalse(votes._buffer.knows(REPLY_ID, USER_ID))
+            await asyncio.sleep(0)
+
+            self.assertEqual(1, votes._buffer.get(REPLY_ID, USER_ID))
+
+    async def test_castVote_buffersVote_andReadsSeeIt(self):
+        with patch('services.votes_services.read_query') as mock_read_query, \
+                patch('services.votes_services.upsert_query') as mock_upsert_query:
+            mock_read_query.side_effect = [[], [(4,)]]
+
+            self.assertEqual('created', await self.cast_vote(USER_ID, REPLY_ID, 'up'))
+            self.assertEqual('unchanged', await self.cast_vote(USER_ID, REPLY_ID, 'up'))
+            self.assertEqual('up', await votes.get_vote_with_type(REPLY_ID, USER_ID))
+            self.assertEqual(5, await votes.get_all(REPLY_ID, 'up'))
+
+            mock_upsert_query.assert_not_called()
+            self.assertEqual(2, mock_read_query.call_count)
+
+    async def test_castVote_startsFlush_whenBufferFull(self):
+        with patch('services.votes_services.read_query') as mock_read_query, \
+                patch('services.votes_services.VOTE_FLUSH_SIZE', 1):
+            mock_read_query.return_value = []
+
+            await self.cast_vote(USER_ID, REPLY_ID, 'up')
+
+            votes._flush_wanted.set.assert_called_once()
+
+    async def test_flushVotes_writesUpsertsAndDeletesInBatches(self):
+        with patch('services.votes_services.read_query') as mock_read_query, \
+                patch('services.votes_services.insert_many') as mock_insert_many, \
+                patch('services.votes_services.update_many') as mock_update_many:
+            mock_read_query.side_effect = [[], [(1,)]]
+            await self.cast_vote(USER_ID, REPLY_ID, 'down')
+            await self.delete_vote(REPLY_ID + 1, USER_ID)
+
+            self.assertEqual(2, await votes.flush_votes())
+
+            self.assertEqual([(USER_ID, REPLY_ID, 0)], mock_insert_many.call_args.args[1])
+            self.assertEqual([(REPLY_ID + 1, USER_ID)], mock_update_many.call_args.args[1])
+            self.assertEqual(0, len(votes._buffer))
+
+    async def test_flushVotes_keepsVotesBuffered_whenWriteFails(self):
+        with patch('services.votes_services.read_query') as mock_read_query, \
+                patch('services.votes_services.insert_many') as mock_insert_many:
+            mock_read_query.return_value = []
+            mock_insert_many.side_effect = RuntimeError
+            await self.cast_vote(USER_ID, REPLY_ID, 'up')
+
+            with self.assertRaises(RuntimeError):
+                await votes.flush_votes()
+
+            self.assertEqual('up', await votes.get_vote_with_type(REPLY_ID, USER_ID))
+            self.assertEqual(1, len(votes._buffer))
+
+    async def test_flushPeriodically_logsFailure_andRetries(self):
+        votes._flush_wanted = asyncio.Event()
+        with patch('services.votes_services.flush_votes') as mock_flush_votes, \
+                patch('services.votes_services.VOTE_FLUSH_INTERVAL', 0):
+            mock_flush_votes.side_effect = [RuntimeError, 0, asyncio.CancelledError]
+
+            with self.assertLogs('services.votes_services', 'ERROR'), self.assertRaises(asyncio.CancelledError):
+                await votes._flush_periodically()
+
+            self.assertEqual(3, mock_flush_votes.call_count)
@@ -2,37 +2,38 @@ import unittest
 from unittest.mock import Mock, patch
 from routers import votes as votes_router
 from routers.votes import HTTPException
+from data.models.category import Category
 from tests.test_utils import REPLY_ID, TOPIC_ID, fake_user, VOTE_TYPE_STR, NEW_VOTE_TYPE
 
 
-class VotesRouter_Should(unittest.TestCase):
+class VotesRouter_Should(unittest.IsolatedAsyncioTestCase):
 
-    def test_getAllVotesForReply_raises404_ifNoSuchTopic(self):
+    async def test_getAllVotesForReply_raises404_ifNoSuchTopic(self):
         with patch('routers.votes.topic_exists') as mock_t_exists:
             mock_t_exists.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.get_all_votes_for_reply_by_type(
+                await votes_router.get_all_votes_for_reply_by_type(
                     reply_id=REPLY_ID, topic_id=TOPIC_ID, type=VOTE_TYPE_STR, current_user=fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('No such topic', ex.exception.detail)
 
-    def test_getAllVotesForReply_raises404_ifTopicExistsAndNoSuchReply(self):
+    async def test_getAllVotesForReply_raises404_ifTopicExistsAndNoSuchReply(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists:
             mock_t_exists.return_value = False
             mock_r_exists.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.get_all_votes_for_reply_by_type(
+                await votes_router.get_all_votes_for_reply_by_type(
                     reply_id=REPLY_ID, topic_id=TOPIC_ID, type=VOTE_TYPE_STR, current_user=fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('No such reply in this topic',
                                  ex.exception.detail)
 
-    def test_getAllVotesForReply_raises403_ifTopicExistsReplyExists_userHasNoAccess(self):
+    async def test_getAllVotesForReply_raises403_ifTopicExistsReplyExists_userHasNoAccess(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
             patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access:
@@ -42,14 +43,14 @@ class VotesRouter_Should(unittest.TestCase):
                 False, 'You don\'t have permissions to post, modify replies or vote in this topic')
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.get_all_votes_for_reply_by_type(
+                await votes_router.get_all_votes_for_reply_by_type(
                     reply_id=REPLY_ID, topic_id=TOPIC_ID, type=VOTE_TYPE_STR, current_user=fake_user())
 
                 self.assertEqual(403, ex.exception.status_code)
                 self.assertEqual('You don\'t have permissions to post, modify replies or vote in this topic',
                                  ex.exception.detail)
 
-    def test_getAllVotesForReply_returnsTotalVotesForType_ifTopicExistsReplyExists_userHasAccess(self):
+    async def test_getAllVotesForReply_returnsTotalVotesForType_ifTopicExistsReplyExists_userHasAccess(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access, \
@@ -63,37 +64,37 @@ class VotesRouter_Should(unittest.TestCase):
 
             expected = {f'Total {VOTE_TYPE_STR}votes': fake_votes_total}
 
-            actual = votes_router.get_all_votes_for_reply_by_type(
+            actual = await votes_router.get_all_votes_for_reply_by_type(
                 reply_id=REPLY_ID, topic_id=TOPIC_ID, type=VOTE_TYPE_STR, current_user=fake_user())
 
             self.assertEqual(expected, actual)
 
-    def test_addOrSwitch_raises404_ifNoSuchTopic(self):
+    async def test_addOrSwitch_raises404_ifNoSuchTopic(self):
         with patch('routers.votes.topic_exists') as mock_exists:
             mock_exists.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.add_or_switch(
+                await votes_router.add_or_switch(
                     type=VOTE_TYPE_STR, reply_id=REPLY_ID, topic_id=TOPIC_ID, current_user=fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('No such topic', ex.exception.detail)
 
-    def test_addOrSwitch_raises404_ifTopicExistsAndNoSuchReply(self):
+    async def test_addOrSwitch_raises404_ifTopicExistsAndNoSuchReply(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists:
             mock_t_exists.return_value = True
             mock_r_exists.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.add_or_switch(
+                await votes_router.add_or_switch(
                     type=VOTE_TYPE_STR, reply_id=REPLY_ID, topic_id=TOPIC_ID, current_user=fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('No such reply in this topic',
                                  ex.exception.detail)
 
-    def test_addOrSwitch_raises403_ifTopicExistsReplyExists_userHasNoAccess(self):
+    async def test_addOrSwitch_raises403_ifTopicExistsReplyExists_userHasNoAccess(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access:
@@ -104,100 +105,94 @@ class VotesRouter_Should(unittest.TestCase):
                 False, 'You don\'t have permissions to post, modify replies or vote in this topic')
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.add_or_switch(
+                await votes_router.add_or_switch(
                     type=VOTE_TYPE_STR, reply_id=REPLY_ID, topic_id=TOPIC_ID, current_user=fake_user())
 
                 self.assertEqual(403, ex.exception.status_code)
                 self.assertEqual('You don\'t have permissions to post, modify replies or vote in this topic',
                                  ex.exception.detail)
 
-    def test_addOrSwitch_returnsVoteAdded_ifTopicExistsReplyExists_userHasAccess_voteNotExists(self):
+    async def test_addOrSwitch_returnsVoteAdded_ifTopicExistsReplyExists_userHasAccess_voteNotExists(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access, \
-                patch('routers.votes.votes_services.get_vote_with_type') as mock_v_exists, \
-                patch('routers.votes.votes_services.add_vote') as mock_add_vote:
+                patch('routers.votes.votes_services.cast_vote') as mock_cast_vote:
 
             mock_t_exists.return_value = True
             mock_r_exists.return_value = True
             mock_access.return_value = (True, 'OK')
-            mock_v_exists.return_value = None
-            mock_add_vote.return_value = True
+            mock_cast_vote.return_value = 'created'
 
             expected = f'You {VOTE_TYPE_STR}voted REPLY with ID: {REPLY_ID}'
 
-            actual = votes_router.add_or_switch(
+            actual = await votes_router.add_or_switch(
                 type=VOTE_TYPE_STR, reply_id=REPLY_ID, topic_id=TOPIC_ID, current_user=fake_user())
 
             self.assertEqual(expected, actual)
 
-    def test_addOrSwitch_returnsVoteSwitched_ifTopicExistsReplyExists_userHasAccess_voteExists_typeNotChanged(self):
+    async def test_addOrSwitch_returnsVoteSwitched_ifTopicExistsReplyExists_userHasAccess_voteExists_typeNotChanged(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access, \
-                patch('routers.votes.votes_services.get_vote_with_type') as mock_v_exists, \
-                patch('routers.votes.votes_services.switch_vote') as mock_switch_vote:
+                patch('routers.votes.votes_services.cast_vote') as mock_cast_vote:
 
             mock_t_exists.return_value = True
             mock_r_exists.return_value = True
             mock_access.return_value = (True, 'OK')
-            mock_v_exists.return_value = VOTE_TYPE_STR
-            mock_switch_vote.return_value = True
+            mock_cast_vote.return_value = 'unchanged'
 
             expected = f'''Reply already {
                 VOTE_TYPE_STR}voted. Choose different type to switch it'''
 
-            actual = votes_router.add_or_switch(
+            actual = await votes_router.add_or_switch(
                 type=VOTE_TYPE_STR, reply_id=REPLY_ID, topic_id=TOPIC_ID, current_user=fake_user())
 
             self.assertEqual(expected, actual)
 
-    def test_addOrSwitch_returnsVoteSwitched_ifTopicExistsReplyExists_userHasAccess_voteExists_typeChanged(self):
+    async def test_addOrSwitch_returnsVoteSwitched_ifTopicExistsReplyExists_userHasAccess_voteExists_typeChanged(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access, \
-                patch('routers.votes.votes_services.get_vote_with_type') as mock_v_exists, \
-                patch('routers.votes.votes_services.switch_vote') as mock_switch_vote:
+                patch('routers.votes.votes_services.cast_vote') as mock_cast_vote:
 
             mock_t_exists.return_value = True
             mock_r_exists.return_value = True
             mock_access.return_value = (True, 'OK')
-            mock_v_exists.return_value = VOTE_TYPE_STR
-            mock_switch_vote.return_value = True
+            mock_cast_vote.return_value = 'switched'
 
             expected = f'Vote switched to {NEW_VOTE_TYPE}vote'
 
-            actual = votes_router.add_or_switch(
+            actual = await votes_router.add_or_switch(
                 type=NEW_VOTE_TYPE, reply_id=REPLY_ID, topic_id=TOPIC_ID, current_user=fake_user())
 
             self.assertEqual(expected, actual)
 
-    def test_removeVote_raises404_ifNoSuchTopic(self):
+    async def test_removeVote_raises404_ifNoSuchTopic(self):
         with patch('routers.votes.topic_exists') as mock_exists:
             mock_exists.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.remove_vote(
+                await votes_router.remove_vote(
                     topic_id=TOPIC_ID, reply_id=REPLY_ID, current_user=fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('No such topic', ex.exception.detail)
 
-    def test_removeVote_raises404_ifTopicExistsAndNoSuchReply(self):
+    async def test_removeVote_raises404_ifTopicExistsAndNoSuchReply(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists:
             mock_t_exists.return_value = True
             mock_r_exists.return_value = False
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.remove_vote(
+                await votes_router.remove_vote(
                     topic_id=TOPIC_ID, reply_id=REPLY_ID, current_user=fake_user())
 
                 self.assertEqual(404, ex.exception.status_code)
                 self.assertEqual('No such reply in this topic',
                                  ex.exception.detail)
 
-    def test_removeVote_raises403_ifTopicExistsReplyExists_userHasNoAccess(self):
+    async def test_removeVote_raises403_ifTopicExistsReplyExists_userHasNoAccess(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access:
@@ -208,14 +203,14 @@ class VotesRouter_Should(unittest.TestCase):
                 False, 'You don\'t have permissions to post, modify replies or vote in this topic')
 
             with self.assertRaises(HTTPException) as ex:
-                votes_router.remove_vote(
+                await votes_router.remove_vote(
                     topic_id=TOPIC_ID, reply_id=REPLY_ID, current_user=fake_user())
 
                 self.assertEqual(403, ex.exception.status_code)
                 self.assertEqual('You don\'t have permissions to post, modify replies or vote in this topic',
                                  ex.exception.detail)
 
-    def test_removeVote_returnsNone_whenVoteDeleted(self):
+    async def test_removeVote_returnsNone_whenVoteDeleted(self):
         with patch('routers.votes.topic_exists') as mock_t_exists, \
                 patch('routers.votes.reply_exists') as mock_r_exists, \
                 patch('routers.votes.can_user_access_topic_content') as mock_access:
@@ -226,7 +221,48 @@ class VotesRouter_Should(unittest.TestCase):
 
             expected = None
 
-            actual = votes_router.remove_vote(
+            actual = await votes_router.remove_vote(
                 topic_id=TOPIC_ID, reply_id=REPLY_ID, current_user=fake_user())
 
             self.assertEqual(expected, actual)
+
+    async def test_getMyVotes_returnsVotesOfTopic_ifUserCanRead(self):
+        with patch('routers.votes.get_topic_by_id') as mock_get_topic, \
+                patch('routers.votes.categories_services.get_by_id') as mock_get_category, \
+                patch('routers.votes.votes_services.get_user_votes') as mock_get_user_votes:
+            mock_get_category.return_value = Category(category_id=1, name='public')
+            mock_get_user_votes.return_value = []
+            user = fake_user()
+
+            actual = await votes_router.get_my_votes(TOPIC_ID, user, reply_ids=f'{REPLY_ID},{REPLY_ID},7')
+
+            self.assertEqual([], actual)
+            mock_get_user_votes.assert_called_once_with(user.user_id, TOPIC_ID, [REPLY_ID, 7])
+
+    async def test_getMyVotes_raises403_ifCategoryPrivateAndNoAccess(self):
+        with patch('routers.votes.get_topic_by_id'), \
+                patch('routers.votes.categories_services.get_by_id') as mock_get_category, \
+                patch('routers.votes.categories_services.has_access_to_private_category') as mock_has_access:
+            mock_get_category.return_value = Category(category_id=1, name='private', is_private=True)
+            mock_has_access.return_value = False
+            user = fake_user()
+            user.is_admin = False
+
+            with self.assertRaises(HTTPException) as ex:
+                await votes_router.get_my_votes(TOPIC_ID, user, reply_ids=str(REPLY_ID))
+
+            self.assertEqual(403, ex.exception.status_code)
+
+    async def test_getMyVotes_raises400_ifReplyIdsMalformed(self):
+        with self.assertRaises(HTTPException) as ex:
+            await votes_router.get_my_votes(TOPIC_ID, fake_user(), reply_ids='1,two')
+
+        self.assertEqual(400, ex.exception.status_code)
+
+    async def test_getMyVotes_raises400_ifTooManyReplyIds(self):
+        reply_ids = ','.join(str(reply_id) for reply_id in range(votes_router.MAX_REPLY_IDS + 1))
+
+        with self.assertRaises(HTTPException) as ex:
+            await votes_router.get_my_votes(TOPIC_ID, fake_user(), reply_ids=reply_ids)
+
+        self.assertEqual(400, ex.exception.status_code)